@@ -1,30 +1,78 @@
 import os
 import sys
+import time
+import threading
 import json
 import logging
 import argparse
-import requests
+import itertools
 from base64 import b64encode
-from cronometro import Cronometro
-from datetime import datetime, timedelta
+from instrumentation import Instrumentation
+from urllib.parse import urlencode
+from transport import Transport, AirflowRequestError
+from store import DagRunStore
+from checkpoint import Checkpoint
+from export import ResultExporter
+from archive import ArchiveWriter, ArchiveReader
+from responseCache import ResponseCache, parseTtls
+from decoding import DagRunStream, RUN_FIELDS, TASK_FIELDS
+from records import DagRuns, STATES, FAILED
+from dagFilter import DagFilter, DagIndex, parseShard, shardOf
+from metrics import MetricsRegistry, MetricsServer
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# numpy e analytics só são importados na primeira análise, o --help e as validações não precisam deles.
+np = None
+analytics = None
+
+def loadAnalytics():
+    global np, analytics
+    if analytics is None:
+        import numpy
+        import analytics as module
+        np = numpy
+        analytics = module
+    return analytics
 
 class AirflowMonitor(object):
 
-    def __init__(self, logger: object = None) -> None:
+    def __init__(self, logger: object = None, environment: dict = None) -> None:
         super().__init__()
-        self.className = 'AirflowMonitor'
+        self.className = type(self).__name__
+        # sem environment as configurações vêm das variáveis de ambiente, como no Dockerfile.
+        self.environment = os.environ if environment is None else environment
         self.initializeLogger(logger=logger)
-        self.setDefaults()
+        self.setBatchOptions()
+        self.instrumentation = Instrumentation(logger=self.logger)
+        self.transport = Transport(logger=self.logger, instrumentation=self.instrumentation)
+        self.setWorkers()
+        self.setStore()
+        self.setRollup()
+        self.setDagFilter()
+        self.setTaskAnalysis()
+        self.setSharding()
+        self.setExport()
+        self.setShard()
+        self.dag_tags = {}
+        self.setSla()
+        # a autenticação só acontece na primeira chamada, o --help e a validação dos argumentos não precisam dela.
+        self._baseURL = None
+        self.cookies_expiration = None
+        self.setArchive()
+        self.setCache()
 
     def initializeLogger(self, logger: object = None, level: int = logging.INFO) -> logging.Logger:
         if logger == None:
             self.logger = logging.getLogger(self.className)
             self.logger.setLevel(level)
-            ch = logging.StreamHandler()
-            formatter = logging.Formatter("%(asctime)s [%(filename)s:%(lineno)d] - %(levelname)s - %(message)s")
-            ch.setFormatter(formatter)
-            ch.addFilter(logging.Filter(self.className))
-            self.logger.addHandler(ch)
+            # outro monitor no mesmo processo (ou o processo pai, nos shards) já configurou o logger.
+            if not self.logger.handlers:
+                ch = logging.StreamHandler()
+                formatter = logging.Formatter("%(asctime)s [%(filename)s:%(lineno)d] - %(levelname)s - %(message)s")
+                ch.setFormatter(formatter)
+                ch.addFilter(logging.Filter(self.className))
+                self.logger.addHandler(ch)
         else:
             self.logger = logger
             if self.logger.level != level:
@@ -34,13 +82,31 @@ class AirflowMonitor(object):
         # O token da sessão expira após 12 horas, criando controle para 9 horas por segurança.
         self.cookies_expiration = datetime.now() + timedelta(hours=9)
 
+    @property
+    def baseURL(self) -> str:
+        if self._baseURL is None:
+            self.authenticate()
+        return self._baseURL
+
+    @baseURL.setter
+    def baseURL(self, value:str) -> None:
+        self._baseURL = value
+
     def getEnvironmentVariables(self):
-        self.baseURL = os.environ.get('AIRFLOW_URL', 'NULL')
-        self.airflow_username = os.environ.get('AIRFLOW_USERNAME', 'NULL')
-        self.airflow_password = os.environ.get('AIRFLOW_PASSWORD', 'NULL')
-        if 'NULL' in (self.baseURL, self.airflow_username, self.airflow_password):
+        base_url = self.environment.get('AIRFLOW_URL', 'NULL')
+        self.airflow_username = self.environment.get('AIRFLOW_USERNAME', 'NULL')
+        self.airflow_password = self.environment.get('AIRFLOW_PASSWORD', 'NULL')
+        if 'NULL' in (base_url, self.airflow_username, self.airflow_password):
             error = f'variáveis de configuração setadas de forma errada, revisar o Dockerfile.'
             raise ValueError(error)
+        # uma URL definida antes da primeira chamada (ex.: mock nos testes) não é sobrescrita.
+        if self._baseURL is None:
+            self._baseURL = base_url
+
+    def authenticate(self) -> None:
+        if self.cookies_expiration is None or datetime.now() >= self.cookies_expiration:
+            with self.instrumentation.phase('auth'):
+                self.setDefaults()
 
     def setDefaults(self) -> None:
         self.logger.info('Inicializando variaveis')
@@ -51,140 +117,770 @@ class AirflowMonitor(object):
             'Authorization' : f'Basic {base64_bytes}'
         }
         self.cookies = None
+        self.transport.setAuth(headers=self.headers)
         self.setCookiesExpiration()
 
-    def executeRequest(self, method:str, url:str, payload:json=None):
-        if (datetime.now() >= self.cookies_expiration):
-            self.setDefaults() # pragma: no cover
+    def setBatchOptions(self, batch_size:int=100, page_limit:int=100) -> None:
+        # page_limit não pode passar do [api] maximum_page_limit do servidor (padrão 100).
+        if batch_size < 1 or page_limit < 1:
+            raise ValueError('batch_size e page_limit devem ser maiores que zero.')
+        self.batch_size = batch_size
+        self.page_limit = page_limit
+
+    def setStore(self, path:str=None, retention_days:int=400) -> None:
+        self.store = None
+        self.retention_days = retention_days
+        if path is not None:
+            self.logger.info(f'Utilizando store local: {path}')
+            self.store = DagRunStore(path=path, logger=self.logger)
+            self.evictStore()
+
+    def evictStore(self) -> int:
+        horizon = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        return self.store.evict(before=self.toEpoch(horizon))
+
+    def setRollup(self, enabled:bool=False) -> None:
+        # responde a janela pelos agregados diários do store, sem consultar o Airflow.
+        if enabled and self.store is None:
+            raise ValueError('--rollup precisa de um --store.')
+        self.rollup = enabled
+        self.rollup_partial = None
+
+    def setSla(self, sla:float=None, delay_sla:float=None) -> None:
+        # execuções com duração ou atraso (início - logical_date) acima do limite, em segundos, contam como estouro.
+        if (sla is not None and sla <= 0) or (delay_sla is not None and delay_sla <= 0):
+            raise ValueError('sla e delay_sla devem ser maiores que zero.')
+        self.sla = sla
+        self.delay_sla = delay_sla
+        self.columns = None
+
+    @property
+    def columns(self):
+        # criado na primeira análise, None recomeça a contagem.
+        if self._columns is None:
+            self._columns = loadAnalytics().RunColumns(sla=self.sla, delay_sla=self.delay_sla)
+        return self._columns
+
+    @columns.setter
+    def columns(self, value) -> None:
+        self._columns = value
 
+    def setSharding(self, shard_days:int=None, checkpoint:str=None) -> None:
+        # divide a janela em fatias de shard_days dias, consultadas de forma independente.
+        if shard_days is not None and shard_days < 1:
+            raise ValueError('shard_days deve ser maior que zero.')
+        self.shard_days = shard_days
+        self.checkpoint = None
+        if checkpoint is not None:
+            self.logger.info(f'Utilizando checkpoint: {checkpoint}')
+            self.checkpoint = Checkpoint(path=checkpoint, logger=self.logger)
+
+    def setExport(self, path:str=None, runs_path:str=None) -> None:
+        # formato pela extensão do arquivo: .ndjson, .csv ou .parquet.
+        self.exporter = None
+        if path is not None:
+            self.logger.info(f'Exportando resultados para: {path}')
+            self.exporter = ResultExporter(path=path, runs_path=runs_path)
+
+    def setShard(self, shard:int=0, shards:int=1) -> None:
+        # cada dag fica em um único shard, pelo hash do dag_id.
+        if shards < 1 or not 0 <= shard < shards:
+            raise ValueError('shard deve estar entre 0 e shards - 1.')
+        self.shard = shard
+        self.shards = shards
+
+    def setArchive(self, record:str=None, replay:str=None) -> None:
+        # record grava todas as respostas em arquivo, replay responde a partir dele sem acessar a rede.
+        if record is not None and replay is not None:
+            raise ValueError('record e replay não podem ser usados juntos.')
+        self.archive_writer = None
+        self.archive_reader = None
+        if record is not None:
+            self.logger.info(f'Gravando as respostas em: {record}')
+            self.archive_writer = ArchiveWriter(record)
+        if replay is not None:
+            self.archive_reader = ArchiveReader(replay)
+            self.logger.info(f'Respondendo a partir de {replay} com {len(self.archive_reader)} respostas gravadas')
+            self.baseURL = self.archive_reader.base_url or 'http://replay'
+
+    def setCache(self, path:str=None, max_mb:float=256, ttls:list=None) -> None:
+        # listagem de dags e execuções já consultadas são respondidas do cache enquanto valem.
+        self.response_cache = None
+        if path is not None:
+            if max_mb <= 0:
+                raise ValueError('o tamanho do cache deve ser maior que zero.')
+            self.logger.info(f'Utilizando cache de respostas: {path}')
+            self.response_cache = ResponseCache(path=path, logger=self.logger, max_bytes=int(max_mb * 1024 * 1024),
+                                                ttls=parseTtls(ttls))
+
+    def setWorkers(self, workers:int=1) -> None:
+        if workers < 1:
+            raise ValueError('workers deve ser maior que zero.')
+        self.workers = workers
+        # cada worker precisa de uma conexão própria no pool para não serializar as chamadas.
+        if self.transport.pool_size < workers:
+            self.transport.resizePool(workers)
+
+    def setTransportOptions(self, pool_size:int=10, timeout:float=60, retries:int=3, backoff:float=0.5,
+                            max_rps:float=None, latency_target:float=None) -> None:
+        self.transport.configure(pool_size=pool_size, read_timeout=timeout, retries=retries, backoff=backoff,
+                                 max_rps=max_rps, latency_target=latency_target)
+
+    def executeRequest(self, method:str, url:str, payload:json=None, timeout:float=None, idempotent:bool=None,
+                       stream:bool=False):
+        if self.archive_reader is not None:
+            return self.replayRequest(method, url, payload)
+        cached = None
+        if self.response_cache is not None:
+            cached = self.response_cache.get(method, url, payload)
+            if cached is not None and cached.fresh(time.time()):
+                return self.recordResponse(method, url, payload, cached.response(url))
+        self.authenticate()
         try:
-            response = requests.request(method=method, 
-                                        url=url, 
-                                        data=payload,
-                                        headers=self.headers,
-                                        cookies=self.cookies)
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            error = f'Erro ao chamar a URL: {url} \n {e}'
-            raise SystemExit(error)
+            response = self.transport.request(method=method,
+                                              url=url,
+                                              payload=payload,
+                                              timeout=timeout,
+                                              idempotent=idempotent,
+                                              stream=stream,
+                                              headers=cached.validators() if cached is not None else None)
+        except AirflowRequestError as e:
+            # só erros do cliente (ex.: 400 de filtro não suportado) se repetem no replay, falhas transitórias não.
+            if self.archive_writer is not None and e.status_code is not None and 400 <= e.status_code < 500:
+                self.archive_writer.record(method, url, payload, e.status_code, b'')
+            raise
+        if self.response_cache is not None:
+            if response.status_code == 304 and cached is not None:
+                return self.recordResponse(method, url, payload, self.response_cache.revalidate(method, url, payload, cached))
+            self.response_cache.put(method, url, payload, response)
+        return self.recordResponse(method, url, payload, response)
+
+    def recordResponse(self, method:str, url:str, payload:json, response):
+        if self.archive_writer is not None:
+            # o corpo é lido inteiro para ser gravado, o iter_content continua funcionando a partir dele.
+            self.archive_writer.record(method, url, payload, response.status_code, response.content)
+        return response
 
+    def replayRequest(self, method:str, url:str, payload:json=None):
+        started = time.perf_counter()
+        response = self.archive_reader.replay(method, url, payload)
+        if response is None:
+            raise AirflowRequestError(f'Requisicao nao gravada em {self.archive_reader.path}: {method} {url}')
+        self.instrumentation.recordRequest(method, url, time.perf_counter() - started, size=len(response.content),
+                                           error=not response.ok)
+        if not response.ok:
+            raise AirflowRequestError(f'Erro ao chamar a URL: {url} \n {response.status_code}',
+                                      status_code=response.status_code)
         return response
 
-    def extractIdsFromResponse(self, response:dict) -> list:
+    def extractIdsFromResponse(self, response:dict, tags:list=None) -> list:
+        if tags:
+            return [x['dag_id'] for x in response['dags'] if any(t['name'] in tags for t in x.get('tags') or [])]
         ids=[x['dag_id'] for x in response['dags']]
         return ids
 
-    def listAllActiveDags(self) -> list:
+    def extractTagsFromResponse(self, response:dict) -> dict:
+        return {x['dag_id']: [t['name'] for t in x['tags'] or []] for x in response['dags'] if 'tags' in x}
+
+    def buildDagFilters(self, prefix:str=None, suffix:str=None, tags:list=None, with_tags:bool=False) -> dict:
+        # dag_id_pattern é um "contém" sem diferenciar maiúsculas, o filtro local ainda refina prefixo/sufixo.
+        filters = {}
+        pattern = prefix or suffix
+        if pattern:
+            filters['dag_id_pattern'] = pattern
+        if tags:
+            filters['tags'] = list(tags)
+        # pede ao servidor somente os campos usados em extractIdsFromResponse e no DagFilter.
+        filters['fields'] = ['dag_id', 'tags'] if tags or with_tags else ['dag_id']
+        return filters
+
+    def listDagsPage(self, url:str, offset:int) -> dict:
+        response = self.executeRequest('GET', f'{url}&offset={offset}')
+        return response.json()
+
+    def listAllActiveDags(self, prefix:str=None, suffix:str=None, tags:list=None, with_tags:bool=False) -> list:
         self.logger.info('Listando todas as dags ativas')
-        limit_per_itr = 100
-        url = f'{self.baseURL}/api/v1/dags?only_active=true&limit={limit_per_itr}'
-        DAG_response = self.executeRequest(method='GET', url=url)
-        total_entries = DAG_response.json()['total_entries']
+        url = f'{self.baseURL}/api/v1/dags?only_active=true&limit={self.page_limit}'
+        filters = self.buildDagFilters(prefix=prefix, suffix=suffix, tags=tags, with_tags=with_tags)
+        try:
+            filtered_url = f'{url}&{urlencode(filters, doseq=True)}'
+            DAG_response = self.executeRequest(method='GET', url=filtered_url)
+            url = filtered_url
+        except AirflowRequestError as e:
+            if e.status_code != 400:
+                raise
+            self.logger.warning(f'Servidor nao aceitou os filtros {filters}, filtrando localmente.')
+            DAG_response = self.executeRequest(method='GET', url=url)
+        first_page = DAG_response.json()
+        total_entries = first_page['total_entries']
         self.logger.debug(f'total_entries: {total_entries}')
-        dag_ids = self.extractIdsFromResponse(DAG_response.json())
-        number_of_itr = (total_entries // limit_per_itr)
-        for i in range(number_of_itr):
-            num_of_record = len(dag_ids)
-            new_airflow_url = f"{url}&offset={num_of_record}"
-            response = self.executeRequest('GET',new_airflow_url)
-            ids = self.extractIdsFromResponse(response.json())
-            dag_ids = dag_ids + ids
+        # com o total conhecido, os offsets das demais páginas podem ser consultados em paralelo.
+        # o passo é o tamanho da primeira página: o servidor reduz o limit ao seu maximum_page_limit.
+        page_size = len(first_page['dags']) or self.page_limit
+        offsets = range(page_size, total_entries, page_size)
+        if self.workers > 1 and len(offsets) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pages = list(executor.map(lambda offset: self.listDagsPage(url, offset), offsets))
+        else:
+            pages = (self.listDagsPage(url, offset) for offset in offsets)
+        dag_ids = []
+        # tags de cada dag da última listagem, usadas pelos filtros de tag do DagFilter.
+        self.dag_tags = {}
+        for page in itertools.chain([first_page], pages):
+            dag_ids.extend(self.extractIdsFromResponse(page, tags=tags))
+            self.dag_tags.update(self.extractTagsFromResponse(page))
         self.logger.debug(f'dag_ids: {dag_ids}')
         return dag_ids
-    
+
+    def listDagIndex(self, dag_filter:DagFilter) -> DagIndex:
+        # só o que o servidor sabe filtrar é enviado, o restante é aplicado sobre o índice.
+        dag_ids = self.listAllActiveDags(prefix=dag_filter.serverPattern(), tags=list(dag_filter.tags),
+                                         with_tags=dag_filter.needsTags)
+        return DagIndex(dag_ids, tags=self.dag_tags)
+
     def filterByPrefix(self, dag_ids:list, prefix:str) -> list:
-        retList =[]
-        prefix = prefix.lower()
-        for x in dag_ids:
-            if x.lower().startswith(prefix):
-                retList.append(x)
-        return retList
-    
+        return DagFilter(prefixes=[prefix]).apply(dag_ids)
+
     def filterBySuffix(self, dag_ids:list, suffix:str) -> list:
-        retList =[]
-        suffix = suffix.lower()
-        for x in dag_ids:
-            if x.lower().endswith(suffix):
-                retList.append(x)
-        return retList
-    
+        return DagFilter(suffixes=[suffix]).apply(dag_ids)
+
     def filterByPrefixAndSuffix(self, dag_ids:list, prefix:str, suffix:str) -> list:
-        retList =[]
-        prefix = prefix.lower()
-        suffix = suffix.lower()
-        for x in dag_ids:
-            if (x.lower().startswith(prefix) and x.lower().endswith(suffix)):
-                retList.append(x)
-        return retList
-    
+        return DagFilter(prefixes=[prefix], suffixes=[suffix]).apply(dag_ids)
+
     def filterDagsByPrefixSuffix(self, dag_ids:list, prefix:str=None, suffix:str=None) -> list:
         self.logger.info(f'Filtering dags with prefix {prefix} and sufix: {suffix}')
-        if prefix is not None and suffix is not None:
-            return self.filterByPrefixAndSuffix(dag_ids, prefix, suffix)
-        elif prefix is None and suffix is not None:
-            return self.filterBySuffix(dag_ids=dag_ids, suffix=suffix)
-        elif prefix is not None and suffix is None:
-            return self.filterByPrefix(dag_ids=dag_ids, prefix=prefix)
-        else:
-            return dag_ids
+        return DagFilter.fromArgs(prefix=prefix, suffix=suffix).apply(dag_ids)
+
+    def setDagFilter(self, dag_filter:DagFilter=None) -> None:
+        # quando definido, substitui os filtros de prefix/suffix/tags passados para run e serve.
+        self.dag_filter = dag_filter
 
     def timeFormat(self, time:datetime) -> str:
         return time.strftime('%Y-%m-%d'+'T'+'%H:%M:%S'+'Z')
+
+    def toEpoch(self, time) -> float:
+        # datas sem fuso são tratadas como UTC, igual ao timeFormat.
+        if time is None:
+            return None
+        if isinstance(time, str):
+            time = datetime.fromisoformat(time)
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        return time.timestamp()
+
+    def fromEpoch(self, epoch:float) -> datetime:
+        return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
     
-    def getAllExecutionsByDagId(self, dag_id:str, start_date:datetime, end_date:datetime) -> list:
-        self.logger.info(f'Consultando a dag: {dag_id}')
+    def splitInBatches(self, items:list, batch_size:int) -> list:
+        items = list(items)
+        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    def iterDagRuns(self, dag_ids:list, start_date:datetime, end_date:datetime, finished_only:bool=True,
+                    started_before:datetime=None):
         url = f'{self.baseURL}/api/v1/dags/~/dagRuns/list'
+        # sem finished_only também retorna as execuções que ainda estão rodando.
+        end_filter = 'end_date_lte' if finished_only else 'start_date_lte'
+        filters = {'dag_ids': dag_ids,
+                   'start_date_gte': self.timeFormat(start_date),
+                   end_filter: self.timeFormat(end_date)}
+        if started_before is not None:
+            # fatia da janela: só as execuções iniciadas até started_before.
+            filters['start_date_lte'] = self.timeFormat(started_before if finished_only else min(started_before, end_date))
+        count = 0
+        totals = [0]
+        while True:
+            payload = json.dumps(dict(filters, page_offset=count, page_limit=self.page_limit))
+            page_size = count
+            # cada execução é entregue assim que decodificada, sem guardar a página inteira.
+            for run in self.streamPage(url, payload, fields=RUN_FIELDS, key='dag_runs', totals=totals):
+                count = count + 1
+                yield run
+            if count == page_size or count >= totals[0]:
+                break
+
+    def streamPage(self, url:str, payload:str, fields:tuple, key:str, totals:list):
+        # o corpo em stream é lido depois do executeRequest, uma conexão que cai no meio dele também é repetida.
+        # a nova tentativa pula os itens da página que já foram entregues; totals[0] recebe o total_entries.
+        delivered = 0
+        attempt = 0
+        while True:
+            response = None
+            try:
+                # as listagens são somente leitura, podem ser repetidas com segurança.
+                response = self.executeRequest(method='POST', url=url, payload=payload, idempotent=True, stream=True)
+                page = DagRunStream(response.iter_content(chunk_size=65536), fields=fields, key=key)
+                for i, item in enumerate(page):
+                    if i >= delivered:
+                        delivered = delivered + 1
+                        yield item
+                totals[0] = page.total_entries or 0
+                return
+            except Exception as e:
+                if response is not None:
+                    response.close()
+                if not self.transport.isReadError(e):
+                    raise
+                if attempt >= self.transport.retries:
+                    raise AirflowRequestError(f'Erro ao ler a resposta de {url} \n {e}')
+                attempt = attempt + 1
+                self.transport.waitRetry('POST', url, attempt, e)
+
+    def listDagRuns(self, dag_ids:list, start_date:datetime, end_date:datetime, finished_only:bool=True) -> list:
+        return list(self.iterDagRuns(dag_ids, start_date, end_date, finished_only=finished_only))
+
+    def getAllExecutionsByDagIds(self, dag_ids:list, start_date:datetime, end_date:datetime, batch_size:int=None) -> dict:
+        batch_size = batch_size or self.batch_size
         self.logger.debug(f'Consultando de {start_date} ate {end_date}')
-        payload = json.dumps({
-            'dag_ids': [dag_id],
-            'start_date_gte': self.timeFormat(start_date),
-            'end_date_lte': self.timeFormat(end_date),
-        })
-        DAG_response = self.executeRequest(method='POST', url=url, payload=payload)
-        self.logger.debug(DAG_response.json()['dag_runs'])
-        return DAG_response.json()['dag_runs']
+        runs_by_dag = {dag_id: DagRuns(dag_id) for dag_id in dag_ids}
+        for batch in self.splitInBatches(dag_ids, batch_size):
+            self.logger.info(f'Consultando lote de {len(batch)} dags')
+            with self.instrumentation.phase('run_fetching'):
+                if self.store is not None:
+                    runs_by_dag.update(self.fetchIncremental(batch, start_date, end_date))
+                    continue
+                for run in self.iterDagRuns(batch, start_date, end_date):
+                    if run['dag_id'] not in runs_by_dag:
+                        runs_by_dag[run['dag_id']] = DagRuns(run['dag_id'])
+                    runs_by_dag[run['dag_id']].append(run)
+        return runs_by_dag
+
+    def fetchIncremental(self, dag_ids:list, start_date:datetime, end_date:datetime) -> dict:
+        start = self.toEpoch(start_date)
+        end = self.toEpoch(end_date)
+        fetched_at = self.toEpoch(datetime.now(timezone.utc))
+        # cada dag é consultada a partir da própria marca, as dags com a mesma marca vão na mesma chamada.
+        fetch_starts = {dag_id: self.store.getFetchStart(dag_id, start) for dag_id in dag_ids}
+        groups = {}
+        for dag_id, fetch_start in fetch_starts.items():
+            groups.setdefault(fetch_start, []).append(dag_id)
+        for fetch_start, group in sorted(groups.items()):
+            if fetch_start <= end:
+                self.logger.debug(f'Consulta incremental de {len(group)} dags a partir de {self.fromEpoch(fetch_start)}')
+                dag_runs = self.iterDagRuns(group, self.fromEpoch(fetch_start), end_date, finished_only=False)
+                self.saveFetched(group, dag_runs, fetched_from=fetch_start, watermark=min(end, fetched_at))
+        # execuções anteriores à marca que ainda não terminaram (ex.: uma presa em running há semanas) são
+        # consultadas pelo início exato, sem baixar de novo tudo o que veio depois delas.
+        pending = {}
+        for dag_id, pending_start in self.store.getPendingRuns(dag_ids, start):
+            if pending_start < min(fetch_starts[dag_id], end):
+                pending.setdefault(int(pending_start), []).append(dag_id)
+        for second, group in pending.items():
+            self.logger.debug(f'Consultando execucoes pendentes de {len(group)} dags iniciadas em {self.fromEpoch(second)}')
+            # o timeFormat descarta os microssegundos, o intervalo cobre o segundo inteiro.
+            dag_runs = self.iterDagRuns(sorted(set(group)), self.fromEpoch(second), self.fromEpoch(second + 1),
+                                        finished_only=False)
+            self.saveFetched([], dag_runs)
+        return self.store.getRuns(dag_ids, start, end)
+
+    def saveFetched(self, dag_ids:list, dag_runs, fetched_from:float=None, watermark:float=None) -> None:
+        # grava uma página por vez enquanto as execuções chegam, sem montar a consulta inteira em memória.
+        # a marca só avança depois da última página: se a consulta falhar no meio, a próxima começa do mesmo ponto.
+        dag_runs = iter(dag_runs)
+        while True:
+            chunk = list(itertools.islice(dag_runs, self.page_limit))
+            if not chunk:
+                break
+            for run in chunk:
+                run['start_date'] = self.toEpoch(run['start_date'])
+                run['end_date'] = self.toEpoch(run['end_date'])
+                run['logical_date'] = self.toEpoch(run.get('logical_date'))
+            self.store.saveRuns([], chunk)
+        if dag_ids:
+            self.store.saveRuns(dag_ids, [], fetched_from=fetched_from, watermark=watermark)
+
+    def getAllExecutionsByDagId(self, dag_id:str, start_date:datetime, end_date:datetime) -> list:
+        self.logger.info(f'Consultando a dag: {dag_id}')
+        dag_runs = list(self.getAllExecutionsByDagIds([dag_id], start_date, end_date)[dag_id])
+        self.logger.debug(dag_runs)
+        return dag_runs
     
+    def splitWindow(self, start_date:datetime, end_date:datetime, shard_days:int=None) -> list:
+        if shard_days is None:
+            return [(start_date, end_date)]
+        shards = []
+        shard_start = start_date
+        while shard_start < end_date:
+            shard_end = min(shard_start + timedelta(days=shard_days), end_date)
+            shards.append((shard_start, shard_end))
+            shard_start = shard_end
+        return shards
+
+    def getExecutionsByShard(self, dag_ids:list, shard_start:datetime, shard_end:datetime, end_date:datetime) -> dict:
+        key = (self.timeFormat(shard_start), self.timeFormat(shard_end), self.timeFormat(end_date))
+        if self.checkpoint is not None:
+            runs_by_dag = self.checkpoint.get(dag_ids, key)
+            if runs_by_dag is not None:
+                return runs_by_dag
+        self.logger.info(f'Consultando lote de {len(dag_ids)} dags de {shard_start} ate {shard_end}')
+        runs_by_dag = {dag_id: DagRuns(dag_id) for dag_id in dag_ids}
+        with self.instrumentation.phase('run_fetching'):
+            # o fim da janela continua valendo para todas as fatias, como na consulta sem fatias.
+            for run in self.iterDagRuns(dag_ids, shard_start, end_date, started_before=shard_end):
+                if run['dag_id'] not in runs_by_dag:
+                    runs_by_dag[run['dag_id']] = DagRuns(run['dag_id'])
+                runs_by_dag[run['dag_id']].append(run)
+        if self.checkpoint is not None:
+            self.checkpoint.save(key, runs_by_dag)
+        return runs_by_dag
+
+    def mergeShards(self, dag_ids:list, parts:list) -> dict:
+        if len(parts) == 1:
+            return parts[0][1]
+        parts = [part for _, part in sorted(parts, key=lambda x: x[0])]
+        # start_date_lte e start_date_gte incluem o limite, a execução no limite vem nas duas fatias.
+        return {dag_id: DagRuns.merge(dag_id, [part[dag_id] for part in parts if dag_id in part])
+                for dag_id in dict.fromkeys(dag_id for part in parts for dag_id in part)}
+
     def analyseDagRuns(self, dag_id:str, run_list:list) -> dict:
         self.logger.info(f'Analizando retorno das execucoes da dag: {dag_id}')
-        run_count = 0
-        fail_count = 0
-        for run in run_list:
-            run_count = run_count + 1 
-            if run['state'] == 'failed':
-                fail_count = fail_count + 1
+        loadAnalytics()
+        with self.instrumentation.phase('analysis'):
+            state = self.columns.add(dag_id, run_list)
+            counts = np.bincount(state, minlength=len(STATES))
+            if self.task_analysis and counts[FAILED]:
+                run_ids = run_list.run_ids if hasattr(run_list, 'run_ids') else [x['dag_run_id'] for x in run_list]
+                self.failed_runs[dag_id] = [run_ids[i] for i in np.flatnonzero(state == FAILED)]
         ret = {'dag_id': dag_id,
-               'run_count': run_count, 
-               'fail_count': fail_count}
+               'run_count': int(len(state)), 
+               'fail_count': int(counts[FAILED])}
         self.logger.debug(f'Analise concluida: {ret}')
         return ret
     
     def consolidateResults(self, result_list:list) -> float:
         self.logger.info('Consolidando valores de resultado')
-        total_runs = 0
-        total_fails = 0
         for i in result_list:
-            total_runs = total_runs + i['run_count']
-            total_fails = total_fails + i['fail_count']
             self.logger.info(f'{i["dag_id"]} - runs: {i["run_count"]} fails: {i["fail_count"]}')
-        consolidate = total_fails / total_runs
+        loadAnalytics()
+        total_runs = int(np.fromiter((i['run_count'] for i in result_list), dtype=np.int64, count=len(result_list)).sum())
+        total_fails = int(np.fromiter((i['fail_count'] for i in result_list), dtype=np.int64, count=len(result_list)).sum())
+        consolidate = total_fails / total_runs if total_runs else 0.0
         self.logger.info(f'total runs: {total_runs} total fails: {total_fails}')
         return consolidate
 
-    def run(self, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None): # pragma: no cover
+    def reportResults(self) -> dict:
+        report = loadAnalytics().mergePartials([self.rollup_partial]) if self.rollup else self.columns.report()
+        return self.logReport(report)
+
+    def logReport(self, report:dict) -> dict:
+        self.logger.info(f'execucoes por estado: {report["states"]}')
+        if report['duration']:
+            self.logger.info(f'duracao das execucoes (s): {report["duration"]}')
+        if report['delay']:
+            self.logger.info(f'atraso das execucoes em relacao a logical_date (s): {report["delay"]}')
+        if 'sla' in report:
+            self.logger.info(f'estouros de sla: {report["sla"]}')
+        for dag in report['dags']:
+            breaches = sum(dag['sla_breaches'].values())
+            if dag['failure_rate'] > 0 or breaches:
+                self.logger.info(f'{dag["dag_id"]} - taxa de falha: {round(dag["failure_rate"], 4)} '
+                                 f'duracao media (s): {dag["duration_mean"]} p95: {dag["duration_p95"]} '
+                                 f'atraso p95 (s): {dag["delay_p95"]} estouros de sla: {breaches}')
+        for day in report['daily']:
+            self.logger.debug(f'{day["day"]} - {day["states"]}')
+        return report
+
+    def analyseBatch(self, batch:list, runs_by_dag:dict) -> list:
+        return [self.analyseDagRuns(dag_id=dag, run_list=runs_by_dag[dag]) for dag in batch]
+
+    def runUnits(self, units:list, fetch):
+        if self.workers == 1:
+            for unit in units:
+                yield unit, fetch(unit)
+            return
+        self.logger.info(f'Consultando {len(units)} lotes com {self.workers} workers')
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {}
+            units = iter(units)
+            while True:
+                # limita os lotes em andamento para não acumular respostas em memória.
+                for unit in units:
+                    pending[executor.submit(fetch, unit)] = unit
+                    if len(pending) >= self.workers * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    def collectResults(self, dag_ids:list, start_date:datetime, end_date:datetime) -> list:
         result_list = []
-        active_dags = self.listAllActiveDags()
-        active_dags = self.filterDagsByPrefixSuffix(active_dags, prefix, suffix)
-        active_dags = set(active_dags) # removing duplicates
+        self.columns = None
+        self.failed_runs = {}
+        batches = self.splitInBatches(dag_ids, self.batch_size)
+        # o store já faz a consulta incremental, fatias e checkpoint valem para a consulta direta.
+        if (self.shard_days is not None or self.checkpoint is not None) and self.store is None:
+            shards = self.splitWindow(start_date, end_date, self.shard_days)
+            fetch = lambda unit: self.getExecutionsByShard(batches[unit[0]], unit[1][0], unit[1][1], end_date)
+        else:
+            shards = [(start_date, end_date)]
+            fetch = lambda unit: self.getAllExecutionsByDagIds(batches[unit[0]], start_date, end_date)
+        units = [(i, shard) for i in range(len(batches)) for shard in shards]
+        parts = {}
+        for (i, shard), runs_by_dag in self.runUnits(units, fetch):
+            parts.setdefault(i, []).append((shard, runs_by_dag))
+            # o lote é analisado assim que todas as suas fatias chegam.
+            if len(parts[i]) == len(shards):
+                runs_by_dag = self.mergeShards(batches[i], parts.pop(i))
+                results = self.analyseBatch(batches[i], runs_by_dag)
+                if self.exporter is not None:
+                    with self.instrumentation.phase('export'):
+                        self.exporter.write(results, runs_by_dag, self.toEpoch(start_date), self.toEpoch(end_date))
+                result_list.extend(results)
+        # ordena para que o resultado não dependa da ordem de chegada dos lotes.
+        result_list.sort(key=lambda x: x['dag_id'])
+        return result_list
+
+    def setTaskAnalysis(self, enabled:bool=False) -> None:
+        # busca as tasks que falharam nas execuções com falha encontradas em analyseDagRuns.
+        self.task_analysis = enabled
+        self.failed_runs = {}
+        self.task_failures = []
+
+    def listTaskInstancesPage(self, dag_ids:list, dag_run_ids:list, offset:int, states:list) -> tuple:
+        url = f'{self.baseURL}/api/v1/dags/~/dagRuns/~/taskInstances/list'
+        payload = json.dumps({
+            'dag_ids': dag_ids,
+            'dag_run_ids': dag_run_ids,
+            'state': states,
+            'page_offset': offset,
+            'page_limit': self.page_limit,
+        })
+        totals = [0]
+        items = list(self.streamPage(url, payload, fields=TASK_FIELDS, key='task_instances', totals=totals))
+        return items, totals[0]
+
+    def listFailedTaskInstances(self, failed_runs:dict, states:list=None) -> list:
+        states = states or ['failed']
+        pairs = [(dag_id, run_id) for dag_id, run_ids in failed_runs.items() for run_id in run_ids]
+        # cada chamada leva várias execuções, de várias dags, no lugar de uma chamada por execução.
+        chunks = []
+        for chunk in self.splitInBatches(pairs, self.batch_size):
+            chunks.append((sorted({x[0] for x in chunk}), sorted({x[1] for x in chunk})))
+        executor = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        run = executor.map if executor is not None else map
+        try:
+            first_pages = list(run(lambda chunk: self.listTaskInstancesPage(chunk[0], chunk[1], 0, states), chunks))
+            # com o total de cada lote conhecido, as demais páginas são consultadas em paralelo.
+            pending = []
+            for chunk, (items, total) in zip(chunks, first_pages):
+                for offset in range(len(items), total, len(items) or 1):
+                    pending.append((chunk, offset))
+            pages = list(run(lambda x: self.listTaskInstancesPage(x[0][0], x[0][1], x[1], states)[0], pending))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        wanted = set(pairs)
+        # dag_ids x dag_run_ids também traz execuções de outras dags com o mesmo run id.
+        return [x for items in [page for page, _ in first_pages] + pages for x in items
+                if (x['dag_id'], x['dag_run_id']) in wanted]
+
+    def analyseFailedTasks(self) -> list:
+        runs = sum(len(x) for x in self.failed_runs.values())
+        self.logger.info(f'Consultando tasks de {runs} execucoes com falha')
+        with self.instrumentation.phase('task_analysis'):
+            failed_by_task = {}
+            for task in self.listFailedTaskInstances(self.failed_runs):
+                failed_by_task.setdefault((task['dag_id'], task['task_id']), set()).add(task['dag_run_id'])
+        self.task_failures = sorted(({'dag_id': dag_id, 'task_id': task_id, 'fail_count': len(run_ids)}
+                                     for (dag_id, task_id), run_ids in failed_by_task.items()),
+                                    key=lambda x: (-x['fail_count'], x['dag_id'], x['task_id']))
+        for x in self.task_failures:
+            self.logger.info(f'{x["dag_id"]}.{x["task_id"]} - falhas: {x["fail_count"]}')
+        return self.task_failures
+
+    def selectDags(self, prefix:str=None, suffix:str=None, tags:list=None) -> list:
+        with self.instrumentation.phase('dag_listing'):
+            dag_filter = self.dag_filter
+            if dag_filter is None:
+                dag_filter = DagFilter.fromArgs(prefix=prefix, suffix=suffix, tags=tags)
+            if self.rollup:
+                if dag_filter.needsTags:
+                    raise ValueError('o store não guarda as tags, filtros por tag não podem ser usados com --rollup.')
+                active_dags = DagIndex(self.store.getDagIds()).select(dag_filter)
+            else:
+                active_dags = self.listDagIndex(dag_filter).select(dag_filter)
+            if self.shards > 1:
+                active_dags = [x for x in active_dags if shardOf(x, self.shards) == self.shard]
+        return sorted(set(active_dags)) # removing duplicates
+
+    def analyseRollups(self, dag_ids:list, start_date:datetime, end_date:datetime) -> list:
+        start = self.toEpoch(start_date)
+        end = self.toEpoch(end_date)
+        missing = set(dag_ids) - self.store.getCoveredDagIds(start, end)
+        if missing:
+            self.logger.warning(f'{len(missing)} dags sem a janela inteira no store, o resultado considera só o que ja foi consultado')
+        with self.instrumentation.phase('analysis'):
+            self.rollup_partial = loadAnalytics().rollupPartial(dag_ids, self.store.getRollups(start, end))
+        result_list = [{'dag_id': x['dag_id'],
+                        'run_count': sum(x['states'].values()),
+                        'fail_count': x['states']['failed']} for x in self.rollup_partial['dags']]
+        if self.exporter is not None:
+            with self.instrumentation.phase('export'):
+                self.exporter.write(result_list, {}, start, end)
+        return result_list
+
+    def analyseWindow(self, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None, tags:list=None) -> list:
+        active_dags = self.selectDags(prefix=prefix, suffix=suffix, tags=tags)
         start_date = (end_date - timedelta(qtdDias))
+        if self.rollup:
+            self.logger.info(f'Consultando os agregados do store de {start_date} ate {end_date}')
+            return self.analyseRollups(dag_ids=active_dags, start_date=start_date, end_date=end_date)
         self.logger.info(f'Consultando de {start_date} ate {end_date}')
-        for dag in active_dags:
-            list = self.getAllExecutionsByDagId(dag_id=dag, 
-                                                start_date=start_date, 
-                                                end_date=end_date)
-            analyse = self.analyseDagRuns(dag_id=dag, run_list=list)
-            result_list.append(analyse)
-        consolidate = self.consolidateResults(result_list=result_list)
+        return self.collectResults(dag_ids=active_dags, start_date=start_date, end_date=end_date)
+
+    def run(self, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None, tags:list=None): # pragma: no cover
+        result_list = self.analyseWindow(end_date=end_date, qtdDias=qtdDias, prefix=prefix, suffix=suffix, tags=tags)
+        with self.instrumentation.phase('consolidation'):
+            consolidate = self.consolidateResults(result_list=result_list)
+            self.reportResults()
+        if self.task_analysis:
+            self.analyseFailedTasks()
         self.logger.info(f'resultado final: {consolidate}')
+        return consolidate
+
+    def buildPartial(self, result_list:list, end_date:datetime, qtdDias:int) -> dict:
+        # resultado do shard em JSON: só somas, que podem ser juntadas sem as execuções.
+        return {'shard': [self.shard, self.shards],
+                'window': [end_date.strftime('%Y-%m-%d'), qtdDias],
+                'result_list': result_list,
+                'columns': self.rollup_partial if self.rollup else self.columns.partial(),
+                'task_failures': self.task_failures}
+
+    def runPartial(self, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None, tags:list=None,
+                   path:str=None) -> dict:
+        self.logger.info(f'Consultando o shard {self.shard}/{self.shards}')
+        result_list = self.analyseWindow(end_date=end_date, qtdDias=qtdDias, prefix=prefix, suffix=suffix, tags=tags)
+        if self.task_analysis:
+            self.analyseFailedTasks()
+        partial = self.buildPartial(result_list, end_date, qtdDias)
+        if path is not None:
+            with open(path, mode='w', encoding='utf8') as f:
+                json.dump(partial, f)
+            self.logger.info(f'parcial do shard {self.shard}/{self.shards} gravado em {path}')
+        return partial
+
+    def mergePartialResults(self, partials:list) -> tuple:
+        shards = {x['shard'][1] for x in partials}
+        windows = {tuple(x['window']) for x in partials}
+        if len(shards) != 1 or len(windows) != 1:
+            raise ValueError('os parciais não são da mesma execução: quantidade de shards ou janela diferentes.')
+        found = sorted(x['shard'][0] for x in partials)
+        if found != list(range(shards.pop())):
+            raise ValueError(f'os parciais precisam ter cada shard uma única vez, encontrados: {found}')
+        result_list = sorted(itertools.chain.from_iterable(x['result_list'] for x in partials), key=lambda x: x['dag_id'])
+        self.task_failures = sorted(itertools.chain.from_iterable(x['task_failures'] for x in partials),
+                                    key=lambda x: (-x['fail_count'], x['dag_id'], x['task_id']))
+        return result_list, loadAnalytics().mergePartials([x['columns'] for x in partials])
+
+    def consolidatePartials(self, partials:list) -> float:
+        with self.instrumentation.phase('consolidation'):
+            result_list, report = self.mergePartialResults(partials)
+            consolidate = self.consolidateResults(result_list=result_list)
+            self.logReport(report)
+        if self.exporter is not None:
+            end_date, qtdDias = partials[0]['window']
+            end_date = datetime.strptime(end_date, '%Y-%m-%d')
+            with self.instrumentation.phase('export'):
+                self.exporter.write(result_list, {}, self.toEpoch(end_date - timedelta(qtdDias)), self.toEpoch(end_date))
+        for x in self.task_failures:
+            self.logger.info(f'{x["dag_id"]}.{x["task_id"]} - falhas: {x["fail_count"]}')
+        self.logger.info(f'resultado final: {consolidate}')
+        return consolidate
+
+    def readPartials(self, paths:list) -> list:
+        partials = []
+        for path in paths:
+            with open(path, mode='r', encoding='utf8') as f:
+                partials.append(json.load(f))
+        return partials
+
+    def runShards(self, args:argparse.Namespace, end_date:datetime) -> float:
+        self.logger.info(f'Consultando {args.processes} shards em processos separados')
+        # cada processo tem o próprio monitor, as saídas que gravam em arquivo ficam só no processo principal.
+        with ProcessPoolExecutor(max_workers=args.processes) as executor:
+            futures = [executor.submit(runShard, type(self), dict(self.environment), args, end_date, i, args.processes,
+                                       self.logger.getEffectiveLevel())
+                       for i in range(args.processes)]
+            partials = [x.result() for x in futures]
+        return self.consolidatePartials(partials)
+
+    def declareMetrics(self, registry:MetricsRegistry) -> None:
+        registry.declare('airflow_monitor_dag_runs', 'Execucoes da dag na janela analisada por estado.')
+        registry.declare('airflow_monitor_dag_failure_ratio', 'Taxa de falha da dag na janela analisada.')
+        registry.declare('airflow_monitor_failure_ratio', 'Taxa de falha de todas as dags na janela analisada.')
+        registry.declare('airflow_monitor_dags', 'Quantidade de dags analisadas.')
+        registry.declare('airflow_monitor_dag_duration_seconds', 'Quantis da duracao das execucoes da dag na janela analisada.')
+        registry.declare('airflow_monitor_dag_delay_seconds', 'Quantis do atraso do inicio em relacao a logical_date.')
+        registry.declare('airflow_monitor_dag_sla_breaches', 'Execucoes da dag acima do --sla (duration) ou do --delaySla (delay).')
+        registry.declare('airflow_monitor_last_poll_timestamp_seconds', 'Horario da ultima consulta concluida.')
+        registry.declare('airflow_monitor_poll_duration_seconds', 'Duracao da ultima consulta.')
+        registry.declare('airflow_monitor_poll_errors_total', 'Consultas que falharam.', type='counter')
+        registry.set('airflow_monitor_poll_errors_total', 0)
+
+    def updateMetrics(self, registry:MetricsRegistry, result_list:list, elapsed:float) -> None:
+        counts = self.columns.stateCounts()
+        rates = self.columns.failureRates(counts)
+        runs = {}
+        ratios = {}
+        for i, dag_id in enumerate(self.columns.dag_ids):
+            ratios[(('dag_id', dag_id),)] = float(rates[i])
+            for j, state in enumerate(STATES):
+                runs[(('dag_id', dag_id), ('state', state))] = int(counts[i, j])
+        registry.replace('airflow_monitor_dag_runs', runs)
+        registry.replace('airflow_monitor_dag_failure_ratio', ratios)
+        timings = {'duration': {}, 'delay': {}}
+        breaches = {}
+        for dag in self.columns.report()['dags']:
+            for name, series in timings.items():
+                for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                    if dag[f'{name}_{key}'] is not None:
+                        series[(('dag_id', dag['dag_id']), ('quantile', quantile))] = round(dag[f'{name}_{key}'], 3)
+            for kind, count in dag['sla_breaches'].items():
+                breaches[(('dag_id', dag['dag_id']), ('kind', kind))] = count
+        registry.replace('airflow_monitor_dag_duration_seconds', timings['duration'])
+        registry.replace('airflow_monitor_dag_delay_seconds', timings['delay'])
+        registry.replace('airflow_monitor_dag_sla_breaches', breaches)
+        registry.set('airflow_monitor_failure_ratio', self.consolidateResults(result_list=result_list))
+        registry.set('airflow_monitor_dags', len(result_list))
+        registry.set('airflow_monitor_last_poll_timestamp_seconds', round(time.time(), 3))
+        registry.set('airflow_monitor_poll_duration_seconds', round(elapsed, 3))
+
+    def serve(self, qtdDias:int, prefix:str=None, suffix:str=None, tags:list=None, interval:float=60,
+              port:int=9108, max_cycles:int=None, refresh_cycles:int=10) -> None:
+        # sem store informado usa um em memória, para cada ciclo buscar somente o que mudou.
+        if self.store is None:
+            self.setStore(path=':memory:', retention_days=qtdDias + 1)
+        self.metrics_registry = MetricsRegistry()
+        self.declareMetrics(self.metrics_registry)
+        server = MetricsServer(self.metrics_registry, port=port).start()
+        self.logger.info(f'Servindo metricas em http://0.0.0.0:{server.port}/metrics a cada {interval}s')
+        self.stop_event = threading.Event()
+        active_dags = None
+        cycle = 0
+        try:
+            while not self.stop_event.is_set():
+                started = time.time()
+                try:
+                    if active_dags is None or cycle % refresh_cycles == 0:
+                        # junto com a listagem, remove do store o que saiu da retenção, senão ele cresce a cada ciclo.
+                        self.evictStore()
+                        active_dags = self.selectDags(prefix=prefix, suffix=suffix, tags=tags)
+                    end_date = datetime.now(timezone.utc).replace(tzinfo=None)
+                    result_list = self.collectResults(dag_ids=active_dags,
+                                                      start_date=end_date - timedelta(qtdDias),
+                                                      end_date=end_date)
+                    self.updateMetrics(self.metrics_registry, result_list, time.time() - started)
+                except (AirflowRequestError, OSError, ValueError) as e:
+                    # OSError cobre os erros do requests e do socket, ValueError um JSON que não decodifica.
+                    self.logger.error(f'Falha na consulta, tentando novamente no proximo ciclo: {e}')
+                    self.metrics_registry.inc('airflow_monitor_poll_errors_total')
+                cycle = cycle + 1
+                if max_cycles is not None and cycle >= max_cycles:
+                    break
+                self.stop_event.wait(max(0, interval - (time.time() - started)))
+        finally:
+            server.stop()
 
     def parseArgs(self, arg_list: list[str] | None):
         parser = argparse.ArgumentParser(description='Monitoramento de dags com erros no airflow.')
@@ -193,11 +889,87 @@ class AirflowMonitor(object):
         parser.add_argument('-q', '--qtdDias', type=int, default=90, 
                             help='Quantidade de dias antes da data de fim a ser considerado para a análise. Default = 90')
         parser.add_argument('-p', '--prefix', type=str, default=None, 
-                            help='Prefixo que a DAG deverá ter no nome para entrar na análise.')
+                            help='Prefixo que a DAG deverá ter no nome para entrar na análise. Aceita vários separados por vírgula.')
         parser.add_argument('-s', '--suffix', type=str, default=None, 
-                            help='Sufixo que a DAG deverá ter no nome para entrar na análise.')
+                            help='Sufixo que a DAG deverá ter no nome para entrar na análise. Aceita vários separados por vírgula.')
+        parser.add_argument('-t', '--tag', type=str, action='append', default=None, dest='tags',
+                            help='Tag que a DAG deverá ter para entrar na análise. Pode ser repetido, basta uma das tags.')
+        parser.add_argument('--glob', type=str, action='append', default=None, dest='globs',
+                            help='Padrão no estilo "dl_*_prd" que o nome da DAG deverá seguir. Pode ser repetido, basta um dos padrões.')
+        parser.add_argument('--regex', type=str, action='append', default=None, dest='regexes',
+                            help='Expressão regular procurada no nome da DAG. Pode ser repetido, basta uma das expressões.')
+        parser.add_argument('--exclude', type=str, action='append', default=None, dest='excludes',
+                            help='Padrão no estilo "*_tmp" de DAGs que ficam fora da análise. Pode ser repetido.')
+        parser.add_argument('--excludeTag', type=str, action='append', default=None, dest='exclude_tags',
+                            help='Tag de DAGs que ficam fora da análise. Pode ser repetido.')
+        parser.add_argument('--filterFile', type=str, default=None,
+                            help='Arquivo JSON com os filtros (prefixes, suffixes, globs, regexes, excludes, tags, exclude_tags), somados aos da linha de comando.')
         parser.add_argument('-v', '--verbose', action='store_true',
                             help='O nível de verbose por padrão é logging.INFO, quando passado este argumento altera para logging.DEBUG')
+        parser.add_argument('-b', '--batchSize', type=int, default=100,
+                            help='Quantidade de DAGs consultadas em cada chamada ao dagRuns/list. Default = 100')
+        parser.add_argument('--pageLimit', type=int, default=100,
+                            help='Quantidade de itens por página nas listagens de dags, execuções e tasks, limitado pelo maximum_page_limit do servidor. Default = 100')
+        parser.add_argument('--poolSize', type=int, default=10,
+                            help='Quantidade de conexões mantidas abertas com o webserver. Default = 10')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Tempo máximo de leitura de cada chamada, em segundos. Default = 60')
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Quantidade de novas tentativas em erros transitórios (429, 5xx, conexão). Default = 3')
+        parser.add_argument('--maxRps', type=float, default=None,
+                            help='Limite de chamadas por segundo ao webserver, somando todos os workers. Default = sem limite')
+        parser.add_argument('--latencyTarget', type=float, default=None,
+                            help='Latência em segundos acima da qual as chamadas em paralelo são reduzidas. Default = só reduz com 429/5xx')
+        parser.add_argument('--store', type=str, default=None,
+                            help='Arquivo SQLite com as execuções já consultadas, faz a consulta incremental a partir dele.')
+        parser.add_argument('--retentionDays', type=int, default=400,
+                            help='Dias mantidos no store antes de serem removidos. Default = 400')
+        parser.add_argument('--rollup', action='store_true',
+                            help='Responde a partir dos totais por dia do --store, sem acessar o Airflow. Use depois de uma consulta com o mesmo --store.')
+        parser.add_argument('--shardDays', type=int, default=None,
+                            help='Divide a janela em fatias de N dias consultadas de forma independente (e em paralelo com -w). Não pode ser usado com --store ou --serve. Default = janela inteira')
+        parser.add_argument('--checkpoint', type=str, default=None,
+                            help='Arquivo NDJSON com as fatias já consultadas, uma execução interrompida continua de onde parou. Apague o arquivo para consultar tudo de novo. Não pode ser usado com --store ou --serve, que já retomam do store.')
+        parser.add_argument('-o', '--output', type=str, default=None,
+                            help='Arquivo .ndjson, .csv ou .parquet onde o resumo de cada DAG é gravado à medida que é analisado. Parquet precisa do pyarrow.')
+        parser.add_argument('--outputRuns', type=str, default=None,
+                            help='Arquivo .ndjson, .csv ou .parquet onde as execuções consultadas são gravadas, junto com --output.')
+        parser.add_argument('--record', type=str, default=None,
+                            help='Arquivo onde todas as respostas do Airflow são gravadas (comprimidas) para uso com --replay.')
+        parser.add_argument('--replay', type=str, default=None,
+                            help='Responde as consultas a partir de um arquivo gravado com --record, sem acessar o Airflow. Outros filtros e janelas são atendidos com os dados gravados.')
+        parser.add_argument('--sla', type=float, default=None,
+                            help='Duração máxima esperada das execuções, em segundos. As execuções acima contam como estouro de SLA.')
+        parser.add_argument('--delaySla', type=float, default=None,
+                            help='Atraso máximo esperado entre a logical_date e o início da execução, em segundos.')
+        parser.add_argument('--shard', type=str, default=None,
+                            help='Consulta só as DAGs do shard i de N (formato i/N, começando em 0), separadas pelo hash do nome.')
+        parser.add_argument('--partial', type=str, default=None,
+                            help='Arquivo JSON onde o resultado parcial do --shard é gravado, para ser juntado com --merge.')
+        parser.add_argument('--merge', type=str, nargs='+', default=None,
+                            help='Junta os arquivos gravados com --partial e consolida o resultado, sem acessar o Airflow.')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Quantidade de shards consultados em processos separados nesta máquina. Default = 1 (sem shards)')
+        parser.add_argument('--cache', type=str, default=None,
+                            help='Arquivo SQLite onde as respostas do Airflow ficam guardadas entre execuções, revalidadas com ETag/Last-Modified quando o servidor envia.')
+        parser.add_argument('--cacheSize', type=float, default=256,
+                            help='Tamanho máximo do --cache em MB, as respostas usadas há mais tempo saem primeiro. Default = 256')
+        parser.add_argument('--cacheTtl', type=str, action='append', default=None,
+                            help='Tempo em segundos que as respostas de um endpoint ficam no cache, no formato dags=600, runs=300 ou tasks=300. Execuções terminadas de janelas passadas ficam sem prazo.')
+        parser.add_argument('--serve', action='store_true',
+                            help='Mantém o monitor rodando e publica as métricas no formato Prometheus em /metrics.')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Intervalo entre as consultas no modo --serve, em segundos. Default = 60')
+        parser.add_argument('--port', type=int, default=9108,
+                            help='Porta do endpoint /metrics no modo --serve. Default = 9108')
+        parser.add_argument('--tasks', action='store_true',
+                            help='Busca as tasks que falharam nas execuções com falha e consolida as falhas por task.')
+        parser.add_argument('--trace', type=str, default=None,
+                            help='Arquivo JSON onde será gravado o resumo de tempos por fase e por endpoint.')
+        parser.add_argument('--profile', type=str, default=None,
+                            help='Arquivo onde será gravado o cProfile da execução.')
+        parser.add_argument('-w', '--workers', type=int, default=1,
+                            help='Quantidade de lotes consultados em paralelo. Default = 1 (sequencial)')
         args = parser.parse_args(arg_list)
         return args
     
@@ -208,7 +980,6 @@ class AirflowMonitor(object):
         return arg_list
 
     def main(self, arg_list: list[str] | None):
-        cronometro = Cronometro(self.logger)
         arg_list = self.cleanArgs(arg_list=arg_list)
         args = self.parseArgs(arg_list)
         if args.verbose:
@@ -221,10 +992,88 @@ class AirflowMonitor(object):
             error = f'data em formato inválido: {args.dataFim}, formato esperado: YYYY-MM-DD'
             raise ValueError(error)
 
-        self.run(end_date=dataFim,
-                qtdDias=args.qtdDias,
-                prefix=args.prefix,
-                suffix=args.suffix) # pragma: no cover
+        self.applyArgs(args)
+        if args.profile is not None:
+            self.instrumentation.startProfiler() # pragma: no cover
+        try:
+            if args.merge is not None:
+                return self.consolidatePartials(self.readPartials(args.merge))
+            if args.processes > 1:
+                return self.runShards(args, dataFim)
+            if args.serve:
+                self.serve(qtdDias=args.qtdDias,
+                           prefix=args.prefix,
+                           suffix=args.suffix,
+                           tags=args.tags,
+                           interval=args.interval,
+                           port=args.port) # pragma: no cover
+                return # pragma: no cover
+            if args.shard is not None or args.partial is not None:
+                return self.runPartial(end_date=dataFim, qtdDias=args.qtdDias, prefix=args.prefix,
+                                       suffix=args.suffix, tags=args.tags, path=args.partial)
+
+            self.run(end_date=dataFim,
+                    qtdDias=args.qtdDias,
+                    prefix=args.prefix,
+                    suffix=args.suffix,
+                    tags=args.tags) # pragma: no cover
+        finally:
+            if args.profile is not None:
+                self.instrumentation.stopProfiler(args.profile) # pragma: no cover
+            if self.exporter is not None:
+                self.exporter.close() # pragma: no cover
+            if self.archive_writer is not None:
+                self.archive_writer.close() # pragma: no cover
+            if self.response_cache is not None:
+                self.response_cache.close() # pragma: no cover
+            self.instrumentation.finish(path=args.trace) # pragma: no cover
+
+    def applyArgs(self, args:argparse.Namespace) -> None:
+        if args.processes < 1:
+            raise ValueError('processes deve ser maior que zero.')
+        # juntando parciais só o resumo por dag existe, as execuções e respostas ficaram em cada shard.
+        if (args.processes > 1 or args.merge is not None) and (args.outputRuns is not None or args.record is not None):
+            raise ValueError('--outputRuns e --record não podem ser usados com --processes ou --merge, use em cada --shard.')
+        # os agregados não guardam as execuções.
+        if args.rollup and (args.tasks or args.outputRuns is not None):
+            raise ValueError('--tasks e --outputRuns precisam das execuções, não podem ser usados com --rollup.')
+        # com o store (sempre usado no --serve) a consulta é incremental, fatias e checkpoint não seriam aplicados.
+        if (args.store is not None or args.serve) and (args.shardDays is not None or args.checkpoint is not None):
+            raise ValueError('--shardDays e --checkpoint não podem ser usados com --store ou --serve, a consulta incremental já retoma do store.')
+        self.setBatchOptions(batch_size=args.batchSize, page_limit=args.pageLimit)
+        self.setTransportOptions(pool_size=args.poolSize, timeout=args.timeout, retries=args.retries,
+                                 max_rps=args.maxRps, latency_target=args.latencyTarget)
+        self.setWorkers(workers=args.workers)
+        self.setStore(path=args.store, retention_days=args.retentionDays)
+        self.setRollup(enabled=args.rollup)
+        self.setTaskAnalysis(enabled=args.tasks)
+        self.setSla(sla=args.sla, delay_sla=args.delaySla)
+        self.setSharding(shard_days=args.shardDays, checkpoint=args.checkpoint)
+        self.setExport(path=args.output, runs_path=args.outputRuns)
+        self.setArchive(record=args.record, replay=args.replay)
+        self.setCache(path=args.cache, max_mb=args.cacheSize, ttls=args.cacheTtl)
+        self.setDagFilter(DagFilter.fromArgs(prefix=args.prefix, suffix=args.suffix, globs=args.globs,
+                                             regexes=args.regexes, excludes=args.excludes, tags=args.tags,
+                                             exclude_tags=args.exclude_tags, filter_file=args.filterFile))
+        if args.shard is not None:
+            self.setShard(*parseShard(args.shard))
+
+def runShard(monitor_class:type, environment:dict, args:argparse.Namespace, end_date:datetime,
+             shard:int, shards:int, level:int=logging.INFO) -> dict:
+    # roda em outro processo: sem export, gravação ou trace, e com um checkpoint por shard.
+    args = argparse.Namespace(**vars(args))
+    args.output = args.outputRuns = args.record = args.trace = args.profile = args.partial = None
+    if args.checkpoint is not None:
+        args.checkpoint = f'{args.checkpoint}.{shard}'
+    monitor = monitor_class(environment=environment)
+    monitor.initializeLogger(logger=monitor.logger, level=level)
+    monitor.applyArgs(args)
+    monitor.setShard(shard, shards)
+    try:
+        return monitor.runPartial(end_date=end_date, qtdDias=args.qtdDias, prefix=args.prefix,
+                                  suffix=args.suffix, tags=args.tags)
+    finally:
+        monitor.instrumentation.finish()
 
 if __name__ == "__main__":
     airflow = AirflowMonitor() # pragma: no cover
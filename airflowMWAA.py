@@ -1,48 +1,79 @@
-import os
 import sys
-import boto3
+import threading
 from aws import AWS
 from airflow import AirflowMonitor
+from datetime import datetime, timedelta
 
 # reference: https://docs.aws.amazon.com/pt_br/mwaa/latest/userguide/access-mwaa-apache-airflow-rest-api.html
 class AirflowMWAA(AirflowMonitor):
-    def __init__(self, logger: object = None) -> None:
-        super().__init__()
-        self.className = 'AirflowMWAA'
-        self.initializeLogger(logger=logger)
-        self.setDefaults()
+    # O cookie é renovado em segundo plano com esta folga antes do cookies_expiration.
+    REFRESH_MARGIN = timedelta(minutes=30)
+    RETRY_INTERVAL = 60
+
+    def __init__(self, logger: object = None, environment: dict = None) -> None:
+        self.aws = None
+        self.refresher = None
+        self.refresh_event = threading.Event()
+        super().__init__(logger=logger, environment=environment)
 
     def getEnvironmentVariables(self):
-        self.region = os.environ.get('AWS_REGION', 'NULL')
-        self.env_name = os.environ.get('AWS_AIRFLOW_NAME', 'NULL')
+        self.region = self.environment.get('AWS_REGION', 'NULL')
+        self.env_name = self.environment.get('AWS_AIRFLOW_NAME', 'NULL')
         if 'NULL' in (self.region, self.env_name):
             error = f'variáveis de configuração setadas de forma errada, revisar o Dockerfile.'
             raise ValueError(error)
 
     def createFirstAuth(self, env_name:str) -> str:
-        aws = AWS(logger=self.logger)
-        mwaa = aws.createClient(service_name='mwaa')
+        # o AWS mantém as credenciais e o client do mwaa entre os logins, com as chaves e a role do ambiente.
+        if self.aws is None:
+            self.aws = AWS(logger=self.logger, environment=self.environment)
+        mwaa = self.aws.createClient(service_name='mwaa', region=self.region)
         response = mwaa.create_web_login_token(Name=env_name)
         self.baseURL = f'https://{response["WebServerHostname"]}'
         return response["WebToken"]
 
-    def setDefaults(self) -> None:
-        self.logger.info('Inicializando variaveis')
-
-        self.getEnvironmentVariables()
+    def login(self) -> None:
         web_token = self.createFirstAuth(env_name=self.env_name)
-        
-        self.setCookiesExpiration()
         login_url = f"{self.baseURL}/aws_mwaa/login"
         login_payload = {"token": web_token} #Este token expira após 60 segundos.
-        response = self.executeRequest(
+        # chama o transport direto, o executeRequest tentaria renovar a sessão de novo.
+        response = self.transport.request(
             method='POST',
             url=login_url,
-            data=login_payload,
-            timeout=50)
+            payload=login_payload,
+            timeout=50,
+            headers={'Content-Type': 'application/x-www-form-urlencoded'})
+
+        self.headers = {'Content-Type': 'application/json'}
+        self.cookies = {"session": response.cookies["session"]}
+        self.transport.setAuth(headers=self.headers, cookies=self.cookies)
+        self.setCookiesExpiration()
+
+    def setDefaults(self) -> None:
+        self.logger.info('Inicializando variaveis')
+
+        self.getEnvironmentVariables()
+        self.login()
+        self.startAuthRefresher()
+
+    def startAuthRefresher(self) -> None:
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self.refreshAuth, daemon=True)
+            self.refresher.start()
+
+    def refreshAuth(self) -> None:
+        wait = (self.cookies_expiration - self.REFRESH_MARGIN - datetime.now()).total_seconds()
+        while not self.refresh_event.wait(max(wait, 0)):
+            try:
+                self.logger.info('Renovando a sessao do MWAA')
+                self.login()
+                wait = (self.cookies_expiration - self.REFRESH_MARGIN - datetime.now()).total_seconds()
+            except (Exception, SystemExit) as e:
+                self.logger.error(f'Falha ao renovar a sessao do MWAA: {e}')
+                wait = self.RETRY_INTERVAL
 
-        self.headers = None
-        self.cookies = response.cookies["session"]
+    def stopAuthRefresher(self) -> None:
+        self.refresh_event.set()
         
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+import numpy as np
+from datetime import datetime, timezone
+from sketch import DDSketch
+from records import STATES, STATE_CODES, FAILED, OTHER
+
+DAY = 86400
+
+def toEpochOrNan(value) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+# Soma as execuções por dag à medida que chegam: contagem por estado e por dia e sketches de duração
+# e de atraso (início - logical_date). A memória por dag não depende do tamanho da janela.
+class RunColumns(object):
+
+    def __init__(self, sla:float=None, delay_sla:float=None) -> None:
+        self.sla = sla
+        self.delay_sla = delay_sla
+        self.dag_ids = []
+        self.dag_index = {}
+        self.counts = []
+        self.durations = []
+        self.delays = []
+        self.breaches = []
+        self.daily = {}
+
+    def add(self, dag_id:str, run_list:list) -> np.ndarray:
+        if dag_id not in self.dag_index:
+            self.dag_index[dag_id] = len(self.dag_ids)
+            self.dag_ids.append(dag_id)
+            self.counts.append(np.zeros(len(STATES), np.int64))
+            self.durations.append(DDSketch())
+            self.delays.append(DDSketch())
+            self.breaches.append({'duration': 0, 'delay': 0})
+        i = self.dag_index[dag_id]
+        n = len(run_list)
+        if hasattr(run_list, 'states'):
+            # records.DagRuns já vem em colunas, basta converter sem passar execução a execução.
+            state = np.frombuffer(run_list.states, dtype=np.int8).copy()
+            start = self.msToSeconds(run_list.starts)
+            end = self.msToSeconds(run_list.ends)
+            logical = self.msToSeconds(run_list.logicals)
+        else:
+            state = np.fromiter((STATE_CODES.get(x['state'], OTHER) for x in run_list), dtype=np.int8, count=n)
+            start = np.fromiter((toEpochOrNan(x.get('start_date')) for x in run_list), dtype=np.float64, count=n)
+            end = np.fromiter((toEpochOrNan(x.get('end_date')) for x in run_list), dtype=np.float64, count=n)
+            logical = np.fromiter((toEpochOrNan(x.get('logical_date')) for x in run_list), dtype=np.float64, count=n)
+        duration = end - start
+        delay = start - logical
+        self.counts[i] += np.bincount(state, minlength=len(STATES))
+        self.durations[i].addMany(duration)
+        self.delays[i].addMany(delay)
+        # comparações com nan são falsas, execuções sem data não contam como estouro.
+        if self.sla is not None:
+            self.breaches[i]['duration'] += int(np.count_nonzero(duration > self.sla))
+        if self.delay_sla is not None:
+            self.breaches[i]['delay'] += int(np.count_nonzero(delay > self.delay_sla))
+        self.addDaily(start, state)
+        return state
+
+    def msToSeconds(self, column) -> np.ndarray:
+        values = np.frombuffer(column, dtype=np.int64)
+        # -1 é records.MISSING, data ausente.
+        return np.where(values == -1, np.nan, values / 1000)
+
+    def addDaily(self, start:np.ndarray, state:np.ndarray) -> None:
+        valid = ~np.isnan(start)
+        if not valid.any():
+            return
+        keys = np.floor(start[valid] / DAY).astype(np.int64) * len(STATES) + state[valid]
+        keys, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            day, code = divmod(key, len(STATES))
+            if day not in self.daily:
+                self.daily[day] = np.zeros(len(STATES), np.int64)
+            self.daily[day][code] += count
+
+    def stateCounts(self) -> np.ndarray:
+        return np.array(self.counts, dtype=np.int64).reshape(len(self.dag_ids), len(STATES))
+
+    def failureRates(self, counts:np.ndarray) -> np.ndarray:
+        total = counts.sum(axis=1)
+        return np.divide(counts[:, FAILED], total, out=np.zeros(len(total)), where=total > 0)
+
+    def dailyCounts(self) -> tuple:
+        if not self.daily:
+            return np.empty(0, np.int64), np.empty((0, len(STATES)), np.int64)
+        first = min(self.daily)
+        counts = np.zeros((max(self.daily) - first + 1, len(STATES)), np.int64)
+        for day, values in self.daily.items():
+            counts[day - first] = values
+        return first + np.arange(len(counts)), counts
+
+    def partial(self) -> dict:
+        # somas e sketches por dag e contagens por dia, que podem ser juntadas com as de outros shards em mergePartials.
+        counts = self.stateCounts()
+        days, daily = self.dailyCounts()
+        return {
+            'sla': {'duration': self.sla, 'delay': self.delay_sla},
+            'dags': [{'dag_id': dag_id,
+                      'states': dict(zip(STATES, counts[i].tolist())),
+                      'duration_count': self.durations[i].count,
+                      'duration_sum': self.durations[i].sum,
+                      'duration_max': self.durations[i].max if self.durations[i].count else None,
+                      'duration_sketch': self.durations[i].toDict(),
+                      'delay_sketch': self.delays[i].toDict(),
+                      'sla_breaches': dict(self.breaches[i])}
+                     for i, dag_id in enumerate(self.dag_ids)],
+            'daily': [{'day': datetime.fromtimestamp(int(day) * DAY, timezone.utc).strftime('%Y-%m-%d'),
+                       'states': dict(zip(STATES, daily[i].tolist()))}
+                      for i, day in enumerate(days)],
+        }
+
+    def report(self) -> dict:
+        return mergePartials([self.partial()])
+
+def sketchStats(sketch:DDSketch) -> dict:
+    if sketch is None or not sketch.count:
+        return {}
+    return {'mean': sketch.mean(), 'p50': sketch.quantile(0.5), 'p95': sketch.quantile(0.95),
+            'p99': sketch.quantile(0.99), 'max': sketch.max}
+
+def timing(name:str, sketch:DDSketch, count:int=0, total:float=0.0, maximum:float=None) -> dict:
+    # sem sketch (agregados do store) só a média e o máximo, quando existem.
+    stats = sketchStats(sketch)
+    if sketch is None and count:
+        stats = {'mean': total / count, 'max': maximum}
+    return {f'{name}_{x}': stats.get(x) for x in ('mean', 'p50', 'p95', 'p99', 'max')}
+
+def mergePartials(partials:list) -> dict:
+    # mesmo formato do RunColumns.report; os quantis saem dos sketches juntados.
+    dags = {}
+    daily = {}
+    sla = {'duration': None, 'delay': None}
+    for partial in partials:
+        sla = partial.get('sla', sla)
+        for dag in partial['dags']:
+            merged = dags.setdefault(dag['dag_id'], {'states': dict.fromkeys(STATES, 0), 'duration_count': 0,
+                                                     'duration_sum': 0.0, 'duration_max': None, 'duration': None,
+                                                     'delay': None, 'sla_breaches': {'duration': 0, 'delay': 0}})
+            for state, count in dag['states'].items():
+                merged['states'][state] = merged['states'][state] + count
+            merged['duration_count'] = merged['duration_count'] + dag['duration_count']
+            merged['duration_sum'] = merged['duration_sum'] + dag['duration_sum']
+            if dag['duration_max'] is not None:
+                merged['duration_max'] = max(merged['duration_max'] or dag['duration_max'], dag['duration_max'])
+            for name in ('duration', 'delay'):
+                if f'{name}_sketch' in dag:
+                    sketch = DDSketch.fromDict(dag[f'{name}_sketch'])
+                    merged[name] = sketch if merged[name] is None else merged[name].merge(sketch)
+            for name, count in dag.get('sla_breaches', {}).items():
+                merged['sla_breaches'][name] = merged['sla_breaches'][name] + count
+        for day in partial['daily']:
+            merged = daily.setdefault(day['day'], dict.fromkeys(STATES, 0))
+            for state, count in day['states'].items():
+                merged[state] = merged[state] + count
+    states = {state: sum(x['states'][state] for x in dags.values()) for state in STATES}
+    total_runs = sum(states.values())
+    sketches = {}
+    for name in ('duration', 'delay'):
+        parts = [x[name] for x in dags.values() if x[name] is not None]
+        sketches[name] = DDSketch().merge(parts[0]) if parts else None
+        for part in parts[1:]:
+            sketches[name].merge(part)
+    duration = sketchStats(sketches['duration'])
+    if sketches['duration'] is None:
+        duration_count = sum(x['duration_count'] for x in dags.values())
+        maximums = [x['duration_max'] for x in dags.values() if x['duration_max'] is not None]
+        if duration_count:
+            duration['mean'] = sum(x['duration_sum'] for x in dags.values()) / duration_count
+        # os agregados diários do store não guardam o máximo.
+        if maximums:
+            duration['max'] = max(maximums)
+    report = {
+        'total_runs': total_runs,
+        'states': states,
+        'failure_rate': states['failed'] / total_runs if total_runs else 0.0,
+        'duration': duration,
+        'delay': sketchStats(sketches['delay']),
+        'dags': [],
+        'daily': [{'day': day, 'states': daily[day]} for day in sorted(daily)],
+    }
+    for dag_id, x in sorted(dags.items()):
+        runs = sum(x['states'].values())
+        dag = {'dag_id': dag_id,
+               'states': x['states'],
+               'failure_rate': x['states']['failed'] / runs if runs else 0.0}
+        dag.update(timing('duration', x['duration'], x['duration_count'], x['duration_sum'], x['duration_max']))
+        dag.update(timing('delay', x['delay']))
+        dag['sla_breaches'] = x['sla_breaches']
+        report['dags'].append(dag)
+    if sla['duration'] is not None or sla['delay'] is not None:
+        report['sla'] = {'duration': sla['duration'], 'delay': sla['delay'],
+                         'duration_breaches': sum(x['sla_breaches']['duration'] for x in dags.values()),
+                         'delay_breaches': sum(x['sla_breaches']['delay'] for x in dags.values())}
+    return report
+
+def rollupPartial(dag_ids:list, rows:list) -> dict:
+    # linhas (dag_id, dia, estado, execuções, soma das durações) do store.getRollups, no formato do RunColumns.partial.
+    dags = {dag_id: {'dag_id': dag_id, 'states': dict.fromkeys(STATES, 0), 'duration_count': 0,
+                     'duration_sum': 0.0, 'duration_max': None} for dag_id in dag_ids}
+    daily = {}
+    for dag_id, day, state, runs, duration_sum in rows:
+        if dag_id not in dags:
+            continue
+        state = state if state in STATE_CODES else 'other'
+        dag = dags[dag_id]
+        dag['states'][state] = dag['states'][state] + runs
+        dag['duration_count'] = dag['duration_count'] + runs
+        dag['duration_sum'] = dag['duration_sum'] + duration_sum
+        counts = daily.setdefault(day, dict.fromkeys(STATES, 0))
+        counts[state] = counts[state] + runs
+    # dias sem execução também aparecem, como no RunColumns.dailyCounts.
+    days = range(min(daily), max(daily) + 1) if daily else []
+    return {'dags': list(dags.values()),
+            'daily': [{'day': datetime.fromtimestamp(day * DAY, timezone.utc).strftime('%Y-%m-%d'),
+                       'states': daily.get(day, dict.fromkeys(STATES, 0))} for day in days]}
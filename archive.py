@@ -0,0 +1,198 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import threading
+from urllib.parse import urlsplit, parse_qs
+from records import toEpochMs
+
+MAGIC = b'AFARCHIVE1\n'
+HEADER = struct.Struct('>I')
+
+def requestKey(method:str, url:str, payload=None) -> str:
+    # a chave não inclui o host, o mesmo arquivo serve para qualquer baseURL.
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = json.dumps(json.loads(payload), sort_keys=True)
+        except ValueError:
+            payload = payload.decode('utf8') if isinstance(payload, bytes) else payload
+    elif payload is not None:
+        payload = json.dumps(payload, sort_keys=True)
+    return f'{method.upper()} {path} {payload or ""}'
+
+class ArchivedResponse(object):
+    # o mínimo de requests.Response usado pelo monitor.
+
+    def __init__(self, status_code:int, content:bytes, url:str) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.url = url
+        self.headers = {'Content-Type': 'application/json', 'Content-Length': str(len(content))}
+        self.ok = status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size:int=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+# Grava cada resposta comprimida com zlib, precedida de um cabeçalho JSON com a chave da requisição.
+class ArchiveWriter(object):
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, mode='ab')
+        if new:
+            self.file.write(MAGIC)
+
+    def record(self, method:str, url:str, payload, status_code:int, content:bytes) -> None:
+        body = zlib.compress(content or b'')
+        header = json.dumps({'key': requestKey(method, url, payload), 'url': url,
+                             'status': status_code, 'size': len(body)}).encode('utf8')
+        with self.lock:
+            self.file.write(HEADER.pack(len(header)) + header + body)
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+# Lê o arquivo por mmap: o índice guarda só a posição de cada resposta, descomprimida quando pedida.
+# Consultas que não foram gravadas exatamente (outro filtro ou janela) são respondidas filtrando
+# as dags e execuções que estão no arquivo.
+class ArchiveReader(object):
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self.file = open(path, mode='rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'arquivo {path} não é um arquivo de requisições gravado com --record.')
+        self.index = {}
+        self.base_url = None
+        self.scan()
+        self.lock = threading.Lock()
+        self.derived = {}
+
+    def scan(self) -> None:
+        pos = len(MAGIC)
+        while pos + HEADER.size <= len(self.data):
+            (length,) = HEADER.unpack_from(self.data, pos)
+            start = pos + HEADER.size + length
+            # gravação interrompida no meio da última resposta.
+            if start > len(self.data):
+                break
+            header = json.loads(self.data[pos + HEADER.size:start])
+            if start + header['size'] > len(self.data):
+                break
+            self.index[header['key']] = (header['status'], start, header['size'])
+            if self.base_url is None:
+                parts = urlsplit(header['url'])
+                self.base_url = f'{parts.scheme}://{parts.netloc}'
+            pos = start + header['size']
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def read(self, key:str) -> tuple:
+        status, offset, size = self.index[key]
+        return status, zlib.decompress(self.data[offset:offset + size])
+
+    def responses(self, method:str, path:str) -> list:
+        items = []
+        for key in self.index:
+            key_method, rest = key.split(' ', 1)
+            if key_method == method and rest.split(' ', 1)[0].split('?', 1)[0] == path:
+                status, content = self.read(key)
+                if status < 400:
+                    items.append(json.loads(content))
+        return items
+
+    def collect(self, method:str, path:str, field:str, key_fields:tuple) -> list:
+        # junta os itens de todas as respostas gravadas do endpoint, sem repetir.
+        with self.lock:
+            if path not in self.derived:
+                items = {}
+                for response in self.responses(method, path):
+                    for item in response.get(field, []):
+                        items.setdefault(tuple(item.get(x) for x in key_fields), item)
+                self.derived[path] = list(items.values())
+            return self.derived[path]
+
+    def listDags(self, query:dict) -> dict:
+        dags = self.collect('GET', '/api/v1/dags', 'dags', ('dag_id',))
+        if query.get('only_active', ['false'])[0] == 'true':
+            dags = [x for x in dags if x.get('is_active', True)]
+        if 'dag_id_pattern' in query:
+            pattern = query['dag_id_pattern'][0].lower()
+            dags = [x for x in dags if pattern in x['dag_id'].lower()]
+        if 'tags' in query:
+            dags = [x for x in dags if any(t['name'] in query['tags'] for t in x.get('tags') or [])]
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+        return {'dags': dags[offset:offset + limit], 'total_entries': len(dags)}
+
+    def listDagRuns(self, body:dict) -> dict:
+        runs = self.collect('POST', '/api/v1/dags/~/dagRuns/list', 'dag_runs', ('dag_id', 'dag_run_id'))
+        dag_ids = set(body.get('dag_ids') or [])
+        bounds = [(name, toEpochMs(body[name])) for name in ('start_date_gte', 'start_date_lte', 'end_date_lte')
+                  if body.get(name)]
+        selected = []
+        for run in runs:
+            if dag_ids and run['dag_id'] not in dag_ids:
+                continue
+            if all(self.inBounds(run, name, bound) for name, bound in bounds):
+                selected.append(run)
+        offset = int(body.get('page_offset', 0))
+        limit = int(body.get('page_limit', 100))
+        return {'dag_runs': selected[offset:offset + limit], 'total_entries': len(selected)}
+
+    def inBounds(self, run:dict, name:str, bound:int) -> bool:
+        field, operator = name.rsplit('_', 1)
+        value = run.get(field)
+        if value is None:
+            return False
+        value = toEpochMs(value)
+        return value >= bound if operator == 'gte' else value <= bound
+
+    def listTaskInstances(self, body:dict) -> dict:
+        tasks = self.collect('POST', '/api/v1/dags/~/dagRuns/~/taskInstances/list', 'task_instances',
+                             ('dag_id', 'dag_run_id', 'task_id', 'map_index'))
+        dag_ids = set(body.get('dag_ids') or [])
+        run_ids = set(body.get('dag_run_ids') or [])
+        states = set(body.get('state') or [])
+        selected = [x for x in tasks if (not dag_ids or x['dag_id'] in dag_ids)
+                    and (not run_ids or x['dag_run_id'] in run_ids) and (not states or x['state'] in states)]
+        offset = int(body.get('page_offset', 0))
+        limit = int(body.get('page_limit', 100))
+        return {'task_instances': selected[offset:offset + limit], 'total_entries': len(selected)}
+
+    def replay(self, method:str, url:str, payload=None) -> ArchivedResponse:
+        key = requestKey(method, url, payload)
+        if key in self.index:
+            status, content = self.read(key)
+            return ArchivedResponse(status, content, url)
+        parts = urlsplit(url)
+        body = json.loads(payload) if isinstance(payload, (str, bytes)) and payload else {}
+        if method.upper() == 'GET' and parts.path == '/api/v1/dags':
+            result = self.listDags(parse_qs(parts.query))
+        elif method.upper() == 'POST' and parts.path == '/api/v1/dags/~/dagRuns/list':
+            result = self.listDagRuns(body)
+        elif method.upper() == 'POST' and parts.path == '/api/v1/dags/~/dagRuns/~/taskInstances/list':
+            result = self.listTaskInstances(body)
+        else:
+            return None
+        return ArchivedResponse(200, json.dumps(result).encode('utf8'), url)
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
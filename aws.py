@@ -1,26 +1,47 @@
 import os
-import boto3
+import threading
 
 from pathlib import Path
 from configparser import ConfigParser
+from datetime import datetime, timedelta, timezone
+
+# boto3 takes longer to import than the rest of the monitor, load it only when a client is needed.
+boto3 = None
+
+def loadBoto3():
+    global boto3
+    if boto3 is None:
+        import boto3 as module
+        boto3 = module
+    return boto3
 
 class AWS(object):
     
-    def __init__(self, logger):
+    # refresh temporary credentials a little before they really expire.
+    REFRESH_MARGIN = timedelta(minutes=5)
+
+    def __init__(self, logger, environment: dict = None):
         self.logger = logger
         self.credentials = None
+        self.clients = {}
+        self.lock = threading.RLock()
+        # without an environment the settings come from the environment variables, one per monitored environment otherwise.
+        self.environment = os.environ if environment is None else environment
         # Obrigatory parameters
-        self.region = os.environ.get('AWS_REGION', None)
-        self.access_key_id = os.environ.get('AWS_ACCESS_KEY_ID', None)
-        self.secret_access_key = os.environ.get('AWS_SECRET_ACCESS_KEY', None)
+        self.region = self.environment.get('AWS_REGION', None)
+        self.access_key_id = self.environment.get('AWS_ACCESS_KEY_ID', None)
+        self.secret_access_key = self.environment.get('AWS_SECRET_ACCESS_KEY', None)
         # optionals parameters
-        self.role_arn = os.environ.get('AWS_ROLE_ARN', None)
-        self.role_session_name = os.environ('AWS_ROLE_SESSION_NAME', None)
+        self.role_arn = self.environment.get('AWS_ROLE_ARN', None)
+        self.role_session_name = self.environment.get('AWS_ROLE_SESSION_NAME', None)
         
         self.aws_conf = Path(f'{os.environ.get("HOME")}/.aws/credentials')
         
-        if self.aws_conf.is_file():
-            self._parseConfig()
+        if self.access_key_id is not None and environment is not None:
+            # keys given for this environment are not replaced by the default profile of the file.
+            self.logger.info('Running on the environment credentials.')
+        elif self.aws_conf.is_file():
+            self._parseConfig(profile=self.environment.get('AWS_PROFILE', 'default'))
         else:
             self.logger.info(f"File '{self.aws_conf}' not found. Running on environment variables.")
         
@@ -47,9 +68,9 @@ class AWS(object):
         self.role_arn = parser[profile].get('role_arn', None)
         self.role_session_name = parser[profile].get('role_session_name', None)
 
-    def _createSession(self) -> boto3.session.Session:
+    def _createSession(self) -> 'boto3.session.Session':
         self.logger.info(f'creating boto3 session.')
-        return boto3.session.Session(
+        return loadBoto3().session.Session(
             aws_access_key_id = self.access_key_id,
             aws_secret_access_key = self.secret_access_key,
             region_name = self.region,
@@ -57,14 +78,18 @@ class AWS(object):
         )
 
     def _assumeRole(self) -> dict:
+        if self.role_arn is None or self.role_session_name is None:
+            # without a role the user keys are used directly and never expire.
+            return {'AccessKeyId': self.access_key_id,
+                    'SecretAccessKey': self.secret_access_key,
+                    'SessionToken': None}
         sts_session = self._createSession()
         sts_client = sts_session.client('sts')
-        if self.role_arn is not None and self.role_session_name is not None:
-            self.logger.info(f'assuming role: {self.role_arn}.')
-            sts_response = sts_client.assume_role(
-                RoleArn = self.role_arn,
-                RoleSessionName = self.role_session_name
-            )
+        self.logger.info(f'assuming role: {self.role_arn}.')
+        sts_response = sts_client.assume_role(
+            RoleArn = self.role_arn,
+            RoleSessionName = self.role_session_name
+        )
         credentials = sts_response['Credentials']
         return credentials
 
@@ -75,32 +100,49 @@ class AWS(object):
             'access_key': cred['AccessKeyId'],
             'secret_key': cred['SecretAccessKey'],
             'session_token': cred['SessionToken'],
-            'region': self.region
+            'region': self.region,
+            'expiration': cred.get('Expiration')
         }
         return aws_session
-    
-    def createClient(self, service_name: str) -> boto3.session.Session.client:
+
+    def credentialsExpired(self) -> bool:
         if self.credentials is None:
-            self.credentials = self.createAWSSession()
-        self.logger.info('creating boto3 client.')
-        cliente = boto3.client(
-            service_name,
-            region_name = self.region,
-            aws_access_key_id = self.credentials['access_key'],
-            aws_secret_access_key = self.credentials['secret_key'],
-            aws_session_token = self.credentials['session_token']
-        )
-        
+            return True
+        expiration = self.credentials['expiration']
+        return expiration is not None and datetime.now(timezone.utc) >= expiration - self.REFRESH_MARGIN
+
+    def getCredentials(self) -> dict:
+        with self.lock:
+            if self.credentialsExpired():
+                self.credentials = self.createAWSSession()
+                # clients are bound to the credentials they were created with.
+                self.clients = {}
+            return self.credentials
+
+    def createClient(self, service_name: str, region: str = None) -> 'boto3.session.Session.client':
+        region = region or self.region
+        with self.lock:
+            credentials = self.getCredentials()
+            cliente = self.clients.get((service_name, region))
+            if cliente is None:
+                self.logger.info(f'creating boto3 client: {service_name} ({region}).')
+                cliente = loadBoto3().client(
+                    service_name,
+                    region_name = region,
+                    aws_access_key_id = credentials['access_key'],
+                    aws_secret_access_key = credentials['secret_key'],
+                    aws_session_token = credentials['session_token']
+                )
+                self.clients[(service_name, region)] = cliente
         return cliente
     
-    def createResource(self, service_name: str) -> boto3.session.Session.resource:
-        if self.credentials is None:
-            self.credentials = self.createAWSSession()
+    def createResource(self, service_name: str) -> 'boto3.session.Session.resource':
+        credentials = self.getCredentials()
         self.logger.info('creating boto3 resource.')
-        recurso = boto3.resource(
+        recurso = loadBoto3().resource(
             service_name,
-            aws_access_key_id = self.credentials['access_key'],
-            aws_secret_access_key = self.credentials['secret_key'],
-            aws_session_token = self.credentials['session_token'],
+            aws_access_key_id = credentials['access_key'],
+            aws_secret_access_key = credentials['secret_key'],
+            aws_session_token = credentials['session_token'],
         )
         return recurso
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timedelta, timezone
+from airflow import AirflowMonitor
+from mockAirflow import MockAirflowServer
+
+# Mede o caminho de coleta contra o servidor local do mockAirflow, sem tocar um Airflow de verdade.
+SCENARIOS = {
+    'small': {'dag_count': 50, 'runs_per_dag': 20},
+    'many_dags': {'dag_count': 3000, 'runs_per_dag': 5, 'batch_size': 100},
+    'many_runs': {'dag_count': 20, 'runs_per_dag': 2000},
+    'latency': {'dag_count': 300, 'runs_per_dag': 10, 'latency': 0.02, 'workers': 8},
+    'errors': {'dag_count': 200, 'runs_per_dag': 10, 'error_rate': 0.05, 'workers': 4},
+}
+# Início do processo nos jobs curtos e health checks: --help e import dos módulos de entrada.
+STARTUP_COMMANDS = {
+    'help': ['airflow.py', '--help'],
+    'import_airflow': ['-c', 'import airflow'],
+    'import_mwaa': ['-c', 'import airflowMWAA'],
+    'import_multiEnv': ['-c', 'import multiEnv'],
+}
+HEAVY_MODULES = ('requests', 'boto3', 'botocore', 'numpy')
+DEFAULTS = {'dag_count': 100, 'runs_per_dag': 10, 'max_page_limit': 100, 'latency': 0.0, 'error_rate': 0.0,
+            'workers': 1, 'batch_size': 100, 'page_limit': 100}
+
+class Benchmark(object):
+
+    def __init__(self, logger: object = None) -> None:
+        self.logger = logger or logging.getLogger('Benchmark')
+        if logger is None:
+            self.logger.setLevel(logging.INFO)
+            self.logger.addHandler(logging.StreamHandler())
+
+    def peakRss(self) -> float:
+        # ru_maxrss vem em KB no linux, é o pico do processo inteiro e não só do cenário.
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)
+
+    def measure(self, server:MockAirflowServer, name:str, function) -> dict:
+        requests_before = server.request_count
+        # o servidor simulado roda no mesmo processo, então o cpu inclui o tempo dele.
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        function()
+        wall = time.perf_counter() - wall
+        requests = server.request_count - requests_before
+        return {'step': name,
+                'wall_seconds': round(wall, 4),
+                'cpu_seconds': round(time.process_time() - cpu, 4),
+                'requests': requests,
+                'requests_per_second': round(requests / wall, 2) if wall else None,
+                'peak_rss_mb': self.peakRss()}
+
+    def createMonitor(self, server:MockAirflowServer, options:dict) -> AirflowMonitor:
+        quiet = logging.getLogger('BenchmarkMonitor')
+        quiet.setLevel(logging.ERROR)
+        monitor = AirflowMonitor(logger=quiet, environment={'AIRFLOW_URL': server.url,
+                                                            'AIRFLOW_USERNAME': 'benchmark',
+                                                            'AIRFLOW_PASSWORD': 'benchmark'})
+        # initializeLogger volta o logger para INFO, os avisos de retry poluiriam o resultado.
+        monitor.logger.setLevel(logging.ERROR)
+        monitor.setBatchOptions(batch_size=options['batch_size'], page_limit=options['page_limit'])
+        monitor.setTransportOptions(retries=10, backoff=0.01)
+        monitor.setWorkers(workers=options['workers'])
+        return monitor
+
+    def runScenario(self, name:str, overrides:dict) -> dict:
+        options = dict(DEFAULTS, **overrides)
+        end_date = datetime(2024, 8, 15, tzinfo=timezone.utc)
+        server = MockAirflowServer(dag_count=options['dag_count'], runs_per_dag=options['runs_per_dag'],
+                                   max_page_limit=options['max_page_limit'], latency=options['latency'],
+                                   error_rate=options['error_rate'], end_date=end_date).start()
+        try:
+            monitor = self.createMonitor(server, options)
+            end_date = end_date.replace(tzinfo=None)
+            qtdDias = options['runs_per_dag'] // 24 + 2
+            start_date = end_date - timedelta(days=qtdDias)
+            dag_id = server.dags[0]['dag_id']
+            steps = [self.measure(server, 'listAllActiveDags', monitor.listAllActiveDags),
+                     self.measure(server, 'getAllExecutionsByDagId',
+                                  lambda: monitor.getAllExecutionsByDagId(dag_id, start_date, end_date)),
+                     self.measure(server, 'run', lambda: monitor.run(end_date=end_date, qtdDias=qtdDias))]
+        finally:
+            server.stop()
+        self.logger.info(f'{name}: ' + ', '.join(f'{x["step"]} {x["wall_seconds"]}s' for x in steps))
+        return {'scenario': name, 'options': options, 'steps': steps}
+
+    def parseImportTime(self, stderr:str) -> tuple:
+        # linhas do -X importtime: "import time: self [us] | cumulative | nome", com recuo nos imports internos.
+        total = 0
+        modules = {}
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  '):
+                total = total + int(cumulative)
+            modules[name.strip()] = int(cumulative)
+        return total / 1e6, {x: round(modules[x] / 1e6, 4) for x in HEAVY_MODULES if x in modules}
+
+    def measureStartup(self, repeat:int=5) -> list:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        results = []
+        for name, args in STARTUP_COMMANDS.items():
+            walls = []
+            for _ in range(repeat):
+                wall = time.perf_counter()
+                subprocess.run([sys.executable] + args, cwd=directory, capture_output=True, check=True)
+                walls.append(time.perf_counter() - wall)
+            process = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=directory,
+                                     capture_output=True, text=True, check=True)
+            import_seconds, heavy = self.parseImportTime(process.stderr)
+            walls.sort()
+            results.append({'command': name,
+                            'wall_seconds_min': round(walls[0], 4),
+                            'wall_seconds_median': round(walls[len(walls) // 2], 4),
+                            'import_seconds': round(import_seconds, 4),
+                            'heavy_modules': heavy})
+            self.logger.info(f'startup {name}: {round(walls[0], 4)}s, imports {round(import_seconds, 4)}s, {sorted(heavy)}')
+        return results
+
+    def parseArgs(self, arg_list: list[str] | None):
+        parser = argparse.ArgumentParser(description='Benchmark da coleta do monitor contra um Airflow simulado.')
+        parser.add_argument('--scenario', type=str, action='append', choices=sorted(SCENARIOS), default=None,
+                            help='Cenário a ser executado. Pode ser repetido. Default = todos')
+        parser.add_argument('-o', '--output', type=str, default=None,
+                            help='Arquivo JSON onde os resultados serão gravados. Default = saída padrão')
+        parser.add_argument('--startup', action='store_true',
+                            help='Mede o tempo de início do processo e dos imports. Sem --scenario não roda os cenários.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Quantidade de execuções de cada comando no --startup. Default = 5')
+        for option, value in DEFAULTS.items():
+            parser.add_argument(f'--{option}', type=type(value), default=None,
+                                help=f'Sobrescreve {option} em todos os cenários.')
+        return parser.parse_args(arg_list)
+
+    def main(self, arg_list: list[str] | None) -> list:
+        if arg_list and '.py' in arg_list[0]:
+            arg_list = arg_list[1:]
+        args = self.parseArgs(arg_list)
+        overrides = {k: getattr(args, k) for k in DEFAULTS if getattr(args, k) is not None}
+        scenarios = args.scenario or ([] if args.startup else SCENARIOS)
+        results = [self.runScenario(name, dict(SCENARIOS[name], **overrides)) for name in scenarios]
+        report = {'python': sys.version.split()[0], 'results': results}
+        if args.startup:
+            report['startup'] = self.measureStartup(repeat=args.repeat)
+        output = json.dumps(report, indent=2)
+        if args.output is None:
+            print(output)
+        else:
+            with open(args.output, mode='w', encoding='utf8') as f:
+                f.write(output)
+        return results
+
+if __name__ == "__main__":
+    Benchmark().main(sys.argv) # pragma: no cover
@@ -0,0 +1,49 @@
+import os
+import json
+import threading
+from records import DagRuns
+
+# Fatias (lote de dags x intervalo de tempo) já consultadas, uma por linha em NDJSON.
+# Uma execução interrompida volta a partir do arquivo e só consulta as fatias que faltam.
+class Checkpoint(object):
+
+    def __init__(self, path:str, logger=None) -> None:
+        self.path = path
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.shards = {}
+        self.load()
+        self.file = open(path, mode='a', encoding='utf8')
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, mode='rb+') as f:
+            data = f.read()
+            # descarta a última linha se o processo parou no meio da gravação.
+            complete = data.rfind(b'\n') + 1
+            if complete < len(data):
+                f.truncate(complete)
+        for line in data[:complete].decode('utf8').splitlines():
+            entry = json.loads(line)
+            key = tuple(entry['shard'])
+            for dag_id, rows in entry['dags'].items():
+                self.shards[(dag_id, key)] = rows
+        if self.logger is not None:
+            self.logger.info(f'Checkpoint {self.path} com {len(self.shards)} fatias de dags concluidas')
+
+    def get(self, dag_ids:list, key:tuple) -> dict:
+        key = tuple(key)
+        with self.lock:
+            if not all((dag_id, key) in self.shards for dag_id in dag_ids):
+                return None
+            return {dag_id: DagRuns.fromRows(dag_id, self.shards[(dag_id, key)]) for dag_id in dag_ids}
+
+    def save(self, key:tuple, runs_by_dag:dict) -> None:
+        line = json.dumps({'shard': list(key), 'dags': {dag_id: runs.rows() for dag_id, runs in runs_by_dag.items()}})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
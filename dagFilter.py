@@ -0,0 +1,117 @@
+import re
+import json
+import hashlib
+from fnmatch import translate
+
+def parseShard(value:str) -> tuple:
+    # "i/N": shard i (começando em 0) de N.
+    try:
+        shard, shards = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise ValueError(f'shard em formato inválido: {value}, formato esperado: i/N')
+    if shards < 1 or not 0 <= shard < shards:
+        raise ValueError(f'shard {value} fora do intervalo, esperado 0 <= i < N.')
+    return shard, shards
+
+def shardOf(dag_id:str, shards:int) -> int:
+    # hash estável entre processos e máquinas, o hash() do python muda a cada execução.
+    digest = hashlib.blake2b(dag_id.encode('utf8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+# Todos os critérios de seleção de dags compilados em uma única regex.
+# Dentro de cada critério basta um dos valores, entre critérios todos precisam bater.
+class DagFilter(object):
+
+    def __init__(self, prefixes:list=None, suffixes:list=None, globs:list=None, regexes:list=None,
+                 excludes:list=None, tags:list=None, exclude_tags:list=None) -> None:
+        self.prefixes = [x.lower() for x in prefixes or []]
+        self.suffixes = [x.lower() for x in suffixes or []]
+        self.globs = [x.lower() for x in globs or []]
+        self.regexes = list(regexes or [])
+        self.excludes = [x.lower() for x in excludes or []]
+        self.tags = set(tags or [])
+        self.exclude_tags = set(exclude_tags or [])
+        self.pattern = self.compile()
+
+    @classmethod
+    def splitValues(cls, value:str) -> list:
+        if value is None:
+            return []
+        return [x.strip() for x in value.split(',') if x.strip()]
+
+    @classmethod
+    def fromArgs(cls, prefix:str=None, suffix:str=None, globs:list=None, regexes:list=None,
+                 excludes:list=None, tags:list=None, exclude_tags:list=None, filter_file:str=None) -> 'DagFilter':
+        spec = {}
+        if filter_file is not None:
+            with open(filter_file, mode='r', encoding='utf8') as f:
+                spec = json.load(f)
+        # -p e -s aceitam vários valores separados por vírgula.
+        return cls(prefixes=cls.splitValues(prefix) + spec.get('prefixes', []),
+                   suffixes=cls.splitValues(suffix) + spec.get('suffixes', []),
+                   globs=(globs or []) + spec.get('globs', []),
+                   regexes=(regexes or []) + spec.get('regexes', []),
+                   excludes=(excludes or []) + spec.get('excludes', []),
+                   tags=(tags or []) + spec.get('tags', []),
+                   exclude_tags=(exclude_tags or []) + spec.get('exclude_tags', []))
+
+    def compile(self) -> re.Pattern:
+        parts = []
+        if self.prefixes:
+            parts.append('(?=' + '|'.join(re.escape(x) for x in self.prefixes) + ')')
+        if self.suffixes:
+            parts.append(r'(?=.*(?:' + '|'.join(re.escape(x) for x in self.suffixes) + r')\Z)')
+        if self.globs:
+            parts.append('(?=' + '|'.join(translate(x) for x in self.globs) + ')')
+        if self.regexes:
+            parts.append('(?=.*?(?:' + '|'.join(f'(?i:{x})' for x in self.regexes) + '))')
+        if self.excludes:
+            parts.append('(?!' + '|'.join(translate(x) for x in self.excludes) + ')')
+        return re.compile(''.join(parts), re.DOTALL)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.prefixes or self.suffixes or self.globs or self.regexes or self.excludes
+                    or self.tags or self.exclude_tags)
+
+    @property
+    def needsTags(self) -> bool:
+        return bool(self.tags or self.exclude_tags)
+
+    def serverPattern(self) -> str:
+        # o dag_id_pattern do Airflow aceita um único "contém", só dá para enviar quando há um valor só.
+        if len(self.prefixes) == 1:
+            return self.prefixes[0]
+        if not self.prefixes and len(self.suffixes) == 1:
+            return self.suffixes[0]
+        return None
+
+    def matches(self, lower_id:str, tags:set=None) -> bool:
+        if self.pattern.match(lower_id) is None:
+            return False
+        if self.tags and not (self.tags & (tags or set())):
+            return False
+        return not (self.exclude_tags & (tags or set()))
+
+    def apply(self, dag_ids:list, tags:dict=None) -> list:
+        return DagIndex(dag_ids, tags=tags).select(self)
+
+# Listagem de dags com os ids já em minúsculo, montada uma vez e reaproveitada por vários filtros.
+class DagIndex(object):
+
+    def __init__(self, dag_ids:list, tags:dict=None) -> None:
+        self.dag_ids = list(dag_ids)
+        self.lower = [x.lower() for x in self.dag_ids]
+        self.tags = {dag_id: set(x) for dag_id, x in (tags or {}).items()}
+
+    def __len__(self) -> int:
+        return len(self.dag_ids)
+
+    def select(self, dag_filter:DagFilter) -> list:
+        if dag_filter.empty:
+            return list(self.dag_ids)
+        if not dag_filter.needsTags:
+            match = dag_filter.pattern.match
+            return [dag_id for dag_id, lower in zip(self.dag_ids, self.lower) if match(lower)]
+        return [dag_id for dag_id, lower in zip(self.dag_ids, self.lower)
+                if dag_filter.matches(lower, self.tags.get(dag_id))]
@@ -0,0 +1,80 @@
+import re
+import json
+import codecs
+
+# Únicos campos das execuções usados pelo monitor, o restante (conf, note, ...) é descartado.
+RUN_FIELDS = ('dag_id', 'dag_run_id', 'state', 'start_date', 'end_date', 'logical_date')
+TASK_FIELDS = ('dag_id', 'dag_run_id', 'task_id', 'state')
+
+class DagRunStream(object):
+    # Decodifica o array "dag_runs" item a item enquanto o corpo chega, sem montar a resposta inteira.
+
+    def __init__(self, chunks, fields:tuple=RUN_FIELDS, key:str='dag_runs') -> None:
+        self.chunks = iter(chunks)
+        self.fields = fields
+        self.key = key
+        self.total_entries = None
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.head = ''
+
+    def readMore(self) -> bool:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.buffer = self.buffer + self.utf8.decode(b'', final=True)
+            return False
+        # descarta o que já foi decodificado para não crescer o buffer.
+        self.buffer = self.buffer[self.pos:] + (self.utf8.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        self.pos = 0
+        return True
+
+    def skip(self, chars:str) -> bool:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in chars:
+                self.pos = self.pos + 1
+            if self.pos < len(self.buffer) or not self.readMore():
+                return self.pos < len(self.buffer)
+
+    def seekArray(self) -> bool:
+        pattern = re.compile(r'"' + re.escape(self.key) + r'"\s*:\s*\[')
+        while True:
+            match = pattern.search(self.buffer, self.pos)
+            if match is not None:
+                self.head = self.buffer[:match.start()]
+                self.pos = match.end()
+                return True
+            if not self.readMore():
+                return False
+
+    def project(self, item:dict) -> dict:
+        if self.fields is None:
+            return item
+        return {field: item.get(field) for field in self.fields}
+
+    def readTail(self) -> None:
+        while self.readMore():
+            pass
+        match = re.search(r'"total_entries"\s*:\s*(\d+)', self.head + self.buffer[self.pos:])
+        if match is not None:
+            self.total_entries = int(match.group(1))
+
+    def __iter__(self):
+        if not self.seekArray():
+            self.readTail()
+            return
+        while self.skip(' \t\r\n,'):
+            if self.buffer[self.pos] == ']':
+                self.pos = self.pos + 1
+                break
+            while True:
+                try:
+                    item, end = self.decoder.raw_decode(self.buffer, self.pos)
+                    break
+                except json.JSONDecodeError:
+                    if not self.readMore():
+                        raise
+            self.pos = end
+            yield self.project(item)
+        self.readTail()
@@ -0,0 +1,119 @@
+import csv
+import json
+from datetime import datetime, timezone
+
+# Colunas exportadas, com o tipo usado no parquet. Datas são epoch em segundos na memória.
+SUMMARY_COLUMNS = (('dag_id', 'string'), ('run_count', 'int64'), ('fail_count', 'int64'),
+                   ('failure_rate', 'float64'), ('window_start', 'timestamp'), ('window_end', 'timestamp'))
+RUN_COLUMNS = (('dag_id', 'string'), ('dag_run_id', 'string'), ('state', 'string'),
+               ('start_date', 'timestamp'), ('end_date', 'timestamp'), ('logical_date', 'timestamp'))
+
+def isoFormat(value) -> str:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+class NdjsonWriter(object):
+
+    def __init__(self, path:str, columns:tuple) -> None:
+        self.columns = columns
+        self.timestamps = [name for name, kind in columns if kind == 'timestamp']
+        self.file = open(path, mode='w', encoding='utf8')
+
+    def write(self, rows:list) -> None:
+        for row in rows:
+            row = dict(row)
+            for name in self.timestamps:
+                row[name] = isoFormat(row[name])
+            self.file.write(json.dumps(row) + '\n')
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+class CsvWriter(NdjsonWriter):
+
+    def __init__(self, path:str, columns:tuple) -> None:
+        super().__init__(path, columns)
+        self.writer = csv.DictWriter(self.file, fieldnames=[name for name, _ in columns])
+        self.writer.writeheader()
+
+    def write(self, rows:list) -> None:
+        for row in rows:
+            row = dict(row)
+            for name in self.timestamps:
+                row[name] = isoFormat(row[name])
+            self.writer.writerow(row)
+        self.file.flush()
+
+class ParquetWriter(object):
+    ROW_GROUP_SIZE = 50000
+
+    def __init__(self, path:str, columns:tuple) -> None:
+        # pyarrow só é necessário para exportar em parquet.
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('exportar em parquet precisa do pyarrow: pip install pyarrow')
+        self.pa = pyarrow
+        types = {'string': pyarrow.string(), 'int64': pyarrow.int64(), 'float64': pyarrow.float64(),
+                 'timestamp': pyarrow.timestamp('ms', tz='UTC')}
+        self.columns = columns
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.buffer = {name: [] for name, _ in columns}
+        self.buffered = 0
+
+    def write(self, rows:list) -> None:
+        for row in rows:
+            for name, kind in self.columns:
+                value = row[name]
+                if kind == 'timestamp' and value is not None:
+                    value = int(round(value * 1000))
+                self.buffer[name].append(value)
+        self.buffered = self.buffered + len(rows)
+        if self.buffered >= self.ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffered:
+            self.writer.write_table(self.pa.table(self.buffer, schema=self.schema))
+            self.buffer = {name: [] for name, _ in self.columns}
+            self.buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.writer.close()
+
+WRITERS = {'.ndjson': NdjsonWriter, '.jsonl': NdjsonWriter, '.json': NdjsonWriter,
+           '.csv': CsvWriter, '.parquet': ParquetWriter}
+
+def openWriter(path:str, columns:tuple):
+    extension = path[path.rfind('.'):].lower() if '.' in path else ''
+    if extension not in WRITERS:
+        raise ValueError(f'formato de exportação não suportado: {path}, use {", ".join(WRITERS)}')
+    return WRITERS[extension](path, columns)
+
+# Grava o resumo de cada dag, e opcionalmente as execuções, à medida que os lotes são analisados.
+class ResultExporter(object):
+
+    def __init__(self, path:str, runs_path:str=None) -> None:
+        self.summary = openWriter(path, SUMMARY_COLUMNS)
+        self.runs = openWriter(runs_path, RUN_COLUMNS) if runs_path is not None else None
+
+    def write(self, result_list:list, runs_by_dag:dict, start_date:float, end_date:float) -> None:
+        self.summary.write([{'dag_id': x['dag_id'],
+                             'run_count': x['run_count'],
+                             'fail_count': x['fail_count'],
+                             'failure_rate': x['fail_count'] / x['run_count'] if x['run_count'] else 0.0,
+                             'window_start': start_date,
+                             'window_end': end_date} for x in result_list])
+        if self.runs is not None:
+            for x in result_list:
+                self.runs.write([{name: run[name] for name, _ in RUN_COLUMNS} for run in runs_by_dag[x['dag_id']]])
+
+    def close(self) -> None:
+        self.summary.close()
+        if self.runs is not None:
+            self.runs.close()
@@ -0,0 +1,97 @@
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Tempo por fase, latência por endpoint e um resumo em JSON no fim da execução.
+class Instrumentation(object):
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+    def __init__(self, logger=None) -> None:
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.phases = {}
+        self.endpoints = {}
+        self.profiler = None
+
+    @contextmanager
+    def phase(self, name:str):
+        # fases executadas em vários workers somam o tempo de cada um.
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                phase = self.phases.setdefault(name, {'calls': 0, 'seconds': 0.0})
+                phase['calls'] = phase['calls'] + 1
+                phase['seconds'] = phase['seconds'] + elapsed
+
+    def endpoint(self, method:str, url:str) -> dict:
+        name = f'{method.upper()} {urlparse(url).path}'
+        if name not in self.endpoints:
+            self.endpoints[name] = {'calls': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0.0,
+                                    'histogram': [0] * len(self.BUCKETS)}
+        return self.endpoints[name]
+
+    def recordRequest(self, method:str, url:str, latency:float, size:int=0, error:bool=False) -> None:
+        with self.lock:
+            endpoint = self.endpoint(method, url)
+            endpoint['calls'] = endpoint['calls'] + 1
+            endpoint['errors'] = endpoint['errors'] + (1 if error else 0)
+            endpoint['bytes'] = endpoint['bytes'] + size
+            endpoint['seconds'] = endpoint['seconds'] + latency
+            for i, bucket in enumerate(self.BUCKETS):
+                if latency <= bucket:
+                    endpoint['histogram'][i] = endpoint['histogram'][i] + 1
+                    break
+
+    def recordRetry(self, method:str, url:str) -> None:
+        with self.lock:
+            endpoint = self.endpoint(method, url)
+            endpoint['retries'] = endpoint['retries'] + 1
+
+    def startProfiler(self) -> None:
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stopProfiler(self, path:str) -> None:
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(path)
+            self.profiler = None
+
+    def summary(self) -> dict:
+        with self.lock:
+            endpoints = {}
+            for name, endpoint in self.endpoints.items():
+                endpoints[name] = dict(endpoint,
+                                       seconds=round(endpoint['seconds'], 4),
+                                       histogram={('+Inf' if bucket == float('inf') else str(bucket)): count
+                                                  for bucket, count in zip(self.BUCKETS, endpoint['histogram'])})
+            return {'wall_seconds': round(time.perf_counter() - self.start_time, 4),
+                    'cpu_seconds': round(time.process_time() - self.start_cpu, 4),
+                    'phases': {name: {'calls': x['calls'], 'seconds': round(x['seconds'], 4)}
+                               for name, x in self.phases.items()},
+                    'requests': sum(x['calls'] for x in self.endpoints.values()),
+                    'endpoints': endpoints}
+
+    def write(self, path:str) -> None:
+        with open(path, mode='w', encoding='utf8') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def finish(self, path:str=None) -> dict:
+        summary = self.summary()
+        if path is not None:
+            self.write(path)
+        message = f"Processo finalizado em {round(summary['wall_seconds'], 4)} segundos"
+        if self.logger is None:
+            print(message)
+        else:
+            self.logger.info(message)
+            self.logger.info(f'fases: {json.dumps(summary["phases"])}')
+        return summary
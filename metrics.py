@@ -0,0 +1,86 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class MetricsRegistry(object):
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def escape(self, value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def declare(self, name:str, help:str, type:str='gauge') -> None:
+        with self.lock:
+            self.metrics.setdefault(name, {'help': help, 'type': type, 'series': {}})
+
+    def set(self, name:str, value:float, labels:dict=None) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self.lock:
+            self.metrics[name]['series'][key] = value
+
+    def inc(self, name:str, value:float=1, labels:dict=None) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        with self.lock:
+            series = self.metrics[name]['series']
+            series[key] = series.get(key, 0) + value
+
+    def replace(self, name:str, series:dict) -> None:
+        # troca todas as séries da métrica, removendo as de dags que sumiram da análise.
+        with self.lock:
+            self.metrics[name]['series'] = {tuple(sorted(labels)): value for labels, value in series.items()}
+
+    def render(self) -> str:
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                lines.append(f'# HELP {name} {metric["help"]}')
+                lines.append(f'# TYPE {name} {metric["type"]}')
+                for labels, value in metric['series'].items():
+                    if labels:
+                        label_text = ','.join(f'{k}="{self.escape(v)}"' for k, v in labels)
+                        lines.append(f'{name}{{{label_text}}} {value}')
+                    else:
+                        lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer(object):
+
+    def __init__(self, registry:MetricsRegistry, port:int=9108, host:str='0.0.0.0') -> None:
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((host, port), self.buildHandler())
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def buildHandler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = registry.render().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self) -> 'MetricsServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,249 @@
+import json
+import time
+import hashlib
+import random
+import threading
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+@lru_cache(maxsize=None)
+def parseTime(value:str) -> datetime:
+    return datetime.fromisoformat(value)
+
+# Servidor local que simula os endpoints da API REST do Airflow usados pelo monitor.
+class MockAirflowServer(object):
+
+    def __init__(self, dag_count:int=10, runs_per_dag:int=10, max_page_limit:int=100,
+                 fail_every:int=4, end_date:datetime=None, latency:float=0.0, error_rate:float=0.0,
+                 seed:int=42, tasks_per_run:int=3) -> None:
+        self.max_page_limit = max_page_limit
+        self.tasks_per_run = tasks_per_run
+        # latência em segundos por chamada e fração das chamadas que respondem 502.
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.requests_by_path = {}
+        # quantidade de respostas 502 devolvidas antes de responder normalmente.
+        self.transient_errors = 0
+        # quantidade de respostas 429 com Retry-After devolvidas antes de responder normalmente.
+        self.throttled = 0
+        self.retry_after = '0'
+        # quantidade de respostas 200 dos POST de listagem que informam o Content-Length inteiro e fecham a conexão no meio do corpo.
+        self.truncated = 0
+        # a listagem de dags envia ETag e responde 304 quando o If-None-Match ainda vale.
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self.end_date = end_date or datetime(2024, 8, 15, tzinfo=timezone.utc)
+        self.dags = [{'dag_id': f'dag_{i:05d}', 'is_active': True, 'tags': []} for i in range(dag_count)]
+        # parâmetros aceitos em /api/v1/dags, versões antigas do Airflow respondem 400 para os demais.
+        self.dag_list_params = {'only_active', 'limit', 'offset', 'dag_id_pattern', 'tags', 'fields'}
+        self.runs = {}
+        for dag in self.dags:
+            self.runs[dag['dag_id']] = self.generateRuns(dag['dag_id'], runs_per_dag, fail_every)
+        # guarda a seleção da última consulta, as páginas seguintes não precisam filtrar tudo de novo.
+        self.last_selection = (None, None)
+        self.httpd = None
+        self.thread = None
+
+    def generateRuns(self, dag_id:str, runs_per_dag:int, fail_every:int) -> list:
+        runs = []
+        for i in range(runs_per_dag):
+            start = self.end_date - timedelta(hours=i + 1)
+            end = start + timedelta(minutes=5)
+            state = 'failed' if fail_every and i % fail_every == 0 else 'success'
+            runs.append({'dag_id': dag_id,
+                         'dag_run_id': f'scheduled__{start.isoformat()}',
+                         'state': state,
+                         # o scheduler inicia a execução alguns segundos depois da logical_date.
+                         'logical_date': (start - timedelta(seconds=15 * (i % 4))).isoformat(),
+                         'start_date': start.isoformat(),
+                         'end_date': end.isoformat(),
+                         'conf': {}})
+        return runs
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def isThrottled(self) -> bool:
+        with self._lock:
+            if self.throttled > 0:
+                self.throttled = self.throttled - 1
+                return True
+            return False
+
+    def isTruncated(self) -> bool:
+        with self._lock:
+            if self.truncated > 0:
+                self.truncated = self.truncated - 1
+                return True
+            return False
+
+    def countRequest(self, path:str) -> bool:
+        with self._lock:
+            self.request_count = self.request_count + 1
+            self.requests_by_path[path] = self.requests_by_path.get(path, 0) + 1
+            if self.transient_errors > 0:
+                self.transient_errors = self.transient_errors - 1
+                return False
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        return not failed
+
+    def listDags(self, query:dict) -> dict:
+        limit = min(int(query.get('limit', ['100'])[0]), self.max_page_limit)
+        offset = int(query.get('offset', ['0'])[0])
+        dags = self.dags
+        if query.get('only_active', ['false'])[0] == 'true':
+            dags = [x for x in dags if x['is_active']]
+        if 'dag_id_pattern' in query:
+            pattern = query['dag_id_pattern'][0].lower()
+            dags = [x for x in dags if pattern in x['dag_id'].lower()]
+        if 'tags' in query:
+            dags = [x for x in dags if any(t['name'] in query['tags'] for t in x['tags'])]
+        page = dags[offset:offset + limit]
+        if 'fields' in query:
+            page = [{k: v for k, v in x.items() if k in query['fields']} for x in page]
+        return {'dags': page, 'total_entries': len(dags)}
+
+    def listDagRuns(self, body:dict) -> dict:
+        limit = min(int(body.get('page_limit', 100)), self.max_page_limit)
+        offset = int(body.get('page_offset', 0))
+        key = json.dumps({k: v for k, v in body.items() if k not in ('page_offset', 'page_limit')}, sort_keys=True)
+        if self.last_selection[0] == key:
+            selected = self.last_selection[1]
+            return {'dag_runs': selected[offset:offset + limit], 'total_entries': len(selected)}
+        start_gte = parseTime(body['start_date_gte']) if body.get('start_date_gte') else None
+        start_lte = parseTime(body['start_date_lte']) if body.get('start_date_lte') else None
+        end_lte = parseTime(body['end_date_lte']) if body.get('end_date_lte') else None
+        selected = []
+        for dag_id in body.get('dag_ids') or self.runs.keys():
+            for run in self.runs.get(dag_id, []):
+                if start_gte and parseTime(run['start_date']) < start_gte:
+                    continue
+                if start_lte and parseTime(run['start_date']) > start_lte:
+                    continue
+                if end_lte and (run['end_date'] is None or parseTime(run['end_date']) > end_lte):
+                    continue
+                selected.append(run)
+        self.last_selection = (key, selected)
+        return {'dag_runs': selected[offset:offset + limit], 'total_entries': len(selected)}
+
+    def taskInstances(self, index:int, run:dict) -> list:
+        # na execução com falha uma das tasks falha e as seguintes ficam como upstream_failed.
+        failed = index % self.tasks_per_run if run['state'] == 'failed' else self.tasks_per_run
+        tasks = []
+        for t in range(self.tasks_per_run):
+            state = 'success' if t < failed else ('failed' if t == failed else 'upstream_failed')
+            tasks.append({'dag_id': run['dag_id'],
+                          'dag_run_id': run['dag_run_id'],
+                          'task_id': f'task_{t}',
+                          'map_index': -1,
+                          'state': state,
+                          'try_number': 1,
+                          'start_date': run['start_date'],
+                          'end_date': run['end_date']})
+        return tasks
+
+    def listTaskInstances(self, body:dict) -> dict:
+        limit = min(int(body.get('page_limit', 100)), self.max_page_limit)
+        offset = int(body.get('page_offset', 0))
+        run_ids = set(body.get('dag_run_ids') or [])
+        states = set(body.get('state') or [])
+        selected = []
+        for dag_id in body.get('dag_ids') or self.runs.keys():
+            for index, run in enumerate(self.runs.get(dag_id, [])):
+                if run_ids and run['dag_run_id'] not in run_ids:
+                    continue
+                selected.extend(x for x in self.taskInstances(index, run) if not states or x['state'] in states)
+        return {'task_instances': selected[offset:offset + limit], 'total_entries': len(selected)}
+
+    def buildHandler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 mantém a conexão aberta entre as chamadas, como o webserver do Airflow.
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def sendJson(self, status:int, body:dict, headers:dict=None, truncate:bool=False) -> None:
+                data = json.dumps(body).encode('utf8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if truncate and status == 200 and server.isTruncated():
+                    # a conexão cai depois de metade do corpo, como um proxy que derruba a resposta.
+                    self.wfile.write(data[:len(data) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(data)
+
+            def reject(self, path:str) -> bool:
+                if not server.countRequest(path):
+                    self.sendJson(502, {'title': 'Bad Gateway'})
+                elif server.isThrottled():
+                    self.sendJson(429, {'title': 'Too Many Requests'}, headers={'Retry-After': server.retry_after})
+                else:
+                    return False
+                return True
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if self.reject(parsed.path):
+                    pass
+                elif parsed.path == '/api/v1/dags':
+                    query = parse_qs(parsed.query)
+                    if set(query) - server.dag_list_params:
+                        self.sendJson(400, {'title': 'Bad Request'})
+                    else:
+                        body = server.listDags(query)
+                        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode('utf8')).hexdigest() + '"'
+                        if self.headers.get('If-None-Match') == etag:
+                            server.not_modified = server.not_modified + 1
+                            self.send_response(304)
+                            self.send_header('ETag', etag)
+                            self.send_header('Content-Length', '0')
+                            self.end_headers()
+                        else:
+                            self.sendJson(200, body, headers={'ETag': etag})
+                else:
+                    self.sendJson(404, {'title': 'Not Found'})
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.reject(parsed.path):
+                    pass
+                elif parsed.path == '/api/v1/dags/~/dagRuns/list':
+                    self.sendJson(200, server.listDagRuns(body), truncate=True)
+                elif parsed.path == '/api/v1/dags/~/dagRuns/~/taskInstances/list':
+                    self.sendJson(200, server.listTaskInstances(body), truncate=True)
+                else:
+                    self.sendJson(404, {'title': 'Not Found'})
+
+        return Handler
+
+    def start(self) -> 'MockAirflowServer':
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.buildHandler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
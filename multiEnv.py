@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+from airflow import AirflowMonitor
+from concurrent.futures import ThreadPoolExecutor
+
+# Monitora vários ambientes (Airflow com usuário e senha ou MWAA) listados em um arquivo de configuração.
+#
+# {"environments": [
+#     {"name": "prd", "type": "airflow", "AIRFLOW_URL": "https://...", "AIRFLOW_USERNAME": "monitor",
+#      "AIRFLOW_PASSWORD": "${PRD_PASSWORD}", "workers": 4, "poolSize": 8},
+#     {"name": "mwaa", "type": "mwaa", "AWS_REGION": "us-east-1", "AWS_AIRFLOW_NAME": "mwaa-prd", "maxRps": 5,
+#      "AWS_ACCESS_KEY_ID": "${MWAA_KEY_ID}", "AWS_SECRET_ACCESS_KEY": "${MWAA_SECRET}", "AWS_ROLE_ARN": "arn:..."}
+# ]}
+class MultiEnvironmentMonitor(object):
+    TYPES = ('airflow', 'mwaa')
+
+    def __init__(self, logger: object = None) -> None:
+        self.className = 'MultiEnvironmentMonitor'
+        self.initializeLogger(logger=logger)
+
+    def initializeLogger(self, logger: object = None, level: int = logging.INFO) -> logging.Logger:
+        if logger == None:
+            self.logger = logging.getLogger(self.className)
+            self.logger.setLevel(level)
+            ch = logging.StreamHandler()
+            formatter = logging.Formatter("%(asctime)s [%(name)s] - %(levelname)s - %(message)s")
+            ch.setFormatter(formatter)
+            self.logger.addHandler(ch)
+        else:
+            self.logger = logger
+            if self.logger.level != level:
+                self.logger.setLevel(level)
+
+    def loadConfig(self, path:str) -> list:
+        with open(path, mode='r', encoding='utf8') as f:
+            config = json.load(f)
+        environments = []
+        for env in config.get('environments', []):
+            if 'name' not in env or env.get('type', 'airflow') not in self.TYPES:
+                raise ValueError(f'ambiente invalido no arquivo {path}: {env.get("name")}')
+            # valores como "${VAR}" são lidos do ambiente para não deixar senhas no arquivo.
+            environments.append({k: os.path.expandvars(v) if isinstance(v, str) else v for k, v in env.items()})
+        names = [x['name'] for x in environments]
+        if len(names) != len(set(names)):
+            raise ValueError(f'nomes de ambiente repetidos no arquivo {path}.')
+        return environments
+
+    def createMonitor(self, env:dict) -> AirflowMonitor:
+        # cada ambiente tem logger, pool de conexões e workers próprios.
+        logger = self.logger.getChild(env['name'])
+        if env.get('type', 'airflow') == 'mwaa':
+            from airflowMWAA import AirflowMWAA
+            monitor = AirflowMWAA(logger=logger, environment=env)
+        else:
+            monitor = AirflowMonitor(logger=logger, environment=env)
+        # o AirflowMonitor deixa o logger em INFO, o -v do processo vale também para cada ambiente.
+        monitor.initializeLogger(logger=logger, level=self.logger.getEffectiveLevel())
+        monitor.setBatchOptions(batch_size=env.get('batchSize', 100), page_limit=env.get('pageLimit', 100))
+        monitor.setTransportOptions(pool_size=env.get('poolSize', 10), timeout=env.get('timeout', 60),
+                                    retries=env.get('retries', 3), max_rps=env.get('maxRps'),
+                                    latency_target=env.get('latencyTarget'))
+        monitor.setWorkers(workers=env.get('workers', 1))
+        return monitor
+
+    def runEnvironment(self, env:dict, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None,
+                       tags:list=None) -> dict:
+        monitor = self.createMonitor(env)
+        result_list = monitor.analyseWindow(end_date=end_date, qtdDias=qtdDias, prefix=prefix, suffix=suffix, tags=tags)
+        return {'name': env['name'],
+                'result_list': result_list,
+                'consolidate': monitor.consolidateResults(result_list=result_list),
+                'report': monitor.reportResults()}
+
+    def rollup(self, results:list) -> dict:
+        total_runs = sum(x['run_count'] for env in results for x in env['result_list'])
+        total_fails = sum(x['fail_count'] for env in results for x in env['result_list'])
+        return {'environments': len(results),
+                'dags': sum(len(env['result_list']) for env in results),
+                'run_count': total_runs,
+                'fail_count': total_fails,
+                'consolidate': total_fails / total_runs if total_runs else 0.0}
+
+    def run(self, environments:list, end_date:datetime, qtdDias:int, prefix:str=None, suffix:str=None,
+            tags:list=None, max_environments:int=None) -> dict:
+        results = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max_environments or max(len(environments), 1)) as executor:
+            futures = {executor.submit(self.runEnvironment, env, end_date, qtdDias, prefix, suffix, tags): env['name']
+                       for env in environments}
+            for future, name in futures.items():
+                try:
+                    results[name] = future.result()
+                except (Exception, SystemExit) as e:
+                    # a falha de um ambiente não interrompe os demais.
+                    self.logger.error(f'{name} - falha na consulta: {e}')
+                    errors[name] = str(e)
+        for name, result in results.items():
+            runs = sum(x['run_count'] for x in result['result_list'])
+            self.logger.info(f'{name} - dags: {len(result["result_list"])} runs: {runs} resultado: {result["consolidate"]}')
+        rollup = self.rollup(list(results.values()))
+        self.logger.info(f'consolidado de {rollup["environments"]} ambientes: {rollup}')
+        return {'environments': results, 'errors': errors, 'rollup': rollup}
+
+    def parseArgs(self, arg_list: list[str] | None):
+        parser = argparse.ArgumentParser(description='Monitoramento de dags com erros em vários ambientes do airflow.')
+        parser.add_argument('-c', '--config', type=str, required=True,
+                            help='Arquivo JSON com a lista de ambientes a serem monitorados.')
+        parser.add_argument('-d', '--dataFim', type=str, default=datetime.today().strftime('%Y-%m-%d'),
+                            help='Data da última execução a ser verificada. Formato: YYYY-MM-DDD. Default = hoje.')
+        parser.add_argument('-q', '--qtdDias', type=int, default=90,
+                            help='Quantidade de dias antes da data de fim a ser considerado para a análise. Default = 90')
+        parser.add_argument('-p', '--prefix', type=str, default=None,
+                            help='Prefixo que a DAG deverá ter no nome para entrar na análise.')
+        parser.add_argument('-s', '--suffix', type=str, default=None,
+                            help='Sufixo que a DAG deverá ter no nome para entrar na análise.')
+        parser.add_argument('-t', '--tag', type=str, action='append', default=None, dest='tags',
+                            help='Tag que a DAG deverá ter para entrar na análise. Pode ser repetido, basta uma das tags.')
+        parser.add_argument('--maxEnvironments', type=int, default=None,
+                            help='Quantidade de ambientes consultados ao mesmo tempo. Default = todos')
+        parser.add_argument('-v', '--verbose', action='store_true',
+                            help='O nível de verbose por padrão é logging.INFO, quando passado este argumento altera para logging.DEBUG')
+        return parser.parse_args(arg_list)
+
+    def main(self, arg_list: list[str] | None):
+        if arg_list and '.py' in arg_list[0]:
+            arg_list = arg_list[1:]
+        args = self.parseArgs(arg_list)
+        if args.verbose:
+            self.initializeLogger(logger=self.logger, level=logging.DEBUG)
+        try:
+            dataFim = datetime.strptime(args.dataFim, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f'data em formato inválido: {args.dataFim}, formato esperado: YYYY-MM-DD')
+        environments = self.loadConfig(args.config)
+        return self.run(environments=environments,
+                        end_date=dataFim,
+                        qtdDias=args.qtdDias,
+                        prefix=args.prefix,
+                        suffix=args.suffix,
+                        tags=args.tags,
+                        max_environments=args.maxEnvironments)
+
+if __name__ == "__main__":
+    monitor = MultiEnvironmentMonitor() # pragma: no cover
+    monitor.main(sys.argv) # pragma: no cover
@@ -0,0 +1,111 @@
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+def parseRetryAfter(value:str, now:float=None) -> float:
+    # Retry-After vem em segundos ou como data HTTP.
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = datetime.now(timezone.utc).timestamp() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+# Limite global de chamadas por segundo, com rajadas de até burst chamadas.
+class TokenBucket(object):
+
+    def __init__(self, rate:float, burst:float=None, clock=time.monotonic, sleep=time.sleep) -> None:
+        if rate <= 0:
+            raise ValueError('rate deve ser maior que zero.')
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # desconta o token na hora e devolve quanto tempo esperar por ele, sem segurar o lock dormindo.
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens = self.tokens - 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+# Controle AIMD das chamadas em andamento: cresce 1 por janela sem erro e cai pela metade quando o servidor
+# sinaliza sobrecarga (429, 502-504, falha de conexão ou latência acima do alvo). Retry-After pausa todas as chamadas.
+class AdaptiveLimiter(object):
+    OVERLOAD_STATUS = (429, 502, 503, 504)
+
+    def __init__(self, max_concurrency:int=10, min_concurrency:int=1, initial:int=None, rate:float=None,
+                 decrease:float=0.5, latency_target:float=None, clock=time.monotonic, sleep=time.sleep) -> None:
+        if min_concurrency < 1 or max_concurrency < min_concurrency:
+            raise ValueError('max_concurrency deve ser maior ou igual a min_concurrency, que deve ser maior que zero.')
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(initial or max_concurrency)
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, clock=clock, sleep=sleep) if rate else None
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = float('-inf')
+        self.latency = None
+        self.error_rate = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.condition:
+            while True:
+                pause = self.blocked_until - self.clock()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    break
+                self.condition.wait(timeout=pause if pause > 0 else None)
+            self.in_flight = self.in_flight + 1
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+    def release(self, latency:float, status_code:int=None, retry_after:float=None, error:bool=False) -> None:
+        with self.condition:
+            self.in_flight = self.in_flight - 1
+            now = self.clock()
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            overloaded = error or status_code in self.OVERLOAD_STATUS
+            self.error_rate = 0.9 * self.error_rate + (0.1 if overloaded else 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+            slow = self.latency_target is not None and self.latency > self.latency_target
+            if overloaded or slow:
+                # as chamadas que já estavam em andamento na mesma janela não reduzem de novo.
+                if now - self.last_decrease >= self.latency:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {'limit': round(self.limit, 2),
+                    'in_flight': self.in_flight,
+                    'latency': None if self.latency is None else round(self.latency, 4),
+                    'error_rate': round(self.error_rate, 4)}
@@ -0,0 +1,127 @@
+from array import array
+from datetime import datetime, timezone
+
+# Estados guardados como int8 nas colunas, ficam aqui e não no analytics para não importar o numpy junto.
+STATES = ('success', 'failed', 'running', 'queued', 'other')
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+FAILED = STATE_CODES['failed']
+OTHER = STATE_CODES['other']
+
+# Marca de data ausente nas colunas de epoch em milissegundos.
+MISSING = -1
+
+def toEpochMs(value) -> int:
+    if value is None:
+        return MISSING
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = value.timestamp()
+    return int(round(value * 1000))
+
+def fromEpochMs(value:int) -> float:
+    return None if value == MISSING else value / 1000
+
+class DagRun(object):
+    __slots__ = ('dag_id', 'dag_run_id', 'state', 'start_date', 'end_date', 'logical_date')
+
+    def __init__(self, dag_id:str, dag_run_id:str, state:str, start_date:float, end_date:float,
+                 logical_date:float=None) -> None:
+        self.dag_id = dag_id
+        self.dag_run_id = dag_run_id
+        self.state = state
+        self.start_date = start_date
+        self.end_date = end_date
+        self.logical_date = logical_date
+
+    # mantém o acesso run['state'] usado com os dicts da API.
+    def __getitem__(self, key:str):
+        return getattr(self, key)
+
+    def get(self, key:str, default=None):
+        return getattr(self, key, default)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DagRun) and all(getattr(self, x) == getattr(other, x) for x in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f'DagRun({", ".join(f"{x}={getattr(self, x)!r}" for x in self.__slots__)})'
+
+# Execuções de uma dag em colunas: estado como int8 e datas como epoch em milissegundos.
+class DagRuns(object):
+    __slots__ = ('dag_id', 'run_ids', 'states', 'starts', 'ends', 'logicals')
+
+    def __init__(self, dag_id:str, runs:list=()) -> None:
+        self.dag_id = dag_id
+        self.run_ids = []
+        self.states = array('b')
+        self.starts = array('q')
+        self.ends = array('q')
+        self.logicals = array('q')
+        for run in runs:
+            self.append(run)
+
+    def append(self, run) -> None:
+        # Airflow anterior ao 2.2 não tem logical_date.
+        self.appendValues(run['dag_run_id'], run['state'], run['start_date'], run['end_date'], run.get('logical_date'))
+
+    def appendValues(self, run_id:str, state:str, start_date, end_date, logical_date=None) -> None:
+        self.run_ids.append(run_id)
+        self.states.append(STATE_CODES.get(state, OTHER))
+        self.starts.append(toEpochMs(start_date))
+        self.ends.append(toEpochMs(end_date))
+        self.logicals.append(toEpochMs(logical_date))
+
+    def rows(self) -> list:
+        return [list(x) for x in zip(self.run_ids, self.states, self.starts, self.ends, self.logicals)]
+
+    @classmethod
+    def fromRows(cls, dag_id:str, rows:list) -> 'DagRuns':
+        runs = cls(dag_id)
+        for row in rows:
+            # checkpoints gravados antes da logical_date têm 4 colunas.
+            run_id, state, start, end, logical = row if len(row) == 5 else list(row) + [MISSING]
+            runs.run_ids.append(run_id)
+            runs.states.append(state)
+            runs.starts.append(start)
+            runs.ends.append(end)
+            runs.logicals.append(logical)
+        return runs
+
+    @classmethod
+    def merge(cls, dag_id:str, parts:list) -> 'DagRuns':
+        # junta as execuções de várias consultas mantendo só a primeira de cada run id.
+        merged = cls(dag_id)
+        seen = set()
+        for runs in parts:
+            for run_id, state, start, end, logical in zip(runs.run_ids, runs.states, runs.starts, runs.ends,
+                                                          runs.logicals):
+                if run_id in seen:
+                    continue
+                seen.add(run_id)
+                merged.run_ids.append(run_id)
+                merged.states.append(state)
+                merged.starts.append(start)
+                merged.ends.append(end)
+                merged.logicals.append(logical)
+        return merged
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def __getitem__(self, i:int) -> DagRun:
+        return DagRun(self.dag_id, self.run_ids[i], STATES[self.states[i]],
+                      fromEpochMs(self.starts[i]), fromEpochMs(self.ends[i]), fromEpochMs(self.logicals[i]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, DagRuns) and self.dag_id == other.dag_id and self.run_ids == other.run_ids
+                and self.states == other.states and self.starts == other.starts and self.ends == other.ends
+                and self.logicals == other.logicals)
+
+    def __repr__(self) -> str:
+        return f'DagRuns(dag_id={self.dag_id!r}, runs={len(self)})'
@@ -0,0 +1,166 @@
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+from archive import requestKey, ArchivedResponse
+from records import toEpochMs
+from store import TERMINAL_STATES
+
+# Tempo em segundos que cada endpoint fica no cache antes de ser revalidado ou consultado de novo.
+ENDPOINTS = {'/api/v1/dags': 'dags',
+             '/api/v1/dags/~/dagRuns/list': 'runs',
+             '/api/v1/dags/~/dagRuns/~/taskInstances/list': 'tasks'}
+DEFAULT_TTLS = {'dags': 600, 'runs': 300, 'tasks': 300}
+# estados de task que não mudam mais sem que a execução seja limpa no Airflow.
+TERMINAL_TASK_STATES = ('success', 'failed', 'upstream_failed', 'skipped', 'removed')
+# janelas que terminam há menos que isso ainda podem receber execuções.
+SETTLE_SECONDS = 3600
+
+def parseTtls(values:list) -> dict:
+    # "dags=600" para cada endpoint, os demais ficam com o padrão.
+    ttls = dict(DEFAULT_TTLS)
+    for value in values or []:
+        name, _, seconds = value.partition('=')
+        if name not in ttls or not seconds:
+            raise ValueError(f'ttl em formato inválido: {value}, formato esperado: {"|".join(DEFAULT_TTLS)}=segundos')
+        ttls[name] = float(seconds)
+    return ttls
+
+class CachedResponse(object):
+
+    def __init__(self, status_code:int, content:bytes, etag:str, last_modified:str, expires_at:float) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    def fresh(self, now:float) -> bool:
+        return self.expires_at is None or now < self.expires_at
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def response(self, url:str) -> ArchivedResponse:
+        return ArchivedResponse(self.status_code, self.content, url)
+
+# Cache das consultas de leitura em SQLite, com o corpo comprimido. Acima de max_bytes as respostas
+# usadas há mais tempo são removidas primeiro.
+class ResponseCache(object):
+
+    def __init__(self, path:str, logger, max_bytes:int=256 * 1024 * 1024, ttls:dict=None, clock=time.time) -> None:
+        self.path = path
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                    key TEXT PRIMARY KEY,
+                                    status INTEGER NOT NULL,
+                                    content BLOB NOT NULL,
+                                    etag TEXT,
+                                    last_modified TEXT,
+                                    expires_at REAL,
+                                    accessed_at REAL NOT NULL,
+                                    size INTEGER NOT NULL)''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+            self.size = self.conn.execute('SELECT IFNULL(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def endpoint(self, method:str, url:str) -> str:
+        if method.upper() not in ('GET', 'POST'):
+            return None
+        return ENDPOINTS.get(urlsplit(url).path)
+
+    def key(self, method:str, url:str, payload=None) -> str:
+        # diferente do archive, o host faz parte da chave: ambientes diferentes não compartilham respostas.
+        return f'{urlsplit(url).netloc} {requestKey(method, url, payload)}'
+
+    def get(self, method:str, url:str, payload=None) -> CachedResponse:
+        if self.endpoint(method, url) is None:
+            return None
+        key = self.key(method, url, payload)
+        with self.lock, self.conn:
+            row = self.conn.execute('SELECT status, content, etag, last_modified, expires_at FROM responses WHERE key = ?',
+                                    (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] = self.stats['misses'] + 1
+                return None
+            cached = CachedResponse(row[0], zlib.decompress(row[1]), row[2], row[3], row[4])
+            now = self.clock()
+            if cached.fresh(now):
+                self.stats['hits'] = self.stats['hits'] + 1
+                self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            else:
+                self.stats['misses'] = self.stats['misses'] + 1
+            return cached
+
+    def expiresAt(self, method:str, url:str, payload, content:bytes, now:float) -> float:
+        name = self.endpoint(method, url)
+        body = json.loads(payload) if isinstance(payload, (str, bytes)) and payload else {}
+        if name == 'runs':
+            # execuções terminadas de uma janela que já passou não mudam, ficam no cache sem prazo.
+            bounds = [toEpochMs(body[x]) / 1000 for x in ('end_date_lte', 'start_date_lte') if body.get(x)]
+            if bounds and min(bounds) < now - SETTLE_SECONDS:
+                if all(x.get('state') in TERMINAL_STATES for x in json.loads(content).get('dag_runs', [])):
+                    return None
+        elif name == 'tasks':
+            if all(x.get('state') in TERMINAL_TASK_STATES for x in json.loads(content).get('task_instances', [])):
+                return None
+        return now + self.ttls[name]
+
+    def put(self, method:str, url:str, payload, response) -> None:
+        if self.endpoint(method, url) is None or response.status_code != 200:
+            return
+        now = self.clock()
+        content = response.content
+        try:
+            expires_at = self.expiresAt(method, url, payload, content, now)
+        except ValueError:
+            return
+        body = zlib.compress(content)
+        key = self.key(method, url, payload)
+        with self.lock, self.conn:
+            previous = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              (key, response.status_code, body, response.headers.get('ETag'),
+                               response.headers.get('Last-Modified'), expires_at, now, len(body)))
+            self.size = self.size + len(body) - (previous[0] if previous else 0)
+            self.evict()
+
+    def revalidate(self, method:str, url:str, payload, cached:CachedResponse) -> ArchivedResponse:
+        # 304: o conteúdo guardado continua valendo por mais um ttl.
+        now = self.clock()
+        expires_at = now + self.ttls[self.endpoint(method, url)]
+        with self.lock, self.conn:
+            self.stats['revalidated'] = self.stats['revalidated'] + 1
+            self.conn.execute('UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?',
+                              (expires_at, now, self.key(method, url, payload)))
+        return cached.response(url)
+
+    def evict(self) -> None:
+        while self.size > self.max_bytes:
+            rows = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.size <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.size = self.size - size
+                self.stats['evicted'] = self.stats['evicted'] + 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+        self.logger.info(f'cache de respostas: {self.stats}')
@@ -0,0 +1,106 @@
+import math
+import numpy as np
+
+# Valores abaixo disso (inclusive negativos, ex.: execução iniciada antes da logical_date) ficam no balde zero.
+MIN_VALUE = 1e-3
+
+# DDSketch: quantis com erro relativo de até relative_accuracy usando baldes logarítmicos.
+# A memória depende só da faixa de valores (limitada a max_bins baldes), não da quantidade de execuções,
+# e dois sketches são juntados somando os baldes, o resultado é o mesmo de um sketch com todos os valores.
+class DDSketch(object):
+
+    def __init__(self, relative_accuracy:float=0.01, max_bins:int=2048) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy deve estar entre 0 e 1.')
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self) -> int:
+        return self.count
+
+    def addMany(self, values:np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count = self.count + len(values)
+        self.sum = self.sum + float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > MIN_VALUE]
+        self.zero = self.zero + len(values) - len(positive)
+        keys, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.collapse()
+
+    def add(self, value:float) -> None:
+        self.addMany(np.array([value]))
+
+    def collapse(self) -> None:
+        # acima de max_bins os menores baldes são juntados, o erro fica só nos quantis mais baixos.
+        if len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        extra = keys[:len(keys) - self.max_bins + 1]
+        self.bins[extra[-1]] = sum(self.bins.pop(key) for key in extra[:-1]) + self.bins[extra[-1]]
+
+    def merge(self, other:'DDSketch') -> 'DDSketch':
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('só é possível juntar sketches com a mesma relative_accuracy.')
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero = self.zero + other.zero
+        self.count = self.count + other.count
+        self.sum = self.sum + other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.collapse()
+        return self
+
+    def quantile(self, q:float) -> float:
+        if not self.count:
+            return None
+        # os extremos são guardados exatos.
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        running = self.zero
+        if rank < running:
+            return min(max(0.0, self.min), self.max)
+        for key in sorted(self.bins):
+            running = running + self.bins[key]
+            if running > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else None
+
+    def toDict(self) -> dict:
+        return {'relative_accuracy': self.relative_accuracy, 'count': self.count, 'sum': self.sum,
+                'min': self.min if self.count else None, 'max': self.max if self.count else None,
+                'zero': self.zero, 'bins': {str(key): count for key, count in self.bins.items()}}
+
+    @classmethod
+    def fromDict(cls, value:dict) -> 'DDSketch':
+        sketch = cls(relative_accuracy=value['relative_accuracy'])
+        sketch.bins = {int(key): count for key, count in value['bins'].items()}
+        sketch.zero = value['zero']
+        sketch.count = value['count']
+        sketch.sum = value['sum']
+        if sketch.count:
+            sketch.min = value['min']
+            sketch.max = value['max']
+        return sketch
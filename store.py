@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+from records import DagRuns
+
+# Estados em que a execução não muda mais, os demais são consultados novamente a cada execução.
+TERMINAL_STATES = ('success', 'failed')
+DAY = 86400
+
+def startDay(row:str) -> str:
+    return f'CAST({row}.start_date / {DAY} AS INTEGER)'
+
+def endDay(row:str) -> str:
+    # dia anterior quando termina exatamente à meia-noite, assim end_day < dia do fim equivale a end_date <= fim.
+    return f'(CAST({row}.end_date / {DAY} AS INTEGER) - ({row}.end_date = CAST({row}.end_date / {DAY} AS INTEGER) * {DAY}))'
+
+def rollupKey(row:str) -> str:
+    return f"dag_id = {row}.dag_id AND start_day = {startDay(row)} AND end_day = {endDay(row)} AND state = IFNULL({row}.state, '')"
+
+class DagRunStore(object):
+
+    def __init__(self, path:str, logger) -> None:
+        self.logger = logger
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.createTables()
+
+    def createTables(self) -> None:
+        with self.lock, self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS dag_runs (
+                                    dag_id TEXT NOT NULL,
+                                    run_id TEXT NOT NULL,
+                                    state TEXT,
+                                    start_date REAL,
+                                    end_date REAL,
+                                    logical_date REAL,
+                                    PRIMARY KEY (dag_id, run_id))''')
+            # stores criados antes da logical_date.
+            columns = [x[1] for x in self.conn.execute('PRAGMA table_info(dag_runs)')]
+            if 'logical_date' not in columns:
+                self.conn.execute('ALTER TABLE dag_runs ADD COLUMN logical_date REAL')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS dag_runs_start ON dag_runs (dag_id, start_date)')
+            # fetched_from..watermark é o intervalo de start_date já baixado para a dag.
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS dag_watermarks (
+                                    dag_id TEXT PRIMARY KEY,
+                                    fetched_from REAL NOT NULL,
+                                    watermark REAL NOT NULL)''')
+            self.createRollups()
+
+    def createRollups(self) -> None:
+        # execuções terminadas somadas por dag, dia de início, dia de fim e estado, mantidas pelos triggers
+        # a cada insert, update ou delete em dag_runs. Uma janela de dias inteiros é respondida só com essas linhas.
+        exists = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'dag_daily'").fetchone()
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS dag_daily (
+                                dag_id TEXT NOT NULL,
+                                start_day INTEGER NOT NULL,
+                                end_day INTEGER NOT NULL,
+                                state TEXT NOT NULL,
+                                runs INTEGER NOT NULL,
+                                duration_sum REAL NOT NULL,
+                                PRIMARY KEY (dag_id, start_day, end_day, state))''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS dag_daily_start ON dag_daily (start_day)')
+        if exists is None:
+            # store criado antes dos agregados.
+            self.conn.execute(f'''INSERT INTO dag_daily
+                                  SELECT dag_id, {startDay('dag_runs')}, {endDay('dag_runs')}, IFNULL(state, ''),
+                                         COUNT(*), SUM(end_date - start_date)
+                                  FROM dag_runs WHERE start_date IS NOT NULL AND end_date IS NOT NULL
+                                  GROUP BY 1, 2, 3, 4''')
+        add = f'''INSERT INTO dag_daily VALUES (NEW.dag_id, {startDay('NEW')}, {endDay('NEW')}, IFNULL(NEW.state, ''),
+                                                1, NEW.end_date - NEW.start_date)
+                  ON CONFLICT (dag_id, start_day, end_day, state) DO UPDATE SET
+                     runs = runs + 1, duration_sum = duration_sum + excluded.duration_sum;'''
+        remove = f'''UPDATE dag_daily SET runs = runs - 1, duration_sum = duration_sum - (OLD.end_date - OLD.start_date)
+                     WHERE {rollupKey('OLD')};
+                     DELETE FROM dag_daily WHERE {rollupKey('OLD')} AND runs = 0;'''
+        finished = '{0}.start_date IS NOT NULL AND {0}.end_date IS NOT NULL'
+        for name, event, row, body in (('insert', 'INSERT', 'NEW', add), ('delete', 'DELETE', 'OLD', remove),
+                                       ('update_old', 'UPDATE', 'OLD', remove), ('update_new', 'UPDATE', 'NEW', add)):
+            self.conn.execute(f'''CREATE TRIGGER IF NOT EXISTS dag_daily_{name} AFTER {event} ON dag_runs
+                                  WHEN {finished.format(row)} BEGIN {body} END''')
+
+    def getFetchStart(self, dag_id:str, start:float) -> float:
+        # as execuções pendentes anteriores à marca são consultadas à parte, ver getPendingRuns.
+        with self.lock:
+            row = self.conn.execute('SELECT fetched_from, watermark FROM dag_watermarks WHERE dag_id = ?',
+                                    (dag_id,)).fetchone()
+        if row is None or start < row[0]:
+            return start
+        return max(start, row[1])
+
+    def getPendingRuns(self, dag_ids:list, start:float) -> list:
+        # (dag_id, start_date) das execuções guardadas que ainda não terminaram.
+        with self.lock:
+            cursor = self.conn.execute(f'''SELECT DISTINCT dag_id, start_date FROM dag_runs
+                                           WHERE dag_id IN ({','.join('?' * len(dag_ids))}) AND start_date >= ?
+                                           AND state NOT IN ({','.join('?' * len(TERMINAL_STATES))})
+                                           ORDER BY start_date, dag_id''', list(dag_ids) + [start] + list(TERMINAL_STATES))
+            return cursor.fetchall()
+
+    def saveRuns(self, dag_ids:list, runs:list, fetched_from:float=None, watermark:float=None) -> None:
+        # sem dag_ids só as execuções são gravadas, as marcas ficam como estão.
+        rows = [(x['dag_id'], x['dag_run_id'], x['state'], x['start_date'], x['end_date'], x.get('logical_date'))
+                for x in runs]
+        with self.lock, self.conn:
+            self.conn.executemany('''INSERT INTO dag_runs (dag_id, run_id, state, start_date, end_date, logical_date)
+                                     VALUES (?, ?, ?, ?, ?, ?)
+                                     ON CONFLICT (dag_id, run_id) DO UPDATE SET
+                                        state = excluded.state,
+                                        start_date = excluded.start_date,
+                                        end_date = excluded.end_date,
+                                        logical_date = excluded.logical_date''', rows)
+            self.conn.executemany('''INSERT INTO dag_watermarks (dag_id, fetched_from, watermark)
+                                     VALUES (?, ?, ?)
+                                     ON CONFLICT (dag_id) DO UPDATE SET
+                                        fetched_from = MIN(fetched_from, excluded.fetched_from),
+                                        watermark = MAX(watermark, excluded.watermark)''',
+                                  [(dag_id, fetched_from, watermark) for dag_id in dag_ids])
+
+    def getRuns(self, dag_ids:list, start:float, end:float) -> dict:
+        # as linhas vão do cursor direto para as colunas de cada dag, sem um dict por execução.
+        runs_by_dag = {}
+        with self.lock:
+            cursor = self.conn.execute(f'''SELECT dag_id, run_id, state, start_date, end_date, logical_date FROM dag_runs
+                                           WHERE dag_id IN ({','.join('?' * len(dag_ids))})
+                                           AND start_date >= ? AND end_date <= ?
+                                           ORDER BY dag_id, start_date''', list(dag_ids) + [start, end])
+            for dag_id, run_id, state, start_date, end_date, logical_date in cursor:
+                runs = runs_by_dag.get(dag_id)
+                if runs is None:
+                    runs = runs_by_dag[dag_id] = DagRuns(dag_id)
+                runs.appendValues(run_id, state, start_date, end_date, logical_date)
+        return runs_by_dag
+
+    def getDagIds(self) -> list:
+        with self.lock:
+            return [x[0] for x in self.conn.execute('SELECT dag_id FROM dag_watermarks ORDER BY dag_id')]
+
+    def getCoveredDagIds(self, start:float, end:float) -> set:
+        # dags com todo o intervalo já baixado.
+        with self.lock:
+            cursor = self.conn.execute('SELECT dag_id FROM dag_watermarks WHERE fetched_from <= ? AND watermark >= ?',
+                                       (start, end))
+            return {x[0] for x in cursor}
+
+    def getRollups(self, start:float, end:float) -> list:
+        # mesmas execuções do getRuns (início >= start e fim <= end), somadas por dag, dia de início e estado.
+        if start % DAY or end % DAY:
+            raise ValueError('os agregados diários só atendem janelas que começam e terminam à meia-noite (UTC).')
+        with self.lock:
+            cursor = self.conn.execute('''SELECT dag_id, start_day, state, SUM(runs), SUM(duration_sum) FROM dag_daily
+                                          WHERE start_day >= ? AND end_day < ?
+                                          GROUP BY dag_id, start_day, state''', (int(start // DAY), int(end // DAY)))
+            return cursor.fetchall()
+
+    def evict(self, before:float) -> int:
+        with self.lock, self.conn:
+            deleted = self.conn.execute('DELETE FROM dag_runs WHERE start_date < ?', (before,)).rowcount
+            self.conn.execute('UPDATE dag_watermarks SET fetched_from = ? WHERE fetched_from < ?', (before, before))
+            self.conn.execute('DELETE FROM dag_watermarks WHERE watermark < fetched_from')
+        self.logger.info(f'{deleted} execucoes removidas do store anteriores a retencao')
+        return deleted
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -1,9 +1,17 @@
 import os
+import json
+import time
+import tempfile
 import shlex
 import logging
 import unittest
-from datetime import datetime
+from unittest import mock
+from datetime import datetime, timedelta, timezone
 from airflow import AirflowMonitor
+from transport import AirflowRequestError
+from mockAirflow import MockAirflowServer
+from records import DagRuns
+from dagFilter import DagFilter
 
 class TestAirflow(unittest.TestCase):
     def setUp(self):
@@ -112,6 +120,7 @@ class TestAirflow(unittest.TestCase):
         self.assertEqual(logging.DEBUG, self.airflow.logger.level)
 
     def testSetDefaults(self):
+        self.airflow.authenticate()
         headers = self.airflow.headers
         cookies = self.airflow.cookies
         self.assertTrue('Content-Type' in headers)
@@ -119,7 +128,9 @@ class TestAirflow(unittest.TestCase):
         self.assertIsNone(cookies)
 
     def testExecuteRequest(self):
-        url = f'http://www.google.com/nothere'
+        server = MockAirflowServer().start()
+        self.addCleanup(server.stop)
+        url = f'{server.url}/nothere'
         
         error = 'Erro ao chamar a URL'
         with self.assertRaises(SystemExit) as ctx:
@@ -134,6 +145,9 @@ class TestAirflow(unittest.TestCase):
         self.assertEqual(error, str(ctx.exception))
 
     def testSetCookiesExpiration(self):
+        # a autenticação só acontece na primeira chamada.
+        self.assertIsNone(self.airflow.cookies_expiration)
+        self.assertEqual(self.airflow.baseURL, 'URL')
         cookies_expiration = self.airflow.cookies_expiration
         self.assertGreater(cookies_expiration, datetime.now())
 
@@ -215,5 +229,586 @@ class TestAirflow(unittest.TestCase):
         ret = self.airflow.consolidateResults(result_list=lst)
         self.assertAlmostEqual(ret, 0.2)
 
+    def testConsolidateResultsWithoutRuns(self):
+        self.assertEqual(self.airflow.consolidateResults(result_list=[]), 0.0)
+        lst = [{'dag_id': '1', 'run_count': 0, 'fail_count': 0}]
+        self.assertEqual(self.airflow.consolidateResults(result_list=lst), 0.0)
+
+    def testReportResults(self):
+        self.airflow.analyseDagRuns(dag_id='a', run_list=[{'state': 'failed'}, {'state': 'success'}])
+        report = self.airflow.reportResults()
+        self.assertEqual(report['states']['failed'], 1)
+        self.assertEqual(report['dags'][0]['failure_rate'], 0.5)
+
+    def testParseArgsBatchOptions(self):
+        args = self.airflow.parseArgs(shlex.split(''))
+        self.assertEqual(args.batchSize, 100)
+        self.assertEqual(args.pageLimit, 100)
+        args = self.airflow.parseArgs(shlex.split('-b 20 --pageLimit 50'))
+        self.assertEqual(args.batchSize, 20)
+        self.assertEqual(args.pageLimit, 50)
+
+    def testSetBatchOptionsInvalid(self):
+        with self.assertRaises(ValueError):
+            self.airflow.setBatchOptions(batch_size=0)
+
+    def testSplitInBatches(self):
+        ret = self.airflow.splitInBatches(['a', 'b', 'c', 'd', 'e'], 2)
+        self.assertEqual(ret, [['a', 'b'], ['c', 'd'], ['e']])
+
+    def testGetAllExecutionsByDagIdsMockServer(self):
+        server = MockAirflowServer(dag_count=5, runs_per_dag=12, max_page_limit=10).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=2, page_limit=10)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        ret = self.airflow.getAllExecutionsByDagIds(dag_ids, end_date - timedelta(days=2), end_date)
+        self.assertEqual(sorted(ret.keys()), dag_ids)
+        for dag_id in dag_ids:
+            self.assertEqual(len(ret[dag_id]), 12)
+            self.assertTrue(all(x.dag_id == dag_id for x in ret[dag_id]))
+            self.assertIsInstance(ret[dag_id], DagRuns)
+            self.assertEqual(ret[dag_id][0].dag_id, dag_id)
+        # 3 lotes (2, 2 e 1 dag), com 24, 24 e 12 execuções em páginas de 10.
+        self.assertEqual(server.requests_by_path['/api/v1/dags/~/dagRuns/list'], 3 + 3 + 2)
+        analyse = self.airflow.analyseDagRuns(dag_id=dag_ids[0], run_list=ret[dag_ids[0]])
+        self.assertEqual(analyse['run_count'], 12)
+        self.assertEqual(analyse['fail_count'], 3)
+
+    def testGetAllExecutionsByDagIdMockServer(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=4).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        end_date = datetime(2024, 8, 15)
+        ret = self.airflow.getAllExecutionsByDagId('dag_00001', end_date - timedelta(days=2), end_date)
+        self.assertEqual(len(ret), 4)
+        self.assertEqual(server.request_count, 1)
+
+    def testExecuteRequestRetriesTransientErrors(self):
+        server = MockAirflowServer(dag_count=3).start()
+        self.addCleanup(server.stop)
+        server.transient_errors = 2
+        self.airflow.setTransportOptions(retries=3, backoff=0)
+        response = self.airflow.executeRequest('GET', f'{server.url}/api/v1/dags')
+        self.assertEqual(response.json()['total_entries'], 3)
+        self.assertEqual(server.request_count, 3)
+
+    def testExecuteRequestRetriesExhausted(self):
+        server = MockAirflowServer().start()
+        self.addCleanup(server.stop)
+        server.transient_errors = 5
+        self.airflow.setTransportOptions(retries=1, backoff=0)
+        with self.assertRaises(SystemExit) as ctx:
+            self.airflow.executeRequest('GET', f'{server.url}/api/v1/dags')
+        self.assertEqual(ctx.exception.status_code, 502)
+        self.assertEqual(server.request_count, 2)
+
+    def testExecuteRequestNonIdempotentNotRetried(self):
+        server = MockAirflowServer().start()
+        self.addCleanup(server.stop)
+        server.transient_errors = 1
+        self.airflow.setTransportOptions(retries=3, backoff=0)
+        with self.assertRaises(SystemExit):
+            self.airflow.executeRequest('POST', f'{server.url}/api/v1/dags/~/dagRuns/list', payload='{}')
+        self.assertEqual(server.request_count, 1)
+
+    def testExecuteRequestHonoursRetryAfter(self):
+        server = MockAirflowServer().start()
+        self.addCleanup(server.stop)
+        server.throttled = 1
+        server.retry_after = '0.2'
+        self.airflow.setTransportOptions(pool_size=8, retries=3, backoff=0)
+        started = time.perf_counter()
+        response = self.airflow.executeRequest('GET', f'{server.url}/api/v1/dags?limit=1')
+        self.assertGreaterEqual(time.perf_counter() - started, 0.2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.request_count, 2)
+        self.assertEqual(self.airflow.transport.limiter.limit, 4.25)
+
+    def testIterDagRunsRetriesTruncatedBody(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=4).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setTransportOptions(retries=2, backoff=0)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        expected = self.airflow.listDagRuns(dag_ids, end_date - timedelta(days=1), end_date)
+        # a conexão cai no meio do corpo depois de algumas execuções já entregues.
+        server.truncated = 2
+        ret = self.airflow.listDagRuns(dag_ids, end_date - timedelta(days=1), end_date)
+        self.assertEqual(ret, expected)
+        self.assertEqual(len(ret), 12)
+        self.assertEqual(server.request_count, 4)
+        server.truncated = 3
+        with self.assertRaises(AirflowRequestError):
+            self.airflow.listDagRuns(dag_ids, end_date - timedelta(days=1), end_date)
+        server.truncated = 1
+        items, total = self.airflow.listTaskInstancesPage(dag_ids, [expected[0]['dag_run_id']], 0,
+                                                              ['success', 'failed', 'upstream_failed'])
+        self.assertEqual(total, 9)
+        self.assertEqual(len(items), 9)
+
+    def testTransportKeepsSession(self):
+        self.airflow.authenticate()
+        session = self.airflow.transport.getSession()
+        self.assertEqual(session.headers['Authorization'], self.airflow.headers['Authorization'])
+        self.airflow.setTransportOptions(pool_size=4)
+        self.assertIs(session, self.airflow.transport.session)
+        self.assertEqual(self.airflow.transport.pool_size, 4)
+
+    def testParseArgsWorkers(self):
+        self.assertEqual(self.airflow.parseArgs([]).workers, 1)
+        self.assertEqual(self.airflow.parseArgs(shlex.split('-w 8')).workers, 8)
+
+    def testSetWorkers(self):
+        self.airflow.setWorkers(workers=16)
+        self.assertEqual(self.airflow.workers, 16)
+        self.assertEqual(self.airflow.transport.pool_size, 16)
+        with self.assertRaises(ValueError):
+            self.airflow.setWorkers(workers=0)
+
+    def testCollectResultsConcurrentMatchesSequential(self):
+        server = MockAirflowServer(dag_count=23, runs_per_dag=7, max_page_limit=5).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=3, page_limit=5)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        start_date = end_date - timedelta(days=2)
+        sequential = self.airflow.collectResults(dag_ids, start_date, end_date)
+        self.airflow.setWorkers(workers=4)
+        concurrent = self.airflow.collectResults(dag_ids, start_date, end_date)
+        self.assertEqual(len(concurrent), 23)
+        self.assertEqual(sequential, concurrent)
+        self.assertEqual(self.airflow.consolidateResults(sequential), self.airflow.consolidateResults(concurrent))
+
+    def testExtractIdsFromResponseWithTags(self):
+        dict = {}
+        dict['dags'] = [{'dag_id':1, 'tags': [{'name': 'dl'}]}, {'dag_id':2, 'tags': []}]
+        ret = self.airflow.extractIdsFromResponse(response=dict, tags=['dl'])
+        self.assertEqual([1], ret)
+
+    def testBuildDagFilters(self):
+        self.assertEqual(self.airflow.buildDagFilters(), {'fields': ['dag_id']})
+        self.assertEqual(self.airflow.buildDagFilters(prefix='DL', suffix='prd'),
+                         {'dag_id_pattern': 'DL', 'fields': ['dag_id']})
+        self.assertEqual(self.airflow.buildDagFilters(suffix='prd', tags=['a']),
+                         {'dag_id_pattern': 'prd', 'tags': ['a'], 'fields': ['dag_id', 'tags']})
+
+    def testListAllActiveDagsMockServer(self):
+        server = MockAirflowServer(dag_count=250, runs_per_dag=0).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setWorkers(workers=3)
+        ret = self.airflow.listAllActiveDags()
+        self.assertEqual(ret, [x['dag_id'] for x in server.dags])
+        self.assertEqual(server.request_count, 3)
+        server.dag_list_params = {'only_active', 'limit', 'offset'}
+        self.assertEqual(self.airflow.listAllActiveDags(), ret)
+        self.assertEqual(server.request_count, 7)
+
+    def testListAllActiveDagsExactPages(self):
+        server = MockAirflowServer(dag_count=200, runs_per_dag=0).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.assertEqual(len(self.airflow.listAllActiveDags()), 200)
+        self.assertEqual(server.request_count, 2)
+
+    def testListAllActiveDagsClampedPages(self):
+        server = MockAirflowServer(dag_count=250, runs_per_dag=0, max_page_limit=50).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.assertEqual(self.airflow.listAllActiveDags(), [x['dag_id'] for x in server.dags])
+        self.assertEqual(server.request_count, 5)
+
+    def testListAllActiveDagsPushdown(self):
+        server = MockAirflowServer(dag_count=250, runs_per_dag=0).start()
+        self.addCleanup(server.stop)
+        server.dags[7]['tags'] = [{'name': 'dl'}]
+        self.airflow.baseURL = server.url
+        ret = self.airflow.listAllActiveDags(prefix='DAG_0001')
+        self.assertEqual(len(ret), 10)
+        self.assertEqual(server.request_count, 1)
+        ret = self.airflow.listAllActiveDags(tags=['dl'])
+        self.assertEqual(ret, ['dag_00007'])
+
+    def testListAllActiveDagsPushdownFallback(self):
+        server = MockAirflowServer(dag_count=150, runs_per_dag=0).start()
+        self.addCleanup(server.stop)
+        server.dag_list_params = {'only_active', 'limit', 'offset', 'dag_id_pattern', 'tags'}
+        server.dags[120]['tags'] = [{'name': 'dl'}]
+        self.airflow.baseURL = server.url
+        ret = self.airflow.listAllActiveDags(prefix='dag_0001')
+        self.assertEqual(len(ret), 150)
+        self.assertEqual(len(self.airflow.filterDagsByPrefixSuffix(ret, prefix='dag_0001')), 10)
+        ret = self.airflow.listAllActiveDags(tags=['dl'])
+        self.assertEqual(ret, ['dag_00120'])
+
+    def testSelectDagsWithDagFilter(self):
+        server = MockAirflowServer(dag_count=250, runs_per_dag=0).start()
+        self.addCleanup(server.stop)
+        server.dags[101]['tags'] = [{'name': 'tmp'}]
+        self.airflow.baseURL = server.url
+        self.airflow.setDagFilter(DagFilter(prefixes=['dag_0010', 'DAG_0020'], exclude_tags=['tmp']))
+        ret = self.airflow.selectDags()
+        self.assertEqual(ret, [f'dag_{i:05d}' for i in list(range(100, 110)) + list(range(200, 210)) if i != 101])
+        self.assertEqual(self.airflow.dag_tags['dag_00101'], ['tmp'])
+        self.airflow.setDagFilter()
+        self.assertEqual(self.airflow.selectDags(prefix='dag_0010,dag_0020'), [f'dag_{i:05d}' for i in list(range(100, 110)) + list(range(200, 210))])
+
+    def testAnalyseFailedTasksMockServer(self):
+        server = MockAirflowServer(dag_count=5, runs_per_dag=12, max_page_limit=2).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=4, page_limit=100)
+        self.airflow.setWorkers(workers=3)
+        self.airflow.setTaskAnalysis(enabled=True)
+        end_date = datetime(2024, 8, 15)
+        result_list = self.airflow.collectResults(dag_ids=[x['dag_id'] for x in server.dags],
+                                                  start_date=end_date - timedelta(1), end_date=end_date)
+        self.assertEqual(sum(x['fail_count'] for x in result_list), 15)
+        self.assertEqual(len(self.airflow.failed_runs['dag_00000']), 3)
+        ret = self.airflow.analyseFailedTasks()
+        self.assertEqual(len(ret), 15)
+        self.assertTrue(all(x['fail_count'] == 1 for x in ret))
+        self.assertEqual(ret[0], {'dag_id': 'dag_00000', 'task_id': 'task_0', 'fail_count': 1})
+        # 15 execuções em 4 lotes, os run ids se repetem entre as dags e 3 lotes trazem 6 tasks (3 páginas de 2).
+        self.assertEqual(server.requests_by_path['/api/v1/dags/~/dagRuns/~/taskInstances/list'], 11)
+
+    def testCollectResultsShardedMatchesWholeWindow(self):
+        server = MockAirflowServer(dag_count=7, runs_per_dag=100, max_page_limit=20).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=3, page_limit=20)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        expected = self.airflow.collectResults(dag_ids=dag_ids, start_date=end_date - timedelta(3), end_date=end_date)
+        expected_report = self.airflow.reportResults()
+        self.airflow.setWorkers(workers=3)
+        self.airflow.setSharding(shard_days=1)
+        ret = self.airflow.collectResults(dag_ids=dag_ids, start_date=end_date - timedelta(3), end_date=end_date)
+        self.assertEqual(ret, expected)
+        self.assertEqual(ret[0]['run_count'], 72)
+        self.assertEqual(self.airflow.reportResults(), expected_report)
+        self.assertEqual(self.airflow.splitWindow(end_date - timedelta(3), end_date, 2),
+                         [(end_date - timedelta(3), end_date - timedelta(1)), (end_date - timedelta(1), end_date)])
+
+    def testCollectResultsResumesFromCheckpoint(self):
+        server = MockAirflowServer(dag_count=5, runs_per_dag=50).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=2)
+        fd, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        self.airflow.setSharding(shard_days=1, checkpoint=path)
+        # interrompido depois das duas primeiras dags.
+        self.airflow.collectResults(dag_ids=dag_ids[:2], start_date=end_date - timedelta(2), end_date=end_date)
+        self.airflow.checkpoint.close()
+        with open(path, 'a') as f:
+            f.write('{"shard": ["incompleta"')
+        requests = server.requests_by_path['/api/v1/dags/~/dagRuns/list']
+        self.assertEqual(requests, 2)
+        self.airflow.setSharding(shard_days=1, checkpoint=path)
+        ret = self.airflow.collectResults(dag_ids=dag_ids, start_date=end_date - timedelta(2), end_date=end_date)
+        self.airflow.checkpoint.close()
+        self.assertEqual(server.requests_by_path['/api/v1/dags/~/dagRuns/list'] - requests, 4)
+        self.assertEqual([x['run_count'] for x in ret], [48] * 5)
+        self.assertEqual(sum(x['fail_count'] for x in ret), 60)
+
+    def testCollectResultsExport(self):
+        server = MockAirflowServer(dag_count=5, runs_per_dag=12).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=2)
+        fd, path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        self.airflow.setExport(path=path)
+        end_date = datetime(2024, 8, 15)
+        ret = self.airflow.collectResults(dag_ids=[x['dag_id'] for x in server.dags],
+                                          start_date=end_date - timedelta(1), end_date=end_date)
+        self.airflow.exporter.close()
+        with open(path) as f:
+            rows = [json.loads(x) for x in f]
+        self.assertEqual([{k: x[k] for k in ('dag_id', 'run_count', 'fail_count')} for x in rows], ret)
+
+    def testShardedPartialsMatchWholeRun(self):
+        server = MockAirflowServer(dag_count=11, runs_per_dag=40).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setBatchOptions(batch_size=3)
+        end_date = datetime(2024, 8, 15)
+        expected = self.airflow.analyseWindow(end_date=end_date, qtdDias=2)
+        expected_report = self.airflow.reportResults()
+        partials = []
+        for shard in range(3):
+            monitor = AirflowMonitor(logger=self.airflow.logger)
+            monitor.baseURL = server.url
+            monitor.setBatchOptions(batch_size=3)
+            monitor.setShard(shard, 3)
+            partials.append(json.loads(json.dumps(monitor.runPartial(end_date=end_date, qtdDias=2))))
+        dag_ids = [x['dag_id'] for p in partials for x in p['result_list']]
+        self.assertEqual(sorted(dag_ids), [x['dag_id'] for x in expected])
+        result_list, report = self.airflow.mergePartialResults(partials[::-1])
+        self.assertEqual(result_list, expected)
+        self.assertEqual(self.airflow.consolidatePartials(partials), self.airflow.consolidateResults(expected))
+        for key in ('total_runs', 'states', 'failure_rate', 'daily'):
+            self.assertEqual(report[key], expected_report[key])
+        self.assertEqual(report['dags'], expected_report['dags'])
+        self.assertAlmostEqual(report['duration']['mean'], expected_report['duration']['mean'])
+        self.assertEqual(report['duration']['max'], expected_report['duration']['max'])
+        with self.assertRaises(ValueError):
+            self.airflow.mergePartialResults(partials[:2])
+        with self.assertRaises(ValueError):
+            self.airflow.mergePartialResults(partials + partials[:1])
+
+    def testMainProcessesAndMerge(self):
+        server = MockAirflowServer(dag_count=6, runs_per_dag=20).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        expected = self.airflow.consolidateResults(self.airflow.analyseWindow(end_date=datetime(2024, 8, 15), qtdDias=1))
+        environment = dict(os.environ, AIRFLOW_URL=server.url)
+        monitor = AirflowMonitor(logger=self.airflow.logger, environment=environment)
+        # os processos dos shards usam o mesmo nível de log.
+        monitor.logger.setLevel(logging.ERROR)
+        ret = monitor.main(shlex.split('-d 2024-08-15 -q 1 --processes 2'))
+        self.assertEqual(ret, expected)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        paths = [os.path.join(directory.name, f'shard{i}.json') for i in range(2)]
+        for i, path in enumerate(paths):
+            monitor = AirflowMonitor(logger=self.airflow.logger, environment=environment)
+            monitor.main(shlex.split(f'-d 2024-08-15 -q 1 --shard {i}/2 --partial {path}'))
+        monitor = AirflowMonitor(logger=self.airflow.logger, environment=environment)
+        self.assertEqual(monitor.main(['--merge'] + paths), expected)
+        with self.assertRaises(ValueError):
+            monitor.main(shlex.split(f'--merge {paths[0]} --outputRuns runs.ndjson'))
+
+    def testToEpochAndFromEpoch(self):
+        date = datetime(2024, 8, 15, 12, 30, 30)
+        epoch = self.airflow.toEpoch(date)
+        self.assertEqual(epoch, self.airflow.toEpoch('2024-08-15T12:30:30+00:00'))
+        self.assertEqual(self.airflow.fromEpoch(epoch), date)
+        self.assertIsNone(self.airflow.toEpoch(None))
+
+    def testParseArgsStore(self):
+        args = self.airflow.parseArgs(shlex.split('--store runs.db --retentionDays 30'))
+        self.assertEqual(args.store, 'runs.db')
+        self.assertEqual(args.retentionDays, 30)
+        self.assertIsNone(self.airflow.parseArgs([]).store)
+
+    def testStoreRejectsShardDaysAndCheckpoint(self):
+        for command in ('--store runs.db --shardDays 7', '--store runs.db --checkpoint ck.ndjson', '--serve --shardDays 7'):
+            with self.assertRaises(ValueError):
+                self.airflow.applyArgs(self.airflow.parseArgs(shlex.split(command)))
+        self.assertIsNone(self.airflow.store)
+
+    def testGetAllExecutionsByDagIdsIncremental(self):
+        server = MockAirflowServer(dag_count=4, runs_per_dag=6).start()
+        self.addCleanup(server.stop)
+        running = server.runs['dag_00002'][0]
+        running['state'] = 'running'
+        running['end_date'] = None
+        self.airflow.baseURL = server.url
+        self.airflow.setStore(path=':memory:', retention_days=100000)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        start_date = end_date - timedelta(days=2)
+        first = self.airflow.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        self.assertEqual([len(first[x]) for x in dag_ids], [6, 6, 5, 6])
+        # a segunda consulta busca a partir da marca e, à parte, a execução ainda pendente.
+        running['state'] = 'failed'
+        running['end_date'] = running['start_date']
+        second = self.airflow.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        self.assertEqual([len(second[x]) for x in dag_ids], [6, 6, 6, 6])
+        self.assertEqual(self.airflow.analyseDagRuns('dag_00002', second['dag_00002'])['fail_count'], 2)
+        self.assertEqual(server.request_count, 3)
+        third = self.airflow.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        self.assertEqual(third, second)
+        self.assertEqual(server.request_count, 4)
+
+    def testIncrementalWithStuckRunFetchesFromWatermark(self):
+        server = MockAirflowServer(dag_count=10, runs_per_dag=24 * 10, fail_every=0).start()
+        self.addCleanup(server.stop)
+        stuck = server.runs['dag_00003'][24 * 8]
+        stuck['state'] = 'running'
+        stuck['end_date'] = None
+        self.airflow.baseURL = server.url
+        self.airflow.setStore(path=':memory:', retention_days=100000)
+        dag_ids = [x['dag_id'] for x in server.dags]
+        end_date = datetime(2024, 8, 15)
+        start_date = end_date - timedelta(days=10)
+        with mock.patch.object(self.airflow.store, 'saveRuns', wraps=self.airflow.store.saveRuns) as saveRuns:
+            self.airflow.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        # as execuções são gravadas uma página por vez, não a consulta inteira de uma vez.
+        self.assertLessEqual(max(len(x.args[1]) for x in saveRuns.call_args_list), self.airflow.page_limit)
+        self.assertEqual(sum(len(x.args[1]) for x in saveRuns.call_args_list), 2400)
+        self.assertGreater(server.request_count, 20)
+        # a execução presa há 8 dias não faz o lote inteiro ser baixado de novo desde ela.
+        requests = server.request_count
+        stuck['state'] = 'failed'
+        stuck['end_date'] = stuck['start_date']
+        ret = self.airflow.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        self.assertEqual(server.request_count - requests, 2)
+        self.assertEqual(sum(len(x) for x in ret.values()), 2400)
+        self.assertEqual(self.airflow.analyseDagRuns('dag_00003', ret['dag_00003'])['fail_count'], 1)
+        monitor = AirflowMonitor(logger=self.airflow.logger)
+        monitor.baseURL = server.url
+        expected = monitor.getAllExecutionsByDagIds(dag_ids, start_date, end_date)
+        self.assertEqual({x: sorted(zip(y.run_ids, y.states)) for x, y in ret.items()},
+                         {x: sorted(zip(y.run_ids, y.states)) for x, y in expected.items()})
+
+    def testAnalyseWindowFromRollups(self):
+        server = MockAirflowServer(dag_count=6, runs_per_dag=24 * 8).start()
+        self.addCleanup(server.stop)
+        end_date = datetime(2024, 8, 15)
+        self.airflow.baseURL = server.url
+        self.airflow.setStore(path=':memory:', retention_days=100000)
+        self.airflow.analyseWindow(end_date=end_date, qtdDias=7)
+        self.airflow.setRollup(enabled=True)
+        monitor = AirflowMonitor(logger=self.airflow.logger)
+        monitor.baseURL = server.url
+        for day, qtdDias, dag_filter in ((15, 7, None), (15, 3, None), (13, 2, DagFilter(globs=['dag_0000[135]']))):
+            end_date = datetime(2024, 8, day)
+            self.airflow.setDagFilter(dag_filter)
+            monitor.setDagFilter(dag_filter)
+            expected = monitor.analyseWindow(end_date=end_date, qtdDias=qtdDias)
+            requests = server.request_count
+            ret = self.airflow.analyseWindow(end_date=end_date, qtdDias=qtdDias)
+            # os agregados respondem sem consultar o Airflow.
+            self.assertEqual(server.request_count, requests)
+            self.assertEqual(ret, expected)
+            self.assertEqual(self.airflow.consolidateResults(ret), monitor.consolidateResults(expected))
+            report = self.airflow.reportResults()
+            expected_report = monitor.reportResults()
+            for key in ('total_runs', 'states', 'failure_rate', 'daily'):
+                self.assertEqual(report[key], expected_report[key])
+            self.assertAlmostEqual(report['duration']['mean'], expected_report['duration']['mean'])
+        self.assertEqual(len(ret), 3)
+        with self.assertRaises(ValueError):
+            AirflowMonitor(logger=self.airflow.logger).setRollup(enabled=True)
+
+    def testResponseCacheMockServer(self):
+        server = MockAirflowServer(dag_count=5, runs_per_dag=30).start()
+        self.addCleanup(server.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.db')
+        end_date = datetime(2024, 8, 15)
+        self.airflow.baseURL = server.url
+        self.airflow.setCache(path=path, ttls=['dags=0'])
+        expected = self.airflow.analyseWindow(end_date=end_date, qtdDias=1)
+        self.airflow.response_cache.close()
+        runs = server.requests_by_path['/api/v1/dags/~/dagRuns/list']
+        dags = server.requests_by_path['/api/v1/dags']
+        # nova execução: as execuções terminadas vêm do cache e a listagem de dags é revalidada pelo ETag.
+        monitor = AirflowMonitor(logger=self.airflow.logger)
+        monitor.baseURL = server.url
+        monitor.setCache(path=path, ttls=['dags=0'])
+        self.addCleanup(monitor.response_cache.conn.close)
+        self.assertEqual(monitor.analyseWindow(end_date=end_date, qtdDias=1), expected)
+        self.assertEqual(server.requests_by_path['/api/v1/dags/~/dagRuns/list'], runs)
+        self.assertEqual(server.requests_by_path['/api/v1/dags'] - dags, server.not_modified)
+        self.assertGreater(server.not_modified, 0)
+        self.assertEqual(monitor.response_cache.stats['revalidated'], server.not_modified)
+        args = self.airflow.parseArgs(shlex.split('--cache cache.db --cacheSize 10 --cacheTtl runs=5'))
+        self.assertEqual((args.cache, args.cacheSize, args.cacheTtl), ('cache.db', 10, ['runs=5']))
+
+    def testDurationAndDelaySla(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=24).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setSla(sla=200, delay_sla=20)
+        ret = self.airflow.analyseWindow(end_date=datetime(2024, 8, 15), qtdDias=1)
+        report = self.airflow.reportResults()
+        # execuções de 5 minutos, iniciadas 0, 15, 30 ou 45 segundos depois da logical_date.
+        self.assertEqual(report['sla'], {'duration': 200, 'delay': 20, 'duration_breaches': 72, 'delay_breaches': 36})
+        self.assertEqual(report['duration']['p99'], 300.0)
+        self.assertEqual(report['delay']['max'], 45.0)
+        self.assertAlmostEqual(report['dags'][0]['delay_mean'], 22.5)
+        self.assertEqual([x['run_count'] for x in ret], [24] * 3)
+        args = self.airflow.parseArgs(shlex.split('--sla 3600 --delaySla 600'))
+        self.assertEqual((args.sla, args.delaySla), (3600, 600))
+        with self.assertRaises(ValueError):
+            self.airflow.setSla(sla=0)
+
+    def testParseArgsServe(self):
+        args = self.airflow.parseArgs(shlex.split('--serve --interval 30 --port 9000'))
+        self.assertTrue(args.serve)
+        self.assertEqual(args.interval, 30)
+        self.assertEqual(args.port, 9000)
+        self.assertFalse(self.airflow.parseArgs([]).serve)
+
+    def testServeMockServer(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=8, end_date=datetime.now(timezone.utc)).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.serve(qtdDias=1, interval=0, port=0, max_cycles=2)
+        text = self.airflow.metrics_registry.render()
+        self.assertIn('airflow_monitor_dag_runs{dag_id="dag_00001",state="failed"} 2', text)
+        self.assertIn('airflow_monitor_failure_ratio 0.25', text)
+        self.assertIn('airflow_monitor_poll_errors_total 0', text)
+        self.assertIn('airflow_monitor_dag_duration_seconds{dag_id="dag_00001",quantile="0.95"} 300', text)
+        self.assertIn('airflow_monitor_dag_delay_seconds{dag_id="dag_00001",quantile="0.99"} 45', text)
+        # o segundo ciclo reaproveita a listagem e busca somente a partir da marca d'agua.
+        self.assertEqual(server.requests_by_path['/api/v1/dags'], 1)
+        self.assertEqual(server.requests_by_path['/api/v1/dags/~/dagRuns/list'], 2)
+
+    def testServeCountsTruncatedPolls(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=8, end_date=datetime.now(timezone.utc)).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.setTransportOptions(retries=0, backoff=0)
+        # a consulta das execuções do primeiro ciclo cai no meio do corpo.
+        server.truncated = 1
+        self.airflow.serve(qtdDias=1, interval=0, port=0, max_cycles=3)
+        text = self.airflow.metrics_registry.render()
+        self.assertIn('airflow_monitor_poll_errors_total 1', text)
+        self.assertIn('airflow_monitor_dag_runs{dag_id="dag_00001",state="failed"} 2', text)
+
+    def testServeEvictsStore(self):
+        server = MockAirflowServer(dag_count=2, runs_per_dag=4, end_date=datetime.now(timezone.utc)).start()
+        self.addCleanup(server.stop)
+        self.airflow.baseURL = server.url
+        self.airflow.serve(qtdDias=1, interval=0, port=0, max_cycles=1)
+        self.assertEqual(self.airflow.retention_days, 2)
+        # execução antiga que o daemon já tinha guardado, a próxima listagem a remove do store.
+        old = self.airflow.toEpoch(datetime.now(timezone.utc) - timedelta(days=5))
+        self.airflow.store.saveRuns(['dag_00000'], [{'dag_id': 'dag_00000', 'dag_run_id': 'old', 'state': 'success',
+                                                    'start_date': old, 'end_date': old + 60}],
+                                    fetched_from=old, watermark=old + 60)
+        self.airflow.serve(qtdDias=1, interval=0, port=0, max_cycles=1)
+        conn = self.airflow.store.conn
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM dag_runs WHERE start_date < ?', (old + 3600,)).fetchone()[0], 0)
+        self.assertEqual(conn.execute('SELECT SUM(runs) FROM dag_daily').fetchone()[0], 8)
+
+    def testParseArgsTraceProfile(self):
+        args = self.airflow.parseArgs(shlex.split('--trace trace.json --profile run.prof'))
+        self.assertEqual(args.trace, 'trace.json')
+        self.assertEqual(args.profile, 'run.prof')
+
+    def testInstrumentationMockServer(self):
+        server = MockAirflowServer(dag_count=3, runs_per_dag=4).start()
+        self.addCleanup(server.stop)
+        server.transient_errors = 1
+        self.airflow.baseURL = server.url
+        self.airflow.setTransportOptions(backoff=0)
+        end_date = datetime(2024, 8, 15)
+        runs = self.airflow.getAllExecutionsByDagIds(['dag_00000', 'dag_00001'], end_date - timedelta(days=1), end_date)
+        self.airflow.analyseDagRuns('dag_00000', runs['dag_00000'])
+        summary = self.airflow.instrumentation.summary()
+        endpoint = summary['endpoints']['POST /api/v1/dags/~/dagRuns/list']
+        self.assertEqual(endpoint['calls'], 2)
+        self.assertEqual(endpoint['errors'], 1)
+        self.assertEqual(endpoint['retries'], 1)
+        self.assertGreater(endpoint['bytes'], 0)
+        self.assertEqual(summary['phases']['run_fetching']['calls'], 1)
+        self.assertEqual(summary['phases']['analysis']['calls'], 1)
+        self.assertIn('auth', summary['phases'])
+
 if __name__ == '__main__':
     unittest.main()  # pragma: no cover
\ No newline at end of file
@@ -0,0 +1,59 @@
+import time
+import logging
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from airflowMWAA import AirflowMWAA
+from transport import AirflowRequestError
+
+class TestAirflowMWAA(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('AirflowMWAATest')
+        l.setLevel(logging.ERROR)
+        aws = mock.patch('airflowMWAA.AWS')
+        self.AWS = aws.start()
+        self.addCleanup(aws.stop)
+        self.AWS.return_value.createClient.return_value.create_web_login_token.return_value = {
+            'WebServerHostname': 'mwaa.local', 'WebToken': 'token'}
+        self.airflow = AirflowMWAA(logger=l, environment={'AWS_REGION': 'region', 'AWS_AIRFLOW_NAME': 'mwaa'})
+        self.addCleanup(self.airflow.stopAuthRefresher)
+        self.airflow.initializeLogger(logger=l, level=logging.CRITICAL)
+        # a sessão vale 9 horas, a renovação acontece 100ms depois do login.
+        self.airflow.REFRESH_MARGIN = timedelta(hours=9) - timedelta(milliseconds=100)
+        self.airflow.RETRY_INTERVAL = 0.05
+        self.logins = []
+
+    def login(self, **kwargs):
+        self.logins.append((datetime.now(), self.airflow.cookies_expiration))
+        # a segunda chamada falha, as seguintes voltam a responder.
+        if len(self.logins) == 2:
+            raise AirflowRequestError('Erro ao chamar a URL: login', status_code=502)
+        response = mock.Mock()
+        response.cookies = {'session': f'session-{len(self.logins)}'}
+        return response
+
+    def waitLogins(self, count:int, timeout:float=5) -> None:
+        limit = time.time() + timeout
+        while len(self.logins) < count and time.time() < limit:
+            time.sleep(0.01)
+
+    def testRefreshAuthRenewsBeforeExpirationAndRetries(self):
+        with mock.patch.object(self.airflow.transport, 'request', side_effect=self.login):
+            self.airflow.authenticate()
+            self.assertEqual(self.airflow.cookies, {'session': 'session-1'})
+            self.waitLogins(3)
+            self.airflow.stopAuthRefresher()
+            self.airflow.refresher.join(timeout=5)
+        self.assertGreaterEqual(len(self.logins), 3)
+        # a renovação acontece antes da sessão anterior expirar.
+        renewed_at, expiration = self.logins[1]
+        self.assertLess(renewed_at, expiration)
+        # depois da falha do segundo login o refresher tenta de novo em vez de encerrar a thread.
+        self.assertEqual(self.airflow.cookies, {'session': f'session-{len(self.logins)}'})
+        self.assertEqual(self.airflow.transport.getSession().cookies['session'], f'session-{len(self.logins)}')
+        self.assertGreater(self.airflow.cookies_expiration, expiration)
+        self.assertFalse(self.airflow.refresher.is_alive())
+        self.AWS.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
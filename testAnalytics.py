@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from analytics import RunColumns, STATES, toEpochOrNan
+
+class TestAnalytics(unittest.TestCase):
+    def setUp(self):
+        self.columns = RunColumns()
+        self.columns.add('a', [{'state': 'success', 'start_date': '2024-08-14T10:00:00+00:00', 'end_date': '2024-08-14T10:01:00+00:00'},
+                               {'state': 'failed', 'start_date': '2024-08-15T10:00:00+00:00', 'end_date': '2024-08-15T10:03:00+00:00'},
+                               {'state': 'running', 'start_date': '2024-08-15T11:00:00+00:00', 'end_date': None}])
+        self.columns.add('b', [])
+        self.columns.add('c', [{'state': 'failed', 'start_date': 1723716000.0, 'end_date': 1723716060.0},
+                               {'state': 'removed', 'start_date': None, 'end_date': None}])
+
+    def testToEpochOrNan(self):
+        self.assertEqual(toEpochOrNan('2024-08-15T00:00:00'), toEpochOrNan('2024-08-15T00:00:00+00:00'))
+        self.assertTrue(np.isnan(toEpochOrNan(None)))
+
+    def testStateCounts(self):
+        counts = self.columns.stateCounts()
+        self.assertEqual(counts.shape, (3, len(STATES)))
+        self.assertEqual(dict(zip(STATES, counts[0].tolist())), {'success': 1, 'failed': 1, 'running': 1, 'queued': 0, 'other': 0})
+        self.assertEqual(counts[1].sum(), 0)
+        self.assertEqual(dict(zip(STATES, counts[2].tolist()))['other'], 1)
+        self.assertEqual(self.columns.failureRates(counts).tolist(), [1 / 3, 0.0, 0.5])
+
+    def testDailyCounts(self):
+        days, counts = self.columns.dailyCounts()
+        self.assertEqual(len(days), 2)
+        self.assertEqual(counts.sum(), 4)
+        self.assertEqual(counts[0].tolist(), [1, 0, 0, 0, 0])
+
+    def testReport(self):
+        report = self.columns.report()
+        self.assertEqual(report['total_runs'], 5)
+        self.assertEqual(report['states']['failed'], 2)
+        self.assertAlmostEqual(report['failure_rate'], 0.4)
+        self.assertEqual(report['duration']['max'], 180.0)
+        self.assertEqual(report['dags'][0]['duration_mean'], 120.0)
+        self.assertIsNone(report['dags'][1]['duration_max'])
+        self.assertEqual([x['day'] for x in report['daily']], ['2024-08-14', '2024-08-15'])
+
+    def testTimingAndSla(self):
+        columns = RunColumns(sla=100, delay_sla=30)
+        columns.add('a', [{'state': 'success', 'logical_date': '2024-08-14T10:00:00+00:00',
+                           'start_date': '2024-08-14T10:00:10+00:00', 'end_date': '2024-08-14T10:01:10+00:00'},
+                          {'state': 'failed', 'logical_date': '2024-08-15T10:00:00+00:00',
+                           'start_date': '2024-08-15T10:01:00+00:00', 'end_date': '2024-08-15T10:04:00+00:00'},
+                          {'state': 'running', 'start_date': '2024-08-15T11:00:00+00:00', 'end_date': None}])
+        report = columns.report()
+        dag = report['dags'][0]
+        self.assertEqual(dag['sla_breaches'], {'duration': 1, 'delay': 1})
+        self.assertEqual(report['sla'], {'duration': 100, 'delay': 30, 'duration_breaches': 1, 'delay_breaches': 1})
+        self.assertEqual(dag['delay_max'], 60.0)
+        self.assertEqual(dag['delay_mean'], 35.0)
+        self.assertLess(abs(dag['duration_p50'] - 60.0), 0.6)
+        self.assertLess(abs(report['delay']['p50'] - 10.0), 0.1)
+        self.assertNotIn('sla', self.columns.report())
+
+    def testReportEmpty(self):
+        report = RunColumns().report()
+        self.assertEqual(report['total_runs'], 0)
+        self.assertEqual(report['failure_rate'], 0.0)
+        self.assertEqual(report['duration'], {})
+        self.assertEqual(report['daily'], [])
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
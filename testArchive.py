@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+from datetime import datetime
+from airflow import AirflowMonitor
+from mockAirflow import MockAirflowServer
+from archive import ArchiveWriter, ArchiveReader, requestKey
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, 'airflow.archive')
+        self.logger = logging.getLogger('ArchiveTest')
+        self.environment = {'AIRFLOW_URL': 'http://localhost', 'AIRFLOW_USERNAME': 'u', 'AIRFLOW_PASSWORD': 'p'}
+
+    def createMonitor(self) -> AirflowMonitor:
+        monitor = AirflowMonitor(logger=self.logger, environment=self.environment)
+        monitor.logger.setLevel(logging.ERROR)
+        monitor.setBatchOptions(batch_size=4, page_limit=10)
+        return monitor
+
+    def testRequestKey(self):
+        self.assertEqual(requestKey('post', 'http://a:8080/api/v1/x?b=1', '{"b": 1, "a": 2}'),
+                         requestKey('POST', 'https://outro/api/v1/x?b=1', b'{"a":2,"b":1}'))
+        self.assertNotEqual(requestKey('GET', 'http://a/x?b=1'), requestKey('GET', 'http://a/x?b=2'))
+
+    def testRecordAndReplay(self):
+        server = MockAirflowServer(dag_count=30, runs_per_dag=60).start()
+        self.addCleanup(server.stop)
+        end_date = datetime(2024, 8, 15)
+        recorder = self.createMonitor()
+        recorder.baseURL = server.url
+        recorder.setArchive(record=self.path)
+        expected = recorder.analyseWindow(end_date=end_date, qtdDias=2, prefix='dag_0001')
+        wide = recorder.analyseWindow(end_date=end_date, qtdDias=2)
+        recorder.archive_writer.close()
+        requests = server.request_count
+        server.stop()
+
+        replayer = self.createMonitor()
+        replayer.setArchive(replay=self.path)
+        self.addCleanup(replayer.archive_reader.close)
+        self.assertEqual(replayer.analyseWindow(end_date=end_date, qtdDias=2, prefix='dag_0001'), expected)
+        self.assertEqual(server.request_count, requests)
+        # outro filtro e outra janela, respondidos a partir das dags e execuções gravadas.
+        ret = replayer.analyseWindow(end_date=end_date, qtdDias=1, prefix='dag_0002')
+        self.assertEqual([x['dag_id'] for x in ret], [f'dag_{i:05d}' for i in range(20, 30)])
+        self.assertEqual([x['run_count'] for x in ret], [24] * 10)
+        self.assertEqual(replayer.analyseWindow(end_date=end_date, qtdDias=2, suffix='7'), [x for x in wide if x['dag_id'].endswith('7')])
+        with self.assertRaises(SystemExit):
+            replayer.executeRequest('GET', f'{replayer.baseURL}/api/v1/health')
+
+    def testReplayIgnoresTruncatedEntry(self):
+        writer = ArchiveWriter(self.path)
+        writer.record('GET', 'http://a/api/v1/dags?limit=1', None, 200, json.dumps({'dags': [], 'total_entries': 0}).encode())
+        writer.record('GET', 'http://a/api/v1/dags?limit=2', None, 400, b'')
+        writer.close()
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00\x00\x00\x10{"key": "GET')
+        reader = ArchiveReader(self.path)
+        self.addCleanup(reader.close)
+        self.assertEqual(len(reader), 2)
+        self.assertEqual(reader.base_url, 'http://a')
+        self.assertEqual(reader.replay('GET', 'http://b/api/v1/dags?limit=1').json()['total_entries'], 0)
+        self.assertEqual(reader.replay('GET', 'http://b/api/v1/dags?limit=2').status_code, 400)
+
+    def testInvalidArchive(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'nao e um arquivo')
+        with self.assertRaises(ValueError):
+            ArchiveReader(self.path)
+        with self.assertRaises(ValueError):
+            self.createMonitor().setArchive(record=self.path, replay=self.path)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
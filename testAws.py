@@ -0,0 +1,78 @@
+import os
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from aws import AWS
+
+class TestAws(unittest.TestCase):
+    def setUp(self):
+        os.environ['AWS_REGION'] = 'region'
+        os.environ['AWS_ACCESS_KEY_ID'] = 'KEY_ID'
+        os.environ['AWS_SECRET_ACCESS_KEY'] = 'ACCESS_KEY'
+        os.environ['AWS_ROLE_ARN'] = 'arn:aws:iam::123:role/monitor'
+        os.environ['AWS_ROLE_SESSION_NAME'] = 'monitor'
+        self.addCleanup(os.environ.pop, 'AWS_ROLE_ARN')
+        self.addCleanup(os.environ.pop, 'AWS_ROLE_SESSION_NAME')
+        home = mock.patch.dict(os.environ, {'HOME': '/nonexistent'})
+        home.start()
+        self.addCleanup(home.stop)
+        l = logging.getLogger('AwsTest')
+        l.setLevel(logging.ERROR)
+        self.aws = AWS(logger=l)
+
+    def assumeRoleResponse(self, minutes:int) -> dict:
+        return {'Credentials': {'AccessKeyId': 'A', 'SecretAccessKey': 'S', 'SessionToken': 'T',
+                                'Expiration': datetime.now(timezone.utc) + timedelta(minutes=minutes)}}
+
+    @mock.patch('aws.boto3')
+    def testCreateClientIsCached(self, boto3):
+        boto3.session.Session.return_value.client.return_value.assume_role.return_value = self.assumeRoleResponse(60)
+        first = self.aws.createClient('mwaa')
+        second = self.aws.createClient('mwaa')
+        self.assertIs(first, second)
+        self.aws.createClient('mwaa', region='other')
+        self.assertEqual(boto3.client.call_count, 2)
+        self.assertEqual(boto3.session.Session.return_value.client.return_value.assume_role.call_count, 1)
+
+    @mock.patch('aws.boto3')
+    def testCredentialsRefreshedBeforeExpiration(self, boto3):
+        sts = boto3.session.Session.return_value.client.return_value
+        sts.assume_role.return_value = self.assumeRoleResponse(2)
+        self.aws.createClient('mwaa')
+        sts.assume_role.return_value = self.assumeRoleResponse(60)
+        self.aws.createClient('mwaa')
+        self.assertEqual(sts.assume_role.call_count, 2)
+        self.assertEqual(boto3.client.call_count, 2)
+        self.assertFalse(self.aws.credentialsExpired())
+
+    @mock.patch('aws.boto3')
+    def testWithoutRoleUsesStaticKeys(self, boto3):
+        self.aws.role_arn = None
+        self.aws.createClient('mwaa')
+        self.assertIsNone(self.aws.credentials['expiration'])
+        self.assertEqual(self.aws.credentials['access_key'], 'KEY_ID')
+        self.assertFalse(self.aws.credentialsExpired())
+        boto3.session.Session.assert_not_called()
+
+    def testEnvironmentMapping(self):
+        environment = {'AWS_REGION': 'sa-east-1', 'AWS_ACCESS_KEY_ID': 'OTHER_KEY', 'AWS_SECRET_ACCESS_KEY': 'OTHER_SECRET',
+                       'AWS_ROLE_ARN': 'arn:aws:iam::456:role/other', 'AWS_ROLE_SESSION_NAME': 'other'}
+        home = tempfile.TemporaryDirectory()
+        self.addCleanup(home.cleanup)
+        os.makedirs(os.path.join(home.name, '.aws'))
+        with open(os.path.join(home.name, '.aws', 'credentials'), mode='w', encoding='utf8') as f:
+            f.write('[default]\naws_access_key_id = FILE_KEY\naws_secret_access_key = FILE_SECRET\nregion = us-east-1\n'
+                    '[hml]\naws_access_key_id = HML_KEY\naws_secret_access_key = HML_SECRET\nregion = us-east-2\n')
+        with mock.patch.dict(os.environ, {'HOME': home.name}):
+            # keys of the environment are not replaced by the file nor by the process variables.
+            aws = AWS(logger=self.aws.logger, environment=environment)
+            self.assertEqual((aws.region, aws.access_key_id, aws.secret_access_key), ('sa-east-1', 'OTHER_KEY', 'OTHER_SECRET'))
+            self.assertEqual((aws.role_arn, aws.role_session_name), ('arn:aws:iam::456:role/other', 'other'))
+            aws = AWS(logger=self.aws.logger, environment={'AWS_PROFILE': 'hml'})
+            self.assertEqual((aws.region, aws.access_key_id), ('us-east-2', 'HML_KEY'))
+            self.assertEqual(AWS(logger=self.aws.logger).access_key_id, 'FILE_KEY')
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,44 @@
+import os
+import json
+import shlex
+import logging
+import tempfile
+import unittest
+from benchmark import Benchmark
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('BenchmarkTest')
+        l.setLevel(logging.ERROR)
+        self.benchmark = Benchmark(logger=l)
+
+    def testRunScenario(self):
+        ret = self.benchmark.runScenario('test', {'dag_count': 5, 'runs_per_dag': 3, 'workers': 2})
+        self.assertEqual([x['step'] for x in ret['steps']], ['listAllActiveDags', 'getAllExecutionsByDagId', 'run'])
+        for step in ret['steps']:
+            self.assertGreater(step['requests'], 0)
+            self.assertGreater(step['peak_rss_mb'], 0)
+
+    def testMainWritesOutput(self):
+        f = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        self.benchmark.main(shlex.split(f'benchmark.py --scenario small --dag_count 3 -o {f.name}'))
+        with open(f.name, encoding='utf8') as result:
+            ret = json.load(result)
+        self.assertEqual(ret['results'][0]['scenario'], 'small')
+        self.assertEqual(ret['results'][0]['options']['dag_count'], 3)
+
+    def testMeasureStartup(self):
+        ret = self.benchmark.measureStartup(repeat=1)
+        self.assertEqual([x['command'] for x in ret], ['help', 'import_airflow', 'import_mwaa', 'import_multiEnv'])
+        for startup in ret:
+            self.assertGreater(startup['wall_seconds_min'], 0)
+            self.assertGreater(startup['import_seconds'], 0)
+            # requests, boto3 e numpy só são importados na primeira chamada.
+            self.assertNotIn('requests', startup['heavy_modules'])
+            self.assertNotIn('boto3', startup['heavy_modules'])
+            self.assertNotIn('numpy', startup['heavy_modules'])
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,64 @@
+import os
+import json
+import tempfile
+import unittest
+from dagFilter import DagFilter, DagIndex, parseShard, shardOf
+
+class TestDagFilter(unittest.TestCase):
+    def setUp(self):
+        self.dag_ids = ['DL_vendas_PRD', 'dl_estoque_qas', 'BI_vendas_prd', 'bi_tmp_prd', 'ml_treino_prd']
+
+    def testPrefixesAndSuffixes(self):
+        self.assertEqual(DagFilter(prefixes=['dl', 'Bi']).apply(self.dag_ids),
+                         ['DL_vendas_PRD', 'dl_estoque_qas', 'BI_vendas_prd', 'bi_tmp_prd'])
+        self.assertEqual(DagFilter(prefixes=['dl', 'bi'], suffixes=['PRD']).apply(self.dag_ids),
+                         ['DL_vendas_PRD', 'BI_vendas_prd', 'bi_tmp_prd'])
+        self.assertEqual(DagFilter(suffixes=['qas', 'x']).apply(self.dag_ids), ['dl_estoque_qas'])
+        self.assertEqual(DagFilter().apply(self.dag_ids), self.dag_ids)
+
+    def testGlobRegexAndExclude(self):
+        self.assertEqual(DagFilter(globs=['*_vendas_*']).apply(self.dag_ids), ['DL_vendas_PRD', 'BI_vendas_prd'])
+        self.assertEqual(DagFilter(regexes=['estoque|treino']).apply(self.dag_ids), ['dl_estoque_qas', 'ml_treino_prd'])
+        self.assertEqual(DagFilter(suffixes=['prd'], excludes=['*_tmp_*', 'ml_*']).apply(self.dag_ids),
+                         ['DL_vendas_PRD', 'BI_vendas_prd'])
+        # caracteres especiais no prefixo não são tratados como regex.
+        self.assertEqual(DagFilter(prefixes=['a.b']).apply(['a.b_1', 'axb_1']), ['a.b_1'])
+
+    def testTags(self):
+        tags = {'DL_vendas_PRD': ['dl', 'core'], 'dl_estoque_qas': ['dl'], 'bi_tmp_prd': []}
+        index = DagIndex(self.dag_ids, tags=tags)
+        self.assertEqual(index.select(DagFilter(tags=['dl'])), ['DL_vendas_PRD', 'dl_estoque_qas'])
+        self.assertEqual(index.select(DagFilter(tags=['dl'], exclude_tags=['core'])), ['dl_estoque_qas'])
+        self.assertEqual(index.select(DagFilter(prefixes=['bi'], exclude_tags=['core'])), ['BI_vendas_prd', 'bi_tmp_prd'])
+        self.assertTrue(DagFilter(exclude_tags=['core']).needsTags)
+
+    def testServerPattern(self):
+        self.assertEqual(DagFilter(prefixes=['DL']).serverPattern(), 'dl')
+        self.assertEqual(DagFilter(suffixes=['prd']).serverPattern(), 'prd')
+        self.assertIsNone(DagFilter(prefixes=['dl', 'bi']).serverPattern())
+
+    def testFromArgs(self):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as f:
+            json.dump({'prefixes': ['ml'], 'excludes': ['*_qas']}, f)
+        dag_filter = DagFilter.fromArgs(prefix='dl, bi', suffix=None, filter_file=path)
+        self.assertEqual(dag_filter.prefixes, ['dl', 'bi', 'ml'])
+        self.assertEqual(dag_filter.apply(self.dag_ids),
+                         ['DL_vendas_PRD', 'BI_vendas_prd', 'bi_tmp_prd', 'ml_treino_prd'])
+
+    def testShards(self):
+        self.assertEqual(parseShard('2/4'), (2, 4))
+        for value in ('4/4', '-1/2', '1', 'a/b', '0/0'):
+            with self.assertRaises(ValueError):
+                parseShard(value)
+        dag_ids = [f'dag_{i}' for i in range(200)]
+        shards = [shardOf(x, 4) for x in dag_ids]
+        # o hash não depende do processo, o mesmo dag_id cai sempre no mesmo shard.
+        self.assertEqual(shardOf('dl_vendas_prd', 4), 0)
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+        self.assertTrue(all(shardOf(x, 1) == 0 for x in dag_ids))
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
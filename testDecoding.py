@@ -0,0 +1,38 @@
+import json
+import unittest
+from decoding import DagRunStream, RUN_FIELDS
+
+class TestDecoding(unittest.TestCase):
+    def chunks(self, body:str, size:int) -> list:
+        data = body.encode('utf8')
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def testStreamProjectsFields(self):
+        runs = [{'dag_id': 'ação', 'dag_run_id': f'r{i}', 'state': 'failed', 'start_date': None,
+                 'end_date': None, 'conf': {'a': [1, 2, {'b': ']'}]}, 'note': 'x'} for i in range(20)]
+        body = json.dumps({'dag_runs': runs, 'total_entries': 20})
+        for size in (1, 7, 4096):
+            stream = DagRunStream(self.chunks(body, size))
+            ret = list(stream)
+            self.assertEqual(len(ret), 20)
+            self.assertEqual(set(ret[0].keys()), set(RUN_FIELDS))
+            self.assertEqual(ret[0]['dag_id'], 'ação')
+            self.assertEqual(stream.total_entries, 20)
+
+    def testStreamTotalBeforeArray(self):
+        stream = DagRunStream(self.chunks('{"total_entries": 3, "dag_runs": [ {"state": "success"} ]}', 5), fields=None)
+        self.assertEqual(list(stream), [{'state': 'success'}])
+        self.assertEqual(stream.total_entries, 3)
+
+    def testStreamEmpty(self):
+        stream = DagRunStream(self.chunks('{"dag_runs": [], "total_entries": 0}', 3))
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.total_entries, 0)
+
+    def testStreamWithoutArray(self):
+        stream = DagRunStream(self.chunks('{"title": "erro"}', 3))
+        self.assertEqual(list(stream), [])
+        self.assertIsNone(stream.total_entries)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
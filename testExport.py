@@ -0,0 +1,67 @@
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+from records import DagRuns
+from export import ResultExporter, openWriter, SUMMARY_COLUMNS
+
+try:
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.results = [{'dag_id': 'a', 'run_count': 2, 'fail_count': 1}, {'dag_id': 'b', 'run_count': 0, 'fail_count': 0}]
+        self.runs = {'a': DagRuns('a', [{'dag_run_id': 'r1', 'state': 'failed', 'start_date': 1723680000.0, 'end_date': 1723680300.0},
+                                        {'dag_run_id': 'r2', 'state': 'success', 'start_date': 1723683600.0, 'end_date': None}]),
+                     'b': DagRuns('b')}
+
+    def export(self, name:str, runs_name:str=None) -> tuple:
+        path = os.path.join(self.dir, name)
+        runs_path = os.path.join(self.dir, runs_name) if runs_name else None
+        exporter = ResultExporter(path, runs_path=runs_path)
+        exporter.write(self.results[:1], self.runs, 1723593600.0, 1723680000.0)
+        exporter.write(self.results[1:], self.runs, 1723593600.0, 1723680000.0)
+        exporter.close()
+        return path, runs_path
+
+    def testNdjson(self):
+        path, runs_path = self.export('resumo.ndjson', 'runs.ndjson')
+        with open(path) as f:
+            rows = [json.loads(x) for x in f]
+        self.assertEqual(rows[0], {'dag_id': 'a', 'run_count': 2, 'fail_count': 1, 'failure_rate': 0.5,
+                                   'window_start': '2024-08-14T00:00:00+00:00', 'window_end': '2024-08-15T00:00:00+00:00'})
+        self.assertEqual(rows[1]['failure_rate'], 0.0)
+        with open(runs_path) as f:
+            runs = [json.loads(x) for x in f]
+        self.assertEqual(runs[1], {'dag_id': 'a', 'dag_run_id': 'r2', 'state': 'success',
+                                   'start_date': '2024-08-15T01:00:00+00:00', 'end_date': None, 'logical_date': None})
+
+    def testCsv(self):
+        path, _ = self.export('resumo.csv')
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([x['dag_id'] for x in rows], ['a', 'b'])
+        self.assertEqual(rows[0]['fail_count'], '1')
+        self.assertEqual(list(rows[0]), [name for name, _ in SUMMARY_COLUMNS])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow não instalado')
+    def testParquet(self):
+        path, runs_path = self.export('resumo.parquet', 'runs.parquet')
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.column('run_count').to_pylist(), [2, 0])
+        runs = pyarrow.parquet.read_table(runs_path).to_pylist()
+        self.assertEqual(runs[0]['start_date'].timestamp(), 1723680000.0)
+        self.assertIsNone(runs[1]['end_date'])
+
+    def testUnsupportedFormat(self):
+        with self.assertRaises(ValueError):
+            openWriter(os.path.join(self.dir, 'resumo.xlsx'), SUMMARY_COLUMNS)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
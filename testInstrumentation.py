@@ -0,0 +1,53 @@
+import os
+import json
+import logging
+import tempfile
+import unittest
+from instrumentation import Instrumentation
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('InstrumentationTest')
+        l.setLevel(logging.ERROR)
+        self.instrumentation = Instrumentation(logger=l)
+
+    def testPhase(self):
+        with self.instrumentation.phase('analysis'):
+            pass
+        with self.assertRaises(KeyError):
+            with self.instrumentation.phase('analysis'):
+                raise KeyError()
+        self.assertEqual(self.instrumentation.summary()['phases']['analysis']['calls'], 2)
+
+    def testRecordRequest(self):
+        self.instrumentation.recordRequest('get', 'http://host/api/v1/dags?limit=100', 0.02, size=10)
+        self.instrumentation.recordRequest('GET', 'http://host/api/v1/dags?offset=100', 20, size=5, error=True)
+        self.instrumentation.recordRetry('GET', 'http://host/api/v1/dags?offset=100')
+        summary = self.instrumentation.summary()
+        endpoint = summary['endpoints']['GET /api/v1/dags']
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(endpoint['bytes'], 15)
+        self.assertEqual(endpoint['errors'], 1)
+        self.assertEqual(endpoint['retries'], 1)
+        self.assertEqual(endpoint['histogram']['0.025'], 1)
+        self.assertEqual(endpoint['histogram']['+Inf'], 1)
+
+    def testFinishWritesTrace(self):
+        f = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        summary = self.instrumentation.finish(path=f.name)
+        with open(f.name, encoding='utf8') as trace:
+            self.assertEqual(json.load(trace)['phases'], summary['phases'])
+
+    def testProfiler(self):
+        f = tempfile.NamedTemporaryFile(suffix='.prof', delete=False)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        self.instrumentation.startProfiler()
+        sum(range(100))
+        self.instrumentation.stopProfiler(f.name)
+        self.assertGreater(os.path.getsize(f.name), 0)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,37 @@
+import unittest
+import requests
+from metrics import MetricsRegistry, MetricsServer
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.declare('runs', 'Execucoes por dag.')
+        self.registry.declare('errors_total', 'Erros.', type='counter')
+
+    def testRender(self):
+        self.registry.set('runs', 3, labels={'dag_id': 'a"b', 'state': 'failed'})
+        self.registry.inc('errors_total')
+        self.registry.inc('errors_total')
+        text = self.registry.render()
+        self.assertIn('# TYPE runs gauge', text)
+        self.assertIn('runs{dag_id="a\\"b",state="failed"} 3', text)
+        self.assertIn('errors_total 2', text)
+
+    def testReplaceRemovesStaleSeries(self):
+        self.registry.set('runs', 3, labels={'dag_id': 'old'})
+        self.registry.replace('runs', {(('dag_id', 'new'),): 1})
+        text = self.registry.render()
+        self.assertNotIn('old', text)
+        self.assertIn('runs{dag_id="new"} 1', text)
+
+    def testServer(self):
+        self.registry.set('runs', 1, labels={'dag_id': 'a'})
+        server = MetricsServer(self.registry, port=0, host='127.0.0.1').start()
+        self.addCleanup(server.stop)
+        response = requests.get(f'http://127.0.0.1:{server.port}/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('runs{dag_id="a"} 1', response.text)
+        self.assertEqual(requests.get(f'http://127.0.0.1:{server.port}/other').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,86 @@
+import os
+import json
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime
+from multiEnv import MultiEnvironmentMonitor
+from mockAirflow import MockAirflowServer
+
+class TestMultiEnv(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('MultiEnvTest')
+        l.setLevel(logging.ERROR)
+        self.monitor = MultiEnvironmentMonitor(logger=l)
+        self.servers = [MockAirflowServer(dag_count=4, runs_per_dag=8).start(),
+                        MockAirflowServer(dag_count=2, runs_per_dag=4, fail_every=2).start()]
+        for server in self.servers:
+            self.addCleanup(server.stop)
+
+    def writeConfig(self, environments:list) -> str:
+        f = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.addCleanup(os.remove, f.name)
+        json.dump({'environments': environments}, f)
+        f.close()
+        return f.name
+
+    def environment(self, name:str, server:MockAirflowServer, **options) -> dict:
+        env = {'name': name, 'type': 'airflow', 'AIRFLOW_URL': server.url,
+               'AIRFLOW_USERNAME': 'monitor', 'AIRFLOW_PASSWORD': '${MULTIENV_TEST_PASSWORD}'}
+        env.update(options)
+        return env
+
+    def testLoadConfig(self):
+        os.environ['MULTIENV_TEST_PASSWORD'] = 'secret'
+        path = self.writeConfig([self.environment('a', self.servers[0], workers=2)])
+        environments = self.monitor.loadConfig(path)
+        self.assertEqual(environments[0]['AIRFLOW_PASSWORD'], 'secret')
+        self.assertEqual(environments[0]['workers'], 2)
+
+    def testLoadConfigInvalid(self):
+        path = self.writeConfig([self.environment('a', self.servers[0]), self.environment('a', self.servers[1])])
+        with self.assertRaises(ValueError):
+            self.monitor.loadConfig(path)
+        path = self.writeConfig([{'name': 'x', 'type': 'other'}])
+        with self.assertRaises(ValueError):
+            self.monitor.loadConfig(path)
+
+    def testRun(self):
+        environments = [self.environment('a', self.servers[0], workers=2, batchSize=1),
+                        self.environment('b', self.servers[1]),
+                        {'name': 'broken', 'type': 'airflow'}]
+        ret = self.monitor.run(environments=environments, end_date=datetime(2024, 8, 15), qtdDias=2)
+        self.assertEqual(sorted(ret['environments']), ['a', 'b'])
+        self.assertEqual(list(ret['errors']), ['broken'])
+        self.assertAlmostEqual(ret['environments']['a']['consolidate'], 0.25)
+        self.assertAlmostEqual(ret['environments']['b']['consolidate'], 0.5)
+        self.assertEqual(ret['rollup']['run_count'], 40)
+        self.assertEqual(ret['rollup']['fail_count'], 12)
+        self.assertAlmostEqual(ret['rollup']['consolidate'], 0.3)
+        self.assertEqual(self.servers[0].requests_by_path['/api/v1/dags/~/dagRuns/list'], 4)
+
+    def testMainVerboseReachesEnvironments(self):
+        path = self.writeConfig([self.environment('a', self.servers[0])])
+        os.environ['MULTIENV_TEST_PASSWORD'] = 'secret'
+        self.addCleanup(self.monitor.logger.setLevel, logging.ERROR)
+        self.monitor.main(['multiEnv.py', '-c', path, '-d', '2024-08-15', '-q', '1', '-v'])
+        self.assertTrue(logging.getLogger('MultiEnvTest.a').isEnabledFor(logging.DEBUG))
+        self.monitor.initializeLogger(logger=self.monitor.logger, level=logging.ERROR)
+        self.assertFalse(self.monitor.createMonitor(self.environment('b', self.servers[1])).logger.isEnabledFor(logging.INFO))
+
+    @mock.patch('airflowMWAA.AWS')
+    def testMwaaUsesEnvironmentCredentials(self, AWS):
+        env = {'name': 'mwaa', 'type': 'mwaa', 'AWS_REGION': 'us-east-2', 'AWS_AIRFLOW_NAME': 'mwaa-hml',
+               'AWS_ACCESS_KEY_ID': 'HML_KEY', 'AWS_SECRET_ACCESS_KEY': 'HML_SECRET'}
+        AWS.return_value.createClient.return_value.create_web_login_token.return_value = {
+            'WebServerHostname': 'mwaa.hml', 'WebToken': 'token'}
+        monitor = self.monitor.createMonitor(env)
+        monitor.getEnvironmentVariables()
+        self.assertEqual(monitor.createFirstAuth(env_name='mwaa-hml'), 'token')
+        # cada ambiente MWAA usa as próprias chaves, não as do processo.
+        AWS.assert_called_once_with(logger=monitor.logger, environment=env)
+        AWS.return_value.createClient.assert_called_once_with(service_name='mwaa', region='us-east-2')
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,79 @@
+import unittest
+from rateLimit import AdaptiveLimiter, TokenBucket, parseRetryAfter
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now = self.now + seconds
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def testParseRetryAfter(self):
+        self.assertEqual(parseRetryAfter('3'), 3.0)
+        self.assertIsNone(parseRetryAfter(None))
+        self.assertIsNone(parseRetryAfter('amanha'))
+        self.assertEqual(parseRetryAfter('Wed, 21 Oct 2015 07:28:10 GMT', now=1445412480.0), 10.0)
+        self.assertEqual(parseRetryAfter('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412490.0), 0.0)
+
+    def testTokenBucket(self):
+        bucket = TokenBucket(rate=2, burst=2, clock=self.clock, sleep=self.clock.sleep)
+        self.assertEqual([bucket.acquire() for _ in range(4)], [0.0, 0.0, 0.5, 0.5])
+        self.clock.now = self.clock.now + 10
+        self.assertEqual(bucket.acquire(), 0.0)
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+    def testAdditiveIncreaseMultiplicativeDecrease(self):
+        limiter = AdaptiveLimiter(max_concurrency=8, initial=2, clock=self.clock)
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release(0.1, status_code=200)
+        self.assertGreater(limiter.limit, 3)
+        limiter.acquire()
+        limiter.release(0.1, status_code=429)
+        limit = limiter.limit
+        self.assertLess(limit, 2)
+        # outra falha na mesma janela de latência não reduz de novo.
+        limiter.acquire()
+        limiter.release(0.1, status_code=503)
+        self.assertEqual(limiter.limit, limit)
+        self.clock.now = self.clock.now + 1
+        limiter.acquire()
+        limiter.release(0.1, error=True)
+        self.assertEqual(limiter.limit, 1)
+        for _ in range(200):
+            limiter.acquire()
+            limiter.release(0.1, status_code=200)
+        self.assertEqual(limiter.limit, 8)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def testLatencyTarget(self):
+        limiter = AdaptiveLimiter(max_concurrency=8, latency_target=1.0, clock=self.clock)
+        limiter.acquire()
+        limiter.release(2.0, status_code=200)
+        self.assertEqual(limiter.limit, 4)
+
+    def testRetryAfterBlocks(self):
+        limiter = AdaptiveLimiter(max_concurrency=4, clock=self.clock)
+        limiter.acquire()
+        limiter.release(0.1, status_code=429, retry_after=5)
+        self.assertEqual(limiter.blocked_until, 105.0)
+        self.clock.now = 106.0
+        limiter.acquire()
+        self.assertEqual(limiter.in_flight, 1)
+
+    def testInvalidConcurrency(self):
+        with self.assertRaises(ValueError):
+            AdaptiveLimiter(max_concurrency=0)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,46 @@
+import unittest
+from records import DagRun, DagRuns, MISSING, toEpochMs, fromEpochMs
+from analytics import RunColumns
+
+class TestRecords(unittest.TestCase):
+    def setUp(self):
+        self.runs = [{'dag_id': 'a', 'dag_run_id': 'r1', 'state': 'success',
+                      'start_date': '2024-08-15T10:00:00.250+00:00', 'end_date': '2024-08-15T10:01:00+00:00'},
+                     {'dag_id': 'a', 'dag_run_id': 'r2', 'state': 'running', 'start_date': 1723716000.0, 'end_date': None}]
+
+    def testToEpochMs(self):
+        self.assertEqual(toEpochMs('2024-08-15T00:00:00.250Z'), 1723680000250)
+        self.assertEqual(toEpochMs(1723680000.25), 1723680000250)
+        self.assertEqual(toEpochMs(None), MISSING)
+        self.assertIsNone(fromEpochMs(MISSING))
+
+    def testDagRuns(self):
+        runs = DagRuns('a', self.runs)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(runs[0], DagRun('a', 'r1', 'success', 1723716000.25, 1723716060.0))
+        self.assertEqual(runs[1]['state'], 'running')
+        self.assertIsNone(runs[1].end_date)
+        self.assertEqual([x.dag_run_id for x in runs], ['r1', 'r2'])
+        self.assertEqual(runs, DagRuns('a', list(runs)))
+
+    def testRowsAndMerge(self):
+        runs = DagRuns('a', self.runs)
+        self.assertEqual(DagRuns.fromRows('a', runs.rows()), runs)
+        other = DagRuns('a', [dict(self.runs[1], state='success'),
+                              {'dag_id': 'a', 'dag_run_id': 'r3', 'state': 'failed', 'start_date': None, 'end_date': None}])
+        merged = DagRuns.merge('a', [runs, other])
+        self.assertEqual(merged.run_ids, ['r1', 'r2', 'r3'])
+        self.assertEqual(merged[1]['state'], 'running')
+
+    def testRunColumnsFromDagRuns(self):
+        compact = RunColumns()
+        compact.add('a', DagRuns('a', self.runs))
+        plain = RunColumns()
+        plain.add('a', self.runs)
+        self.assertEqual(compact.report(), plain.report())
+        empty = RunColumns()
+        empty.add('b', DagRuns('b'))
+        self.assertEqual(empty.report()['total_runs'], 0)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,83 @@
+import os
+import json
+import zlib
+import logging
+import tempfile
+import unittest
+from archive import ArchivedResponse
+from responseCache import ResponseCache, parseTtls, SETTLE_SECONDS
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('ResponseCacheTest')
+        l.setLevel(logging.ERROR)
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.now = 1_000_000.0
+        self.cache = ResponseCache(self.path, logger=l, ttls={'dags': 60}, clock=lambda: self.now)
+        self.addCleanup(self.cache.conn.close)
+        self.runs_url = 'http://airflow/api/v1/dags/~/dagRuns/list'
+
+    def response(self, body:dict, headers:dict=None) -> ArchivedResponse:
+        response = ArchivedResponse(200, json.dumps(body).encode('utf8'), 'http://airflow')
+        response.headers.update(headers or {})
+        return response
+
+    def testParseTtls(self):
+        self.assertEqual(parseTtls(['dags=30', 'runs=1.5'])['dags'], 30)
+        self.assertEqual(parseTtls(['dags=30', 'runs=1.5'])['runs'], 1.5)
+        self.assertEqual(parseTtls(None), parseTtls([]))
+        for value in ('x=1', 'dags', 'dags='):
+            with self.assertRaises(ValueError):
+                parseTtls([value])
+
+    def testTtlAndValidators(self):
+        url = 'http://airflow/api/v1/dags?limit=100'
+        self.assertIsNone(self.cache.get('GET', url))
+        self.cache.put('GET', url, None, self.response({'dags': []}, {'ETag': '"v1"'}))
+        cached = self.cache.get('GET', url)
+        self.assertTrue(cached.fresh(self.now))
+        self.assertEqual(cached.response(url).json(), {'dags': []})
+        # outro host é outra entrada.
+        self.assertIsNone(self.cache.get('GET', 'http://outro/api/v1/dags?limit=100'))
+        self.now = self.now + 61
+        cached = self.cache.get('GET', url)
+        self.assertFalse(cached.fresh(self.now))
+        self.assertEqual(cached.validators(), {'If-None-Match': '"v1"'})
+        self.cache.revalidate('GET', url, None, cached)
+        self.assertTrue(self.cache.get('GET', url).fresh(self.now))
+        self.assertEqual(self.cache.stats, {'hits': 2, 'misses': 3, 'revalidated': 1, 'evicted': 0})
+        self.assertIsNone(self.cache.get('GET', 'http://airflow/health'))
+
+    def testTerminalRunsWithoutExpiration(self):
+        past = '1970-01-01T00:00:00+00:00'
+        payload = json.dumps({'end_date_lte': past, 'page_offset': 0})
+        self.cache.put('POST', self.runs_url, payload, self.response({'dag_runs': [{'state': 'success'}]}))
+        self.assertIsNone(self.cache.get('POST', self.runs_url, payload).expires_at)
+        running = json.dumps({'start_date_lte': past, 'page_offset': 100})
+        self.cache.put('POST', self.runs_url, running, self.response({'dag_runs': [{'state': 'running'}]}))
+        self.assertEqual(self.cache.get('POST', self.runs_url, running).expires_at, self.now + 300)
+        # janela que ainda pode receber execuções.
+        recent = json.dumps({'end_date_lte': self.now - SETTLE_SECONDS / 2})
+        self.cache.put('POST', self.runs_url, recent, self.response({'dag_runs': []}))
+        self.assertEqual(self.cache.get('POST', self.runs_url, recent).expires_at, self.now + 300)
+
+    def testLeastRecentlyUsedEviction(self):
+        # corpo aleatório para a compressão não diminuir o tamanho.
+        body = {'dags': [os.urandom(200).hex()]}
+        size = len(zlib.compress(json.dumps(body).encode('utf8')))
+        self.cache.max_bytes = size * 2
+        urls = [f'http://airflow/api/v1/dags?offset={i}' for i in range(3)]
+        for url in urls[:2]:
+            self.cache.put('GET', url, None, self.response(body))
+            self.now = self.now + 1
+        self.cache.get('GET', urls[0])
+        self.cache.put('GET', urls[2], None, self.response(body))
+        self.assertIsNotNone(self.cache.get('GET', urls[0]))
+        self.assertIsNone(self.cache.get('GET', urls[1]))
+        self.assertEqual(self.cache.stats['evicted'], 1)
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
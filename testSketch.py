@@ -0,0 +1,56 @@
+import json
+import unittest
+import numpy as np
+from sketch import DDSketch
+
+class TestSketch(unittest.TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(7).lognormal(mean=5, sigma=1.5, size=20000)
+
+    def testQuantilesRelativeError(self):
+        sketch = DDSketch(relative_accuracy=0.01)
+        sketch.addMany(self.values)
+        for q in (0.5, 0.9, 0.95, 0.99):
+            exact = np.quantile(self.values, q, method='lower')
+            self.assertLess(abs(sketch.quantile(q) - exact) / exact, 0.02)
+        self.assertEqual(sketch.max, self.values.max())
+        self.assertAlmostEqual(sketch.mean(), self.values.mean())
+        self.assertEqual(sketch.quantile(1), self.values.max())
+
+    def testMergeMatchesSingleSketch(self):
+        whole = DDSketch()
+        whole.addMany(self.values)
+        parts = [DDSketch() for _ in range(3)]
+        for i, part in enumerate(parts):
+            part.addMany(self.values[i::3])
+        merged = DDSketch.fromDict(json.loads(json.dumps(parts[0].toDict())))
+        merged.merge(parts[1]).merge(parts[2])
+        self.assertEqual(merged.bins, whole.bins)
+        self.assertEqual([merged.quantile(q) for q in (0.5, 0.99)], [whole.quantile(q) for q in (0.5, 0.99)])
+        with self.assertRaises(ValueError):
+            merged.merge(DDSketch(relative_accuracy=0.05))
+
+    def testBoundedMemory(self):
+        sketch = DDSketch(max_bins=64)
+        for _ in range(5):
+            sketch.addMany(self.values)
+        self.assertLessEqual(len(sketch.bins), 64)
+        self.assertEqual(sketch.count, 5 * len(self.values))
+        # os baldes juntados são os menores, os quantis altos continuam precisos.
+        exact = np.quantile(self.values, 0.99, method='lower')
+        self.assertLess(abs(sketch.quantile(0.99) - exact) / exact, 0.02)
+
+    def testZeroNegativeAndEmpty(self):
+        sketch = DDSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertIsNone(sketch.mean())
+        sketch.addMany(np.array([-5.0, 0.0, np.nan, 10.0]))
+        self.assertEqual(sketch.count, 3)
+        self.assertEqual(sketch.zero, 2)
+        self.assertEqual(sketch.quantile(0.1), 0.0)
+        self.assertEqual(sketch.quantile(0), -5.0)
+        self.assertEqual(sketch.min, -5.0)
+        self.assertEqual(DDSketch.fromDict(DDSketch().toDict()).count, 0)
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,90 @@
+import os
+import logging
+import sqlite3
+import tempfile
+import unittest
+from store import DagRunStore, DAY
+from records import DagRun
+
+class TestStore(unittest.TestCase):
+    def setUp(self):
+        l = logging.getLogger('StoreTest')
+        l.setLevel(logging.ERROR)
+        self.store = DagRunStore(path=':memory:', logger=l)
+        self.addCleanup(self.store.close)
+
+    def run_(self, run_id, state, start, end):
+        return {'dag_id': 'dag', 'dag_run_id': run_id, 'state': state, 'start_date': start, 'end_date': end}
+
+    def testGetFetchStartWithoutWatermark(self):
+        self.assertEqual(self.store.getFetchStart('dag', 100.0), 100.0)
+
+    def testGetFetchStartWatermarkAndPending(self):
+        runs = [self.run_('a', 'success', 110.0, 115.0), self.run_('b', 'running', 150.0, None)]
+        self.store.saveRuns(['dag'], runs, fetched_from=100.0, watermark=200.0)
+        # a execução pendente não recua a marca, ela é consultada à parte.
+        self.assertEqual(self.store.getFetchStart('dag', 100.0), 200.0)
+        self.assertEqual(self.store.getPendingRuns(['dag', 'other'], 100.0), [('dag', 150.0)])
+        self.assertEqual(self.store.getPendingRuns(['dag'], 160.0), [])
+        # janela maior que a já consultada precisa buscar tudo de novo.
+        self.assertEqual(self.store.getFetchStart('dag', 50.0), 50.0)
+        self.store.saveRuns(['dag'], [self.run_('b', 'success', 150.0, 160.0)], fetched_from=150.0, watermark=300.0)
+        self.assertEqual(self.store.getFetchStart('dag', 100.0), 300.0)
+        self.assertEqual(self.store.getPendingRuns(['dag'], 100.0), [])
+
+    def testGetRunsOnlyFinishedInsideWindow(self):
+        runs = [self.run_('a', 'success', 110.0, 115.0),
+                self.run_('b', 'running', 150.0, None),
+                self.run_('c', 'failed', 190.0, 210.0)]
+        self.store.saveRuns(['dag'], runs, fetched_from=100.0, watermark=200.0)
+        ret = self.store.getRuns(['dag', 'other'], 100.0, 200.0)
+        self.assertEqual(list(ret), ['dag'])
+        self.assertEqual(list(ret['dag']), [DagRun('dag', 'a', 'success', 110.0, 115.0)])
+
+    def testEvict(self):
+        runs = [self.run_('a', 'success', 110.0, 115.0), self.run_('b', 'failed', 190.0, 195.0)]
+        self.store.saveRuns(['dag'], runs, fetched_from=100.0, watermark=200.0)
+        self.assertEqual(self.store.evict(before=150.0), 1)
+        self.assertEqual(self.store.getFetchStart('dag', 120.0), 120.0)
+        self.assertEqual(self.store.getFetchStart('dag', 160.0), 200.0)
+
+    def testRollupsFollowRuns(self):
+        runs = [self.run_('a', 'success', 10.0, 20.0),
+                self.run_('b', 'failed', 100.0, 130.0),
+                self.run_('c', 'running', DAY + 10.0, None),
+                self.run_('d', 'success', DAY - 10.0, DAY + 5.0)]
+        self.store.saveRuns(['dag'], runs, fetched_from=0.0, watermark=2 * DAY)
+        self.assertEqual(sorted(self.store.getRollups(0.0, DAY)), [('dag', 0, 'failed', 1, 30.0), ('dag', 0, 'success', 1, 10.0)])
+        self.assertEqual(sorted(self.store.getRollups(0.0, 2 * DAY)),
+                         [('dag', 0, 'failed', 1, 30.0), ('dag', 0, 'success', 2, 25.0)])
+        # a execução que terminou depois é movida para o novo estado.
+        self.store.saveRuns(['dag'], [self.run_('c', 'failed', DAY + 10.0, DAY + 20.0),
+                                      self.run_('a', 'failed', 10.0, 20.0)], fetched_from=DAY, watermark=2 * DAY)
+        self.assertEqual(sorted(self.store.getRollups(0.0, 2 * DAY)),
+                         [('dag', 0, 'failed', 2, 40.0), ('dag', 0, 'success', 1, 15.0), ('dag', 1, 'failed', 1, 10.0)])
+        self.store.evict(before=DAY)
+        self.assertEqual(self.store.getRollups(0.0, 2 * DAY), [('dag', 1, 'failed', 1, 10.0)])
+        self.assertEqual(self.store.getCoveredDagIds(DAY, 2 * DAY), {'dag'})
+        self.assertEqual(self.store.getCoveredDagIds(DAY, 3 * DAY), set())
+        self.assertEqual(self.store.getDagIds(), ['dag'])
+        with self.assertRaises(ValueError):
+            self.store.getRollups(10.0, DAY)
+
+    def testRollupsBackfillExistingStore(self):
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        # store gravado antes de existirem os agregados.
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE dag_runs (dag_id TEXT NOT NULL, run_id TEXT NOT NULL, state TEXT, '
+                     'start_date REAL, end_date REAL, PRIMARY KEY (dag_id, run_id))')
+        conn.executemany('INSERT INTO dag_runs VALUES (?, ?, ?, ?, ?)',
+                         [('dag', 'a', 'success', 10.0, 20.0), ('dag', 'b', 'success', 30.0, 35.0), ('dag', 'c', None, 40.0, None)])
+        conn.commit()
+        conn.close()
+        store = DagRunStore(path=path, logger=self.store.logger)
+        self.addCleanup(store.close)
+        self.assertEqual(store.getRollups(0.0, DAY), [('dag', 0, 'success', 2, 15.0)])
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
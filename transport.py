@@ -0,0 +1,158 @@
+import json
+import time
+import random
+from rateLimit import AdaptiveLimiter, parseRetryAfter
+
+# requests só é importado na primeira chamada, o --help e as validações não precisam dele.
+requests = None
+
+def loadRequests():
+    global requests
+    if requests is None:
+        import requests as module
+        requests = module
+    return requests
+
+class AirflowRequestError(SystemExit):
+
+    def __init__(self, message:str, status_code:int=None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+class Transport(object):
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, logger, pool_size:int=10, connect_timeout:float=10, read_timeout:float=60,
+                 retries:int=3, backoff:float=0.5, max_backoff:float=30, instrumentation=None,
+                 max_rps:float=None, latency_target:float=None) -> None:
+        self.logger = logger
+        self.instrumentation = instrumentation
+        self.session = None
+        self.headers = {}
+        self.cookies = {}
+        self.configure(pool_size=pool_size, connect_timeout=connect_timeout, read_timeout=read_timeout,
+                       retries=retries, backoff=backoff, max_backoff=max_backoff, max_rps=max_rps,
+                       latency_target=latency_target)
+
+    def configure(self, pool_size:int=10, connect_timeout:float=10, read_timeout:float=60,
+                  retries:int=3, backoff:float=0.5, max_backoff:float=30, max_rps:float=None,
+                  latency_target:float=None) -> None:
+        if pool_size < 1 or retries < 0:
+            raise ValueError('pool_size deve ser maior que zero e retries não pode ser negativo.')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # as chamadas em andamento ficam entre 1 e pool_size, ajustadas pelas respostas do servidor.
+        self.limiter = AdaptiveLimiter(max_concurrency=pool_size, rate=max_rps, latency_target=latency_target)
+        self.resizePool(pool_size)
+
+    def resizePool(self, pool_size:int) -> None:
+        self.pool_size = pool_size
+        self.limiter.max_concurrency = pool_size
+        self.limiter.limit = float(pool_size)
+        if self.session is not None:
+            self.mountAdapter()
+
+    def mountAdapter(self) -> None:
+        # O retry é feito em request() para controlar o jitter e quais métodos podem ser repetidos.
+        adapter = loadRequests().adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                                      max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def getSession(self):
+        if self.session is None:
+            self.session = loadRequests().Session()
+            self.mountAdapter()
+            self.session.headers.update(self.headers)
+            self.session.cookies.update(self.cookies)
+        return self.session
+
+    def setAuth(self, headers:dict=None, cookies:dict=None) -> None:
+        if headers:
+            self.headers.update(headers)
+        if cookies:
+            self.cookies.update(cookies)
+        if self.session is not None:
+            self.session.headers.update(headers or {})
+            self.session.cookies.update(cookies or {})
+
+    def backoffDelay(self, attempt:int) -> float:
+        # full jitter: espera aleatória entre 0 e o backoff exponencial da tentativa.
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def isRetryable(self, error:Exception) -> bool:
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in self.RETRY_STATUS
+
+    def isReadError(self, error:Exception) -> bool:
+        # erros ao ler um corpo em stream depois do request(): conexão que cai no meio ou JSON truncado.
+        if isinstance(error, (json.JSONDecodeError, UnicodeDecodeError)):
+            return True
+        return requests is not None and isinstance(error, requests.exceptions.RequestException)
+
+    def waitRetry(self, method:str, url:str, attempt:int, error:Exception, retry_after:float=None) -> None:
+        # o Retry-After do servidor tem precedência sobre o backoff calculado.
+        delay = self.backoffDelay(attempt - 1) if retry_after is None else retry_after
+        if self.instrumentation is not None:
+            self.instrumentation.recordRetry(method, url)
+        self.logger.warning(f'Tentativa {attempt} de {self.retries} para {url} em {round(delay, 2)}s: {error}')
+        time.sleep(delay)
+
+    def record(self, method:str, url:str, started:float, response=None, stream:bool=False) -> None:
+        if self.instrumentation is None:
+            return
+        size = 0
+        if response is not None:
+            # respostas em stream ainda não foram lidas, usa o tamanho informado pelo servidor.
+            size = int(response.headers.get('Content-Length', 0) if stream else len(response.content))
+        error = response is None or not response.ok
+        self.instrumentation.recordRequest(method, url, time.perf_counter() - started, size=size, error=error)
+
+    def request(self, method:str, url:str, payload=None, timeout=None, idempotent:bool=None, **kwargs):
+        if idempotent is None:
+            idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        session = self.getSession()
+        attempt = 0
+        while True:
+            retry_after = None
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                response = session.request(method=method,
+                                                url=url,
+                                                data=payload,
+                                                timeout=timeout or self.timeout,
+                                                **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.limiter.release(time.perf_counter() - started, error=True)
+                self.record(method, url, started)
+                error = e
+            else:
+                # em stream a vaga é liberada ao receber os cabeçalhos, o corpo é lido depois.
+                if response.status_code in self.RETRY_STATUS:
+                    retry_after = parseRetryAfter(response.headers.get('Retry-After'))
+                self.limiter.release(time.perf_counter() - started, status_code=response.status_code,
+                                     retry_after=retry_after)
+                self.record(method, url, started, response, stream=kwargs.get('stream', False))
+                try:
+                    response.raise_for_status()
+                    return response
+                except requests.exceptions.HTTPError as e:
+                    # em stream o corpo do erro não é lido, fecha para devolver a conexão ao pool.
+                    response.close()
+                    error = e
+            if not (idempotent and attempt < self.retries and self.isRetryable(error)):
+                response = getattr(error, 'response', None)
+                status_code = response.status_code if response is not None else None
+                raise AirflowRequestError(f'Erro ao chamar a URL: {url} \n {error}', status_code=status_code)
+            attempt = attempt + 1
+            self.waitRetry(method, url, attempt, error, retry_after=retry_after)
+
+    def close(self) -> None:
+        if self.session is not None:
+            self.session.close()